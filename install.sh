@@ -22,7 +22,7 @@ python3 -m venv "$VENV_DIR" || { echo "Failed to create venv"; exit 1; }
 # --- Activate & install ---
 source "$VENV_DIR/bin/activate"
 pip install --upgrade pip
-pip install flask flask-session sacn adafruit-circuitpython-ssd1306 pillow gpiozero netifaces psutil adafruit-blinka RPi.GPIO
+pip install flask waitress brotli sacn adafruit-circuitpython-ssd1306 pillow gpiozero psutil adafruit-blinka RPi.GPIO smbus2 zeroconf
 
 # --- Fix permissions ---
 sudo chown -R pi:pi "$APP_DIR"
@@ -32,8 +32,7 @@ sudo chmod -R 755 "$APP_DIR"
 sudo tee /etc/systemd/system/sacn-relay.service > /dev/null << EOF
 [Unit]
 Description=sACN Relay 4/8 Controller
-After=network-online.target
-Wants=network-online.target
+After=network.target
 
 [Service]
 Type=simple
@@ -42,7 +41,7 @@ WorkingDirectory=$APP_DIR
 Environment=PATH=$VENV_DIR/bin
 ExecStart=$VENV_DIR/bin/python $APP_DIR/sacn_relay_controller.py
 Restart=always
-RestartSec=30
+RestartSec=2
 
 [Install]
 WantedBy=multi-user.target
@@ -1,80 +1,891 @@
-import socket, threading, time, json, subprocess, os, re, tempfile, ast
-from flask import Flask, render_template, request, redirect, url_for, send_from_directory, jsonify, flash, send_file, session
-from flask_session import Session
-from sacn import sACNreceiver
-from PIL import Image, ImageDraw, ImageFont
-import board, busio, netifaces
-from gpiozero import OutputDevice
-import psutil
-from adafruit_ssd1306 import SSD1306_I2C
+import socket, threading, time, json, subprocess, os, re, tempfile, select, mmap, struct, math, heapq, itertools, uuid
+STARTED = time.monotonic()  # startup metrics are relative to this
+import argparse, fcntl, secrets, gzip, mimetypes, http.client, urllib.parse, copy, io, sys, signal, atexit
+import hashlib, shutil, tarfile, errno, queue
+import multiprocessing
+from multiprocessing import shared_memory
+from operator import itemgetter
+from collections import deque
+from bisect import bisect_left
+from flask import Flask, render_template, request, redirect, url_for, send_from_directory, jsonify, flash, send_file, session, Response
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+from werkzeug.security import safe_join
+from werkzeug.serving import BaseWSGIServer
+from concurrent.futures import ThreadPoolExecutor
+# sacn, PIL, psutil and the board/OLED libraries are imported where first used,
+# after the relay path is up; all hardware libraries are optional
 
 # -------------------------- APP DIRECTORY --------------------------
 APP_DIR = os.path.expanduser('~/sACN-Relay')
 os.makedirs(APP_DIR, exist_ok=True)
+# code and assets; APP_DIR itself on a factory install, an OTA slot after an update
+CODE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 # -------------------------- Flask Setup --------------------------
+class MemorySession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None):
+        def on_update(s):
+            s.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.modified = False
+
+class MemorySessionInterface(SessionInterface):
+    # sessions live in a dict in the web process (nothing touches the SD card);
+    # the cookie only carries a random id. A restart logs everyone out.
+    SWEEP_INTERVAL = 600
+
+    def __init__(self):
+        self.store = {}
+        self.lock = threading.Lock()
+        self.next_sweep = 0.0
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        with self.lock:
+            entry = self.store.get(sid) if sid else None
+        if entry and entry[0] > time.time():
+            return MemorySession(entry[1], sid)
+        return MemorySession(sid=secrets.token_urlsafe(32))
+
+    def save_session(self, app, session, response):
+        name, domain, path = self.get_cookie_name(app), self.get_cookie_domain(app), self.get_cookie_path(app)
+        if not session:
+            if session.modified:
+                with self.lock:
+                    self.store.pop(session.sid, None)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+        now = time.time()
+        with self.lock:
+            self.store[session.sid] = (now + app.permanent_session_lifetime.total_seconds(), dict(session))
+            if now >= self.next_sweep:
+                self.next_sweep = now + self.SWEEP_INTERVAL
+                for sid in [k for k, v in self.store.items() if v[0] <= now]:
+                    del self.store[sid]
+        if self.should_set_cookie(app, session):
+            response.set_cookie(name, session.sid, expires=self.get_expiration_time(app, session),
+                                httponly=self.get_cookie_httponly(app), domain=domain, path=path,
+                                secure=self.get_cookie_secure(app), samesite=self.get_cookie_samesite(app))
+
 app = Flask(__name__, 
-            template_folder=os.path.join(APP_DIR, 'assets/html'), 
-            static_folder=os.path.join(APP_DIR, 'assets'))
+            template_folder=os.path.join(CODE_DIR, 'assets/html'), 
+            static_folder=None)   # /assets is served by assets() below
 app.secret_key = 'sacn-relay-super-secret-key-2025'
-app.config['SESSION_TYPE'] = 'filesystem'
-app.config['SESSION_FILE_DIR'] = os.path.join(APP_DIR, 'flask_session')
-Session(app)
+app.session_interface = MemorySessionInterface()
 
 # -------------------------- VERSION --------------------------
 CURRENT_VERSION = "1.2.16"
 
-# -------------------------- GPIO (8 Relays) --------------------------
-RELAY_PINS = [17, 18, 27, 22, 23, 24, 25, 26]
-relays = [OutputDevice(p, active_high=False, initial_value=False) for p in RELAY_PINS]
+def version_tuple(v):
+    # "1.2.9" < "1.2.16" as strings; compare numerically
+    return tuple(int(x) for x in re.findall(r'\d+', str(v)))
 
 # -------------------------- OLED --------------------------
-i2c = busio.I2C(board.SCL, board.SDA)
+i2c = None
 oled = None
-OLED_AVAILABLE = True
-try:
-    oled = SSD1306_I2C(128, 64, i2c)
-    oled.fill(0); oled.show()
-except Exception as e:
-    print(f"OLED not available: {e}")
-    OLED_AVAILABLE = False
-    oled = None
-
-image = Image.new("1", (128, 64))
-draw = ImageDraw.Draw(image)
-font = ImageFont.load_default()
-small_font = ImageFont.load_default()
+OLED_AVAILABLE = False
+Image = ImageDraw = image = draw = font = small_font = None
+
+def init_oled():
+    global i2c, oled, OLED_AVAILABLE, Image, ImageDraw, image, draw, font, small_font
+    try:
+        import board, busio
+        from adafruit_ssd1306 import SSD1306_I2C
+        from PIL import Image, ImageDraw, ImageFont
+    except ImportError as e:
+        print(f"OLED not available: {e}")
+        return
+    try:
+        i2c = busio.I2C(board.SCL, board.SDA)
+        oled = SSD1306_I2C(128, 64, i2c)
+        oled.fill(0); oled.show()
+        OLED_AVAILABLE = True
+    except Exception as e:
+        print(f"OLED not available: {e}")
+        oled = None
+        return
+    image = Image.new("1", (128, 64))
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default()
+    small_font = ImageFont.load_default()
 
 # -------------------------- sACN --------------------------
 receiver = None
-current_dmx_values = [0] * 8
-relay_states = [False] * 8
+clock = time.monotonic     # pipeline time source; replay() runs it on capture time
+
+# -------------------------- COMPILED CHANNEL MAP --------------------------
+# DMX value (0-255) -> percent, same rounding the UI has always shown
+PERCENT_LUT = bytes(round(v / 255 * 100) for v in range(256))
+
+# universe -> (slot getter, relay indices, relays(vals, current mask) -> on bits,
+#              universe mask, per-relay value getter (None: one slot per relay),
+#              min frame length, slots, SourceTable, per-relay slots)
+# `slots` are the distinct slots the universe's relays read, in order; the
+# relays() pass for all of them is generated by compile_relay_logic(). Rebuilt
+# off to the side and swapped in with one assignment, so the packet thread
+# always sees a complete map. Source state (arbitration, sequence, last frame)
+# is carried over into the new map.
+channel_map = {}
+
+def _slot_getter(slots):
+    if len(slots) == 1:
+        s0 = slots[0]
+        return lambda d: (d[s0],)
+    return itemgetter(*slots)
+
+def relay_universe(i):
+    return config['universes'][i] or config['universe']
+
+def build_channel_map():
+    patch = {}
+    for i in range(CHANNEL_COUNT):
+        patch.setdefault(relay_universe(i), []).append(i)
+    cmap = {}
+    for u, ids in patch.items():
+        rules = {}
+        for i in ids:
+            if config['logic'][i].strip():
+                try:
+                    rules[i] = parse_logic(config['logic'][i])
+                except LogicError as e:
+                    print(f"Bad logic for relay {i + 1} skipped: {e}")
+        rslots = tuple(logic_slots(rules[i])[0] if i in rules else config['channels'][i] - 1 for i in ids)
+        slots = tuple(sorted(set(rslots).union(*(logic_slots(r) for r in rules.values()))))
+        index = {s: k for k, s in enumerate(slots)}
+        disp = tuple(index[s] for s in rslots)
+        old = channel_map.get(u)
+        if old is None:
+            src = SourceTable(config['merge'], universe_stats.setdefault(u, UniverseStats()))
+        else:
+            src = old[7].remap(old[6], slots, config['merge'])
+        cmap[u] = (_slot_getter(slots), tuple(ids), compile_relay_logic(ids, rules, index, rslots),
+                   sum(1 << i for i in ids), None if disp == tuple(range(len(slots))) else _slot_getter(disp),
+                   max(slots) + 1, slots, src, rslots)
+    return cmap
+
+def install_channel_map(cmap):
+    global channel_map
+    channel_map = cmap
+    compile_switch_limits()
+    unpatched = ((1 << MAX_CHANNELS) - 1) & ~((1 << CHANNEL_COUNT) - 1)
+    idle = range(CHANNEL_COUNT, MAX_CHANNELS)
+    commit_outputs(0, unpatched, dmx=(idle, bytes(len(idle))), cause=CAUSE_CONFIG)
+    with sync_lock:
+        sync_staged.clear()                                    # staged under the old map
+
+def compile_channel_map():
+    install_channel_map(build_channel_map())
+
+def threshold_table(setpoint):
+    return bytes(1 if PERCENT_LUT[v] >= setpoint else 0 for v in range(256))
+
+def _apply_slots(ids, relays, umask, disp, vals, u, rslots, sync=0, opts=0):
+    global desired_mask
+    cur = output_mask
+    on = relays(vals, cur)
+    desired_mask = (desired_mask & ~umask) | on
+    limited = (on ^ cur) & umask & switch_limited
+    if limited:
+        on = gate_switches(on, limited, clock())
+    if disp is not None:
+        vals = disp(vals)                                      # one value per relay for the UI and journal
+    frame = (on, umask, (ids, [PERCENT_LUT[v] for v in vals]), u, rslots, vals)
+    if sync and stage_sync(sync, opts, frame):
+        return
+    commit_frame(frame, frame_t0)
+
+def commit_frame(frame, t0):
+    # t0: arrival of the packet that released the frame (None: sync timeout)
+    on, umask, dmx, u, slots, vals = frame
+    if commit_outputs(on, umask, dmx=dmx, u=u, slots=slots, vals=vals) and t0 is not None:
+        dt = time.perf_counter_ns() - t0
+        switch_hist[bisect_left(HIST_BOUNDS_NS, dt)] += 1
+        metric_sums['switch_ns'] += dt
+    if startup['first_output'] is None:
+        mark_startup('first_output')
+    notify_status()
+
+# -------------------------- RELAY LOGIC --------------------------
+# config['logic'][i], when not empty, replaces relay i's channel/setpoint compare
+# with an expression over slots of the relay's universe:
+#   ch10 >= 50%          >= > <= < == != against a raw value or a percent
+#   ch10 in 40-60%       inclusive range (also 102..153)
+#   ch12:13 > 32767      16-bit value, coarse:fine
+#   any(ch20-27) > 0     also all(...); lists like any(ch1, ch5-8, ch9:10)
+#   ch11                 non-zero
+# joined with and / or / not and parentheses. Percent uses the UI's rounding, so
+# `ch10 >= 51%` switches exactly like setpoint 51. Expressions have no
+# hysteresis; min_on_ms / min_off_ms / max_switch_hz still apply.
+# All relays of a universe are compiled into one generated function per map
+# build: a frame costs one call that reads only the slots the rules name.
+# slots, numbers and words end at a word boundary: `ch1in 1-2` is not `ch1 in 1-2`
+LOGIC_TOKEN = re.compile(r'\s*(?:(ch\d+(?::\d+|-\d+)?(?![a-z0-9]))|(\d+%?(?![a-z0-9]))|(>=|<=|==|!=|\.\.|[<>=(),-])'
+                         r'|([a-z]+(?![a-z0-9])))')
+LOGIC_OPS = {'>=', '>', '<=', '<', '==', '=', '!='}
+
+class LogicError(ValueError):
+    pass
+
+def parse_logic(text):
+    # -> ('or' | 'and', [nodes]), ('not', node) or
+    #    ('test', 'one' | 'any' | 'all', [(slot, fine slot or None, lo, hi, negate)])
+    tokens, pos, text = [], 0, text.lower().rstrip()
+    while pos < len(text):
+        m = LOGIC_TOKEN.match(text, pos)
+        if m is None:
+            raise LogicError(f"unexpected {text[pos:].strip()[:16]!r}")
+        tokens.append(m.group(m.lastindex))
+        pos = m.end()
+    at = [0]
+
+    def peek():
+        return tokens[at[0]] if at[0] < len(tokens) else None
+
+    def take(expect=None):
+        t = peek()
+        if t is None or expect and t != expect:
+            raise LogicError(f"expected {expect or 'more'} {'before ' + repr(t) if t else 'at end'}")
+        at[0] += 1
+        return t
+
+    def refs(t):
+        m = re.fullmatch(r'ch(\d+)(?::(\d+)|-(\d+))?', t)
+        if m is None:
+            raise LogicError(f"expected a slot like ch10, got {t!r}")
+        a, fine, last = (int(x) if x else None for x in m.groups())
+        for n in (a, fine, last):
+            if n is not None and not 1 <= n <= 512:
+                raise LogicError(f"slot {n} is out of range 1-512")
+        if last is not None:
+            if last < a:
+                raise LogicError(f"empty slot range ch{a}-{last}")
+            return [(n - 1, None) for n in range(a, last + 1)]
+        return [(a - 1, None if fine is None else fine - 1)]
+
+    def number(t):
+        m = re.fullmatch(r'(\d+)(%?)', t)
+        if m is None:
+            raise LogicError(f"expected a number, got {t!r}")
+        return int(m.group(1)), bool(m.group(2))
+
+    def test():
+        t = take()
+        if t in ('any', 'all'):
+            quant, slots = t, []
+            take('(')
+            slots += refs(take())
+            while peek() == ',':
+                take()
+                slots += refs(take())
+            take(')')
+        else:
+            quant, slots = 'one', refs(t)
+            if len(slots) > 1:
+                raise LogicError(f"{t} is a range: use any({t}) or all({t})")
+        op = peek()
+        if op in LOGIC_OPS:
+            take()
+            values = [number(take())]
+        elif op == 'in':
+            take()
+            values = [number(take())]
+            if peek() not in ('-', '..'):
+                raise LogicError("expected a range like 40-60%")
+            take()
+            values.append(number(take()))
+            (a, a_pct), (b, b_pct) = values
+            if a_pct and not b_pct:
+                raise LogicError(f"mixed range {a}%-{b}: write {a}-{b}% or {a}%-{b}%")
+            if b < a:
+                raise LogicError(f"empty range {a}-{b}{'%' if b_pct else ''}")
+        else:
+            op, values = '!=', [(0, False)]
+        return ('test', quant, [(c, f, *logic_bounds(op, values, 255 if f is None else 65535))
+                                for c, f in slots])
+
+    def unary():
+        if peek() == 'not':
+            take()
+            return ('not', unary())
+        if peek() == '(':
+            take()
+            node = disjunction()
+            take(')')
+            return node
+        return test()
+
+    def conjunction():
+        parts = [unary()]
+        while peek() == 'and':
+            take()
+            parts.append(unary())
+        return parts[0] if len(parts) == 1 else ('and', parts)
+
+    def disjunction():
+        parts = [conjunction()]
+        while peek() == 'or':
+            take()
+            parts.append(conjunction())
+        return parts[0] if len(parts) == 1 else ('or', parts)
+
+    tree = disjunction()
+    if peek() is not None:
+        raise LogicError(f"unexpected {peek()!r}")
+    return tree
+
+def _pct_floor(p, top):
+    # smallest raw value shown as >= p percent (same rounding as PERCENT_LUT)
+    lo, hi = 0, top + 1
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if round(mid / top * 100) >= p:
+            hi = mid
+        else:
+            lo = mid + 1
+    return lo
+
+def logic_bounds(op, values, top):
+    # -> (lo, hi, negate): the test is lo <= value <= hi, inverted for !=
+    pct = any(p for _, p in values)
+    limit = 100 if pct else top
+    for n, _ in values:
+        if n > limit:
+            raise LogicError(f"{n}{'%' if pct else ''} is out of range 0-{limit}")
+    first = (lambda x: _pct_floor(x, top)) if pct else (lambda x: x)
+    a = values[0][0]
+    if op == 'in':
+        return first(a), first(values[-1][0] + 1) - 1, False
+    return {'>=': (first(a), top, False), '>': (first(a + 1), top, False),
+            '<=': (0, first(a + 1) - 1, False), '<': (0, first(a) - 1, False),
+            '==': (first(a), first(a + 1) - 1, False), '=': (first(a), first(a + 1) - 1, False),
+            '!=': (first(a), first(a + 1) - 1, True)}[op]
+
+def logic_slots(tree):
+    # -> distinct slots in order of appearance; the first one is shown for the relay
+    out = []
+    def walk(node):
+        if node[0] == 'test':
+            for c, f, *_ in node[2]:
+                out.extend(s for s in (c, f) if s is not None)
+        elif node[0] == 'not':
+            walk(node[1])
+        else:
+            for n in node[1]:
+                walk(n)
+    walk(tree)
+    return list(dict.fromkeys(out))
+
+def emit_logic(node, index):
+    # -> Python expression over v (the universe's slot values, laid out by `index`)
+    if node[0] == 'not':
+        return f"not {emit_logic(node[1], index)}"
+    if node[0] != 'test':
+        return '(' + f" {node[0]} ".join(emit_logic(n, index) for n in node[1]) + ')'
+    terms = []
+    for c, f, lo, hi, negate in node[2]:
+        top = 255 if f is None else 65535
+        term = f"v[{index[c]}]" if f is None else f"(v[{index[c]}] << 8 | v[{index[f]}])"
+        if lo > hi or lo <= 0 and hi >= top:
+            terms.append(str((lo > hi) == negate))             # never / always true
+        elif lo == hi:
+            terms.append(f"{term} {'!=' if negate else '=='} {lo}")
+        elif lo <= 0:
+            terms.append(f"{term} {'>' if negate else '<='} {hi}")
+        elif hi >= top:
+            terms.append(f"{term} {'<' if negate else '>='} {lo}")
+        else:
+            terms.append(f"{'not ' if negate else ''}{lo} <= {term} <= {hi}")
+    if node[1] == 'one':
+        return terms[0]
+    return '(' + (' or ' if node[1] == 'any' else ' and ').join(terms) + ')'
+
+def compile_relay_logic(ids, rules, index, rslots):
+    # -> relays(v, cur): on bits for the universe's slot values v; relays without
+    # a rule keep the (switch-on, stay-on) threshold tables of their one slot
+    ns, lines = {}, ['def relays(v, cur):', '    on = 0']
+    for i, slot in zip(ids, rslots):
+        bit = 1 << i
+        if i in rules:
+            lines.append(f"    if {emit_logic(rules[i], index)}:")
+        else:
+            ns[f't{i}'] = threshold_table(config['setpoints'][i])
+            # stays on down to setpoint - hysteresis, never down to 0% (always on)
+            ns[f'h{i}'] = threshold_table(max(1, config['setpoints'][i] - config['hysteresis'][i]))
+            lines.append(f"    if (h{i} if cur & {bit} else t{i})[v[{index[slot]}]]:")
+        lines.append(f"        on |= {bit}")
+    lines.append('    return on')
+    exec(compile('\n'.join(lines), '<relay logic>', 'exec'), ns)
+    return ns['relays']
+
+_logic_slots_cache = {}
+
+def relay_logic_slots(i):
+    # -> slots relay i's logic reads, first the one whose level is shown, or
+    # None when it has no logic in effect (empty or, as in build_channel_map,
+    # not parsing: the channel compare applies)
+    text = config['logic'][i].strip()
+    if not text:
+        return None
+    slots = _logic_slots_cache.get(text)
+    if slots is None:
+        try:
+            slots = tuple(logic_slots(parse_logic(text)))
+        except LogicError:
+            slots = ()
+        if len(_logic_slots_cache) >= 256:
+            _logic_slots_cache.clear()
+        _logic_slots_cache[text] = slots
+    return slots or None
+
+def slot_ranges(slots):
+    # 0-based slots -> channel list for display, e.g. (9, 10, 11, 19) -> '10-12, 20'
+    runs = []
+    for s in sorted(set(slots)):
+        if runs and s == runs[-1][1] + 1:
+            runs[-1][1] = s
+        else:
+            runs.append([s, s])
+    return ', '.join(f"{a + 1}" if a == b else f"{a + 1}-{b + 1}" for a, b in runs)
+
+# -------------------------- SWITCH LIMITING --------------------------
+# Per relay: minimum time held ON before it may go OFF (and vice versa) and a
+# minimum gap between switches (max_switch_hz). A blocked transition is parked
+# on the timer wheel and re-checked against the latest desired state when it
+# becomes legal, so the per-packet cost stays constant.
+desired_mask = 0
+switch_limited = 0
+last_switch = []
+min_on = min_off = min_gap = []
+recheck_at = []
+
+def compile_switch_limits():
+    global switch_limited, last_switch, min_on, min_off, min_gap, recheck_at
+    min_on = [ms / 1000 for ms in config['min_on_ms']]
+    min_off = [ms / 1000 for ms in config['min_off_ms']]
+    min_gap = [1 / hz if hz else 0 for hz in config['max_switch_hz']]
+    switch_limited = sum(1 << i for i in range(CHANNEL_COUNT) if min_on[i] or min_off[i] or min_gap[i])
+    if len(last_switch) != MAX_CHANNELS:
+        last_switch = [0.0] * MAX_CHANNELS
+        recheck_at = [0.0] * MAX_CHANNELS
+
+def switch_allowed_at(i):
+    hold = min_on[i] if output_mask >> i & 1 else min_off[i]
+    return last_switch[i] + max(hold, min_gap[i])
+
+def gate_switches(on, limited, now):
+    while limited:
+        bit = limited & -limited
+        limited ^= bit
+        i = bit.bit_length() - 1
+        when = switch_allowed_at(i)
+        if now < when:
+            on ^= bit                                          # keep the current state for now
+            if recheck_at[i] != when:
+                recheck_at[i] = when
+                timer_wheel.schedule(when, recheck_relay, i)
+    return on
+
+def recheck_relay(i):
+    recheck_at[i] = 0.0
+    bit = 1 << i
+    want = desired_mask & bit
+    if want == output_mask & bit:
+        return
+    if gate_switches(want, bit, clock()) == want:
+        commit_outputs(want, bit, cause=CAUSE_HOLD)
+        notify_status()
+
+class TimerWheel:
+    # hashed wheel: SIZE buckets of TICK seconds, longer delays count down rounds
+    TICK, SIZE = 0.01, 256
+
+    def __init__(self):
+        self.buckets = [[] for _ in range(self.SIZE)]
+        self.pos = 0
+        self.pending = 0
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.pid = None
+
+    def schedule(self, when, fn, arg):
+        ticks = max(1, math.ceil((when - time.monotonic()) / self.TICK))
+        with self.lock:
+            slot = (self.pos + ticks) % self.SIZE
+            self.buckets[slot].append([(ticks - 1) // self.SIZE, fn, arg])
+            self.pending += 1
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            threading.Thread(target=self._run, daemon=True).start()
+        self.wake.set()
+
+    def _run(self):
+        next_tick = time.monotonic()
+        while True:
+            if not self.pending:
+                self.wake.wait()
+                self.wake.clear()
+                next_tick = time.monotonic()
+            next_tick += self.TICK
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            with self.lock:
+                self.pos = (self.pos + 1) % self.SIZE
+                bucket = self.buckets[self.pos]
+                due = [e for e in bucket if e[0] == 0]
+                keep = [e for e in bucket if e[0] > 0]
+                for e in keep:
+                    e[0] -= 1
+                self.buckets[self.pos] = keep
+                self.pending -= len(due)
+            for _, fn, arg in due:
+                try:
+                    fn(arg)
+                except Exception as e:
+                    print(f"Timer callback failed: {e}")
+
+timer_wheel = TimerWheel()
+
+# -------------------------- STATUS PUSH --------------------------
+STATUS_PUSH_HZ = 20        # max status events per second per client
+STATS_INTERVAL = 2.0       # seconds between CPU/memory events
+status_version = 0
+status_cond = threading.Condition()
+
+def notify_status():
+    global status_version
+    with status_cond:
+        status_version += 1
+        status_cond.notify_all()
 
 # -------------------------- GLOBAL sACN CALLBACK --------------------------
 def sacn_packet_handler(packet):
-    global current_dmx_values, relay_states
     if packet.dmxStartCode != 0x00:
         return
-    d = packet.dmxData
-    for i in range(CHANNEL_COUNT):
-        ch = config['channels'][i]
-        if len(d) < ch:
-            continue
-        val = d[ch-1]
-        percent = round(val / 255 * 100)
-        current_dmx_values[i] = percent
-        setpoint = config['setpoints'][i]
-        new_state = percent >= setpoint
-        if new_state != relay_states[i]:
-            relay_states[i] = new_state
-            relays[i].on() if new_state else relays[i].off()
-    for i in range(CHANNEL_COUNT, MAX_CHANNELS):
-        if relay_states[i]:
-            relay_states[i] = False
-            relays[i].off()
-        current_dmx_values[i] = 0
+    process_frame(packet.universe, packet.dmxData, bytes(packet.cid), packet.priority,
+                  packet.sequence, (0x40 if packet.option_StreamTerminated else 0)
+                  | (OPT_FORCE_SYNC if packet.option_ForceSync else 0), packet.syncAddr)
+
+def process_frame(u, d, cid=b'', prio=100, seq=-1, opts=0, sync=0):
+    # d: the universe's DMX slots (start code excluded), any indexable of ints
+    global frame_t0
+    frame_t0 = t0 = time.perf_counter_ns()
+    st = universe_stats.get(u)
+    if st is not None:
+        st.arrival(t0)
+    fw = forward_map.get(u)
+    if fw is not None:
+        forward_frame(fw, d, cid, prio, seq, opts)
+    _decode_frame(u, d, cid, prio, seq, opts, sync)
+    dt = time.perf_counter_ns() - t0
+    handler_hist[bisect_left(HIST_BOUNDS_NS, dt)] += 1
+    metric_sums['handler_ns'] += dt
+
+def _decode_frame(u, d, cid, prio, seq, opts, sync):
+    cmap = channel_map.get(u)
+    if cmap is None:
+        return
+    getter, ids, relays, umask, disp, need, slots, src, rslots = cmap
+    if len(d) < need:
+        # short frame: slots that are not present keep their last value
+        n = len(d)
+        prev = src.last or bytes(len(slots))
+        vals = tuple(d[s] if s < n else p for s, p in zip(slots, prev))
+    else:
+        vals = getter(d)
+    vals = src.update(cid, prio, seq, opts, vals, clock())
+    if vals is None or vals == src.last:
+        return
+    src.last = vals
+    _apply_slots(ids, relays, umask, disp, vals, u, rslots, sync, opts)
+
+# -------------------------- E1.31 SYNCHRONIZATION --------------------------
+# A data packet naming a synchronization address is decoded and thresholded as
+# usual, but while the node is synchronized on that address (a sync packet for
+# it within the data loss timeout) its relay mask is staged per universe, and
+# everything staged on the address is committed together when the sync packet
+# arrives, so several nodes switch on the same multicast packet. Until a sync
+# packet has been seen, and once none has come for the timeout, frames apply on
+# arrival. A lost sync packet (E1.31 6.2.6, Force_Synchronization):
+#   1  the stage is released after SYNC_HOLD
+#   0  the stage is held until synchronization is declared lost, the data loss
+#      timeout after the last sync packet, then released; strictly the relays
+#      would freeze until sync resumes, which a dead sync source never does
+SYNC_HOLD = 0.05
+OPT_FORCE_SYNC = 0x20
+sync_staged = {}       # sync address -> {universe: frame for commit_frame()}
+sync_seen = {}         # sync address -> clock() of its last sync packet
+sync_groups = set()    # sync addresses seen in data packets, joined like universes
+sync_lock = threading.Lock()
+
+def stage_sync(addr, opts, frame):
+    if addr not in sync_groups:
+        learn_sync_address(addr)
+    seen = sync_seen.get(addr)
+    now = clock()
+    if seen is None or now - seen > E131_DATA_LOSS_TIMEOUT:
+        return False                                           # not synchronized: apply now
+    with sync_lock:
+        staged = sync_staged.get(addr)
+        if staged is None:
+            staged = sync_staged[addr] = {}
+            hold = SYNC_HOLD if opts & OPT_FORCE_SYNC else seen + E131_DATA_LOSS_TIMEOUT - now
+            timer_wheel.schedule(time.monotonic() + hold, sync_timeout, (addr, staged))
+        staged[frame[3]] = frame
+    return True
+
+def sync_packet(addr):
+    t0 = time.perf_counter_ns()
+    sync_seen[addr] = clock()
+    with sync_lock:
+        staged = sync_staged.pop(addr, None)
+    if staged:
+        metric_sums['sync_commits'] += 1
+        for frame in staged.values():
+            commit_frame(frame, t0)
+
+def sync_timeout(arg):
+    addr, staged = arg
+    with sync_lock:
+        if sync_staged.get(addr) is not staged:
+            return                                             # already released by its sync packet
+        del sync_staged[addr]
+    metric_sums['sync_timeouts'] += 1
+    for frame in staged.values():
+        commit_frame(frame, None)
+
+def learn_sync_address(addr):
+    # sync packets are multicast to the sync address's own group: join it once
+    sync_groups.add(addr)
+    with sacn_lock:
+        if receiver:
+            join_new(sacn_universes())
+
+# -------------------------- METRICS --------------------------
+# Cheap enough to stay on: a few integer adds per packet, fixed-bucket histograms
+# of handler time and packet-arrival-to-relay-write latency, per-universe
+# counters and RFC 3550 style inter-arrival jitter.
+HIST_BOUNDS_NS = [10_000, 25_000, 50_000, 100_000, 250_000, 500_000,
+                  1_000_000, 2_500_000, 5_000_000, 10_000_000]
+handler_hist = [0] * (len(HIST_BOUNDS_NS) + 1)
+switch_hist = [0] * (len(HIST_BOUNDS_NS) + 1)
+metric_sums = {'handler_ns': 0, 'switch_ns': 0, 'sync_commits': 0, 'sync_timeouts': 0}
+frame_t0 = 0
+universe_stats = {}
+startup = {'network': None, 'joined': None, 'first_output': None}   # seconds after STARTED
+
+def mark_startup(stage):
+    if startup[stage] is None:
+        startup[stage] = round(time.monotonic() - STARTED, 3)
+        print(f"Startup: {stage} after {startup[stage]} s")
+
+class UniverseStats:
+    __slots__ = ('packets', 'gaps', 'out_of_order', 'last_ns', 'interval_ns', 'jitter_ns')
+
+    def __init__(self):
+        self.packets = self.gaps = self.out_of_order = self.last_ns = 0
+        self.interval_ns = self.jitter_ns = 0.0
+
+    def arrival(self, now_ns):
+        self.packets += 1
+        if self.last_ns:
+            iv = now_ns - self.last_ns
+            if self.interval_ns:
+                self.jitter_ns += (abs(iv - self.interval_ns) - self.jitter_ns) / 16
+                self.interval_ns += (iv - self.interval_ns) / 16
+            else:
+                self.interval_ns = iv
+        self.last_ns = now_ns
+
+def metrics_snapshot():
+    if realtime_role == 'web':
+        with realtime_lock:
+            realtime_conn.send(('metrics',))
+            return realtime_conn.recv()
+    return {
+        'universes': {u: (st.packets, st.gaps, st.out_of_order, st.interval_ns, st.jitter_ns)
+                      for u, st in universe_stats.items()},
+        'handler_hist': list(handler_hist), 'switch_hist': list(switch_hist),
+        'sums': dict(metric_sums),
+        'relay_switches': list(relay_switches),
+        'relay_states': [bool(x) for x in state.snapshot()[2]],
+        'startup': dict(startup),
+    }
+
+def metrics_prometheus(m):
+    out = []
+    def metric(name, kind, help_, samples):
+        out.append(f"# HELP {name} {help_}\n# TYPE {name} {kind}")
+        out.extend(f"{name}{labels} {value}" for labels, value in samples)
+    def histogram(name, help_, hist, sum_ns):
+        samples, acc = [], 0
+        for bound, n in zip(HIST_BOUNDS_NS + [None], hist):
+            acc += n
+            le = '+Inf' if bound is None else f"{bound / 1e9:g}"
+            samples.append((f'_bucket{{le="{le}"}}', acc))
+        samples += [('_sum', sum_ns / 1e9), ('_count', acc)]
+        out.append(f"# HELP {name} {help_}\n# TYPE {name} histogram")
+        out.extend(f"{name}{suffix} {value}" for suffix, value in samples)
+    us = sorted(m['universes'].items())
+    metric('sacn_packets_total', 'counter', 'Packets received per patched universe.',
+           [(f'{{universe="{u}"}}', v[0]) for u, v in us])
+    metric('sacn_sequence_gaps_total', 'counter', 'Packets missed according to sequence numbers.',
+           [(f'{{universe="{u}"}}', v[1]) for u, v in us])
+    metric('sacn_out_of_order_total', 'counter', 'Packets dropped as out of order.',
+           [(f'{{universe="{u}"}}', v[2]) for u, v in us])
+    metric('sacn_packet_rate_hz', 'gauge', 'Smoothed packet rate.',
+           [(f'{{universe="{u}"}}', round(1e9 / v[3], 2) if v[3] else 0) for u, v in us])
+    metric('sacn_jitter_seconds', 'gauge', 'Smoothed packet inter-arrival jitter.',
+           [(f'{{universe="{u}"}}', v[4] / 1e9) for u, v in us])
+    histogram('sacn_handler_seconds', 'Packet handler execution time.',
+              m['handler_hist'], m['sums']['handler_ns'])
+    histogram('sacn_switch_latency_seconds', 'Packet arrival to relay output write.',
+              m['switch_hist'], m['sums']['switch_ns'])
+    metric('sacn_sync_total', 'counter', 'Staged frames released by their sync packet or by the hold timeout.',
+           [('{result="sync"}', m['sums']['sync_commits']),
+            ('{result="timeout"}', m['sums']['sync_timeouts'])])
+    metric('relay_switches_total', 'counter', 'Relay state changes.',
+           [(f'{{relay="{i + 1}"}}', n) for i, n in enumerate(m['relay_switches'])])
+    metric('relay_state', 'gauge', 'Current relay output (1 = on).',
+           [(f'{{relay="{i + 1}"}}', int(v)) for i, v in enumerate(m['relay_states'])])
+    metric('startup_seconds', 'gauge', 'Process start to network up, universes joined and first relay output.',
+           [(f'{{stage="{k}"}}', v) for k, v in m['startup'].items() if v is not None])
+    return '\n'.join(out) + '\n'
+
+# Binary snapshot, little endian:
+#   'SRM1' u16 universes u16 buckets u16 relays u16 pad  f64 unix time
+#   universes x (u16 universe, u16 pad, u64 packets, u64 gaps, u64 out of order,
+#                f32 interval us, f32 jitter us)
+#   buckets x u64 handler, buckets x u64 switch latency, u64 handler sum ns, u64 switch sum ns
+#   relays x (u64 switches), relays x u8 state
+METRICS_HEADER = struct.Struct('<4sHHHHd')
+METRICS_UNIVERSE = struct.Struct('<HHQQQff')
+
+def metrics_binary(m):
+    us = sorted(m['universes'].items())
+    nb, nr = len(m['handler_hist']), len(m['relay_switches'])
+    out = bytearray(METRICS_HEADER.pack(b'SRM1', len(us), nb, nr, 0, time.time()))
+    for u, (packets, gaps, ooo, interval, jitter) in us:
+        out += METRICS_UNIVERSE.pack(u, 0, packets, gaps, ooo, interval / 1e3, jitter / 1e3)
+    out += struct.pack(f'<{nb}Q{nb}QQQ', *m['handler_hist'], *m['switch_hist'],
+                       m['sums']['handler_ns'], m['sums']['switch_ns'])
+    out += struct.pack(f'<{nr}Q{nr}B', *m['relay_switches'], *m['relay_states'])
+    return bytes(out)
+
+# -------------------------- SOURCE ARBITRATION --------------------------
+# Per-universe table of up to MAX_SOURCES senders keyed by CID. The highest
+# priority wins; sources sharing the top priority are merged HTP (per-slot max)
+# or LTP (the source whose values changed last). A source drops out on the
+# E1.31 network data loss timeout or its Stream_Terminated option bit.
+MAX_SOURCES = 4
+E131_DATA_LOSS_TIMEOUT = 2.5
+OPT_ARTNET = 0x01     # reserved E1.31 option bit, set on Art-Net frames: sequence runs 1..255
+
+class SourceTable:
+    __slots__ = ('policy', 'cids', 'prio', 'seq', 'seen', 'changed', 'vals', 'active', 'stats', 'last', 'top')
+
+    def __init__(self, policy='htp', stats=None):
+        self.policy = policy
+        self.cids = [None] * MAX_SOURCES
+        self.prio = [0] * MAX_SOURCES
+        self.seq = [0] * MAX_SOURCES
+        self.stats = stats
+        self.seen = [0.0] * MAX_SOURCES
+        self.changed = [0.0] * MAX_SOURCES
+        self.vals = [None] * MAX_SOURCES
+        self.active = [0]          # one cell, shared with remapped copies
+        self.last = None           # last merged frame handed to the relays
+        self.top = 0               # priority of the last merged frame
+
+    def remap(self, old_slots, new_slots, policy):
+        # copy for a new slot list; slots a source has not sent yet read 0.
+        # Source identity, priority, sequence and timing are shared, not copied:
+        # frames this table still takes until the new map is swapped in keep the
+        # copy in step. `last` becomes a list, which never equals a frame tuple,
+        # so the next frame is applied under the new thresholds even if unchanged.
+        pos = {s: i for i, s in enumerate(old_slots)}
+        pick = [pos.get(s) for s in new_slots]
+        def conv(v):
+            return None if v is None else tuple(0 if i is None else v[i] for i in pick)
+        t = SourceTable(policy, self.stats)
+        t.cids, t.prio, t.seq, t.seen, t.changed = self.cids, self.prio, self.seq, self.seen, self.changed
+        t.vals = [conv(v) for v in self.vals]
+        t.active = self.active
+        t.last = list(conv(self.last)) if self.last is not None else None
+        return t
+
+    def _release(self, k):
+        self.cids[k] = self.vals[k] = None
+        self.active[0] -= 1
+
+    def update(self, cid, prio, seq, opts, vals, now):
+        cids = self.cids
+        for k in range(MAX_SOURCES):
+            if cids[k] == cid:
+                break
+        else:
+            if opts & 0x40:
+                return None
+            for k in range(MAX_SOURCES):
+                if cids[k] is None or now - self.seen[k] > E131_DATA_LOSS_TIMEOUT:
+                    break
+            else:
+                return None                                    # source limit exceeded
+            if cids[k] is None:
+                self.active[0] += 1
+            cids[k] = bytes(cid)
+            self.vals[k] = None
+            self.seq[k] = (seq - 1) & 0xFF
+        if seq >= 0:
+            diff = (seq - self.seq[k]) & 0xFF
+            if opts & OPT_ARTNET and seq < self.seq[k]:
+                diff -= 1                                      # 255 -> 1 is one step
+            if diff == 0 or diff > 236:                        # -20 < diff <= 0: out of order
+                if self.stats:
+                    self.stats.out_of_order += 1
+                return None
+            if diff > 1 and self.stats:
+                self.stats.gaps += diff - 1
+            self.seq[k] = seq
+        if opts & 0x40:
+            self._release(k)
+            vals = None
+        else:
+            self.prio[k] = prio
+            self.seen[k] = now
+            if vals != self.vals[k]:
+                self.vals[k] = vals
+                self.changed[k] = now
+            if self.active[0] == 1:
+                self.top = prio
+                return vals
+        return self.merge(now)
+
+    def merge(self, now):
+        top, winners = -1, []
+        for k in range(MAX_SOURCES):
+            if self.cids[k] is None or self.vals[k] is None:
+                continue                                       # vals None: first frame went to the old map
+            if now - self.seen[k] > E131_DATA_LOSS_TIMEOUT:
+                self._release(k)
+            elif self.prio[k] > top:
+                top, winners = self.prio[k], [k]
+            elif self.prio[k] == top:
+                winners.append(k)
+        if not winners:
+            return None
+        self.top = top
+        if len(winners) == 1:
+            return self.vals[winners[0]]
+        if self.policy == 'ltp':
+            return self.vals[max(winners, key=self.changed.__getitem__)]
+        return tuple(map(max, *(self.vals[k] for k in winners)))
 
 # -------------------------- Config --------------------------
+RELAY_PINS = [17, 18, 27, 22, 23, 24, 25, 26]
+
 config_file = os.path.join(APP_DIR, 'config.json')
 py_file = os.path.join(APP_DIR, 'sacn_relay_controller.py')
 
@@ -83,21 +894,41 @@ default_config = {
     'gateway': '192.168.1.1', 'dns1': '8.8.8.8', 'dns2': '8.8.4.4',
     'hostname': 'raspberrypi',
     'universe': 1,
+    'universes': [0, 0, 0, 0, 0, 0, 0, 0],
     'channels': [1, 2, 3, 4, 5, 6, 7, 8],
     'setpoints': [51, 51, 51, 51, 51, 51, 51, 51],
+    'hysteresis': [0, 0, 0, 0, 0, 0, 0, 0],
+    'min_on_ms': [0, 0, 0, 0, 0, 0, 0, 0],
+    'min_off_ms': [0, 0, 0, 0, 0, 0, 0, 0],
+    'max_switch_hz': [0, 0, 0, 0, 0, 0, 0, 0],
+    'logic': ['', '', '', '', '', '', '', ''],    # per-relay expression, see parse_logic()
     'mode': '4',
     'version': CURRENT_VERSION,
     'theme': 'light',
     'security_enabled': False,
     'password': 'admin123',
-    'py_file': py_file
+    'py_file': py_file,
+    'realtime': {'enabled': False, 'cpu': 3, 'priority': 50},
+    'receiver': 'native',
+    'merge': 'htp',
+    'outputs': [{'type': 'gpio', 'pins': RELAY_PINS, 'backend': 'register'}],
+    'forward': [],
+    'artnet': [],       # [{'universe': u, 'port_address': n}]: u arrives as Art-Net instead of sACN
+    'cid': ''
 }
 config = default_config.copy()
 current_hostname = socket.gethostname()
 config['hostname'] = current_hostname
 
+RELAY_FIELDS = {'universes': 0, 'channels': 1, 'setpoints': 51, 'hysteresis': 0,
+                'min_on_ms': 0, 'min_off_ms': 0, 'max_switch_hz': 0, 'logic': ''}
+
+def pad_relay_fields(cfg, n):
+    for key, fill in RELAY_FIELDS.items():
+        cfg[key] = (list(cfg.get(key, [])) + [fill]*n)[:n]
+
 def load_config():
-    global config
+    global journaled_config
     try:
         with open(config_file) as f:
             loaded = json.load(f)
@@ -106,24 +937,562 @@ def load_config():
                 loaded[key] = value
         if loaded['version'] != CURRENT_VERSION:
             loaded['version'] = CURRENT_VERSION
-        loaded['channels'] = (loaded.get('channels', []) + [1]*8)[:8]
-        loaded['setpoints'] = (loaded.get('setpoints', []) + [51]*8)[:8]
+        if not valid_outputs(loaded['outputs'], fake=True):
+            print(f"Bad outputs in {config_file}, using the default: {loaded['outputs']}")
+            loaded['outputs'] = copy.deepcopy(default_config['outputs'])
+        pad_relay_fields(loaded, output_count(loaded['outputs']))
         config.update(loaded)
+        if not config['cid']:
+            config['cid'] = uuid.uuid4().hex
+            save_config()
     except FileNotFoundError:
         config.update(default_config)
+        pad_relay_fields(config, output_count(config['outputs']))
         config['hostname'] = current_hostname
+        config['cid'] = uuid.uuid4().hex
         save_config()
+    journaled_config = copy.deepcopy(config)
+
+# -------------------------- CONFIG STORE --------------------------
+# `config` stays the live dict everything reads. save_config() records a
+# versioned snapshot and wakes the writer thread, which waits for
+# CONFIG_DEBOUNCE s without further saves (CONFIG_MAX_DELAY s at most) and
+# persists only the newest snapshot: write config.json.tmp, fsync, rename over
+# config.json, fsync the directory. A power cut leaves the old or the new file.
+CONFIG_DEBOUNCE = 0.5
+CONFIG_MAX_DELAY = 5.0
+config_version = 0
+config_written = 0
+config_urgent = False
+config_snapshots = deque(maxlen=8)     # (version, deep copy), newest last
+config_cond = threading.Condition()
+config_writer_pid = None
+journaled_config = {}                  # the config the journal last recorded changes against
+
+def save_config(sync=False):
+    # every route that changes config saves it, so changes are journaled here
+    global config_version, config_writer_pid, journaled_config
+    with config_cond:
+        config_version += 1
+        snap = copy.deepcopy(config)
+        config_snapshots.append((config_version, snap))
+        changed = {k for k, v in snap.items() if journaled_config.get(k) != v}
+        journaled_config = snap
+        config_cond.notify_all()
+        if config_writer_pid != os.getpid():
+            config_writer_pid = os.getpid()
+            threading.Thread(target=config_writer, daemon=True).start()
+    journal_config(changed)
+    if sync:
+        flush_config()
+
+def config_snapshot():
+    # -> (version, copy of the newest saved config)
+    with config_cond:
+        if not config_snapshots:
+            return 0, copy.deepcopy(config)
+        version, snap = config_snapshots[-1]
+        return version, copy.deepcopy(snap)
+
+def flush_config(timeout=10):
+    # block until everything saved so far is on disk
+    global config_urgent
+    with config_cond:
+        if config_written >= config_version or config_writer_pid != os.getpid():
+            return
+        config_urgent = True
+        config_cond.notify_all()
+        config_cond.wait_for(lambda: config_written >= config_version, timeout)
+
+def write_config_file(snap):
+    write_json_file(config_file, snap)
+
+def write_json_file(path, obj):
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(obj, f, indent=4)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    fsync_dir(os.path.dirname(os.path.abspath(path)))
+
+def fsync_dir(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def config_writer():
+    global config_written, config_urgent
+    while True:
+        with config_cond:
+            config_cond.wait_for(lambda: config_version > config_written)
+            deadline = time.monotonic() + CONFIG_MAX_DELAY
+            while not config_urgent:
+                seen = config_version
+                config_cond.wait(max(0, min(CONFIG_DEBOUNCE, deadline - time.monotonic())))
+                if config_version == seen or time.monotonic() >= deadline:
+                    break
+            config_urgent = False
+            version, snap = config_snapshots[-1]
+        try:
+            write_config_file(snap)
+        except OSError as e:
+            print(f"Config save failed: {e}")
+            time.sleep(1)
+            continue
+        with config_cond:
+            config_written = version
+            config_cond.notify_all()
+
+atexit.register(flush_config)
+
+# -------------------------- OUTPUT BOARDS --------------------------
+# Every board takes the whole output word for its relays in one write(mask, changed)
+# call, bit n = relay n on that board.
+class GPIOMemBoard:
+    # BCM283x/BCM2711 GPIO registers via /dev/gpiomem: one GPCLR0/GPSET0 store
+    # latches every pin in the mask at the same instant
+    GPFSEL0, GPSET0, GPCLR0 = 0x00, 0x1C, 0x28
+
+    def __init__(self, pins):
+        try:
+            with open('/proc/device-tree/compatible', 'rb') as f:
+                if b'bcm2712' in f.read():
+                    raise RuntimeError("Pi 5 (RP1) GPIO is not register compatible")
+        except FileNotFoundError:
+            pass
+        if any(not 0 <= p < 32 for p in pins):
+            raise ValueError("Only GPIO bank 0 pins are supported")
+        fd = os.open('/dev/gpiomem', os.O_RDWR | os.O_SYNC)
+        try:
+            self.mem = mmap.mmap(fd, 4096, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        finally:
+            os.close(fd)
+        self.regs = memoryview(self.mem).cast('I')
+        self.count = len(pins)
+        self.pin_bits = [1 << p for p in pins]
+        # active low: drive every pin high (relay off) before switching it to output
+        self.regs[self.GPSET0 // 4] = sum(self.pin_bits)
+        for p in pins:
+            r, sh = self.GPFSEL0 // 4 + p // 10, (p % 10) * 3
+            self.regs[r] = (self.regs[r] & ~(7 << sh)) | (1 << sh)
+
+    def write(self, mask, changed):
+        on = off = 0
+        for bit, pb in enumerate(self.pin_bits):
+            if changed >> bit & 1:
+                if mask >> bit & 1:
+                    on |= pb
+                else:
+                    off |= pb
+        if on:
+            self.regs[self.GPCLR0 // 4] = on
+        if off:
+            self.regs[self.GPSET0 // 4] = off
+
+class GPIOBoard:
+    # gpiozero fallback: one call per changed relay
+    def __init__(self, pins):
+        from gpiozero import OutputDevice
+        self.devices = [OutputDevice(p, active_high=False, initial_value=False) for p in pins]
+        self.count = len(pins)
+
+    def write(self, mask, changed):
+        for bit, dev in enumerate(self.devices):
+            if changed >> bit & 1:
+                dev.on() if mask >> bit & 1 else dev.off()
+
+class MCP23017Board:
+    IODIRA, OLATA = 0x00, 0x14
 
-def save_config():
-    with open(config_file, 'w') as f:
-        json.dump(config, f, indent=4)
+    def __init__(self, bus=1, address=0x20, count=16, active_low=True):
+        from smbus2 import SMBus
+        self.bus = SMBus(bus)
+        self.address = address
+        self.count = count
+        self.active_low = active_low
+        self.write(0, 0)
+        self.bus.write_i2c_block_data(address, self.IODIRA, [0x00, 0x00])
 
-load_config()
+    def write(self, mask, changed):
+        # OLATA/OLATB in one sequential block write
+        port = mask ^ 0xFFFF if self.active_low else mask
+        self.bus.write_i2c_block_data(self.address, self.OLATA, [port & 0xFF, port >> 8])
 
-MAX_CHANNELS = 8
-CHANNEL_COUNT = 4 if config['mode'] == '4' else 8
+class FakeBoard:
+    def __init__(self, count=8):
+        self.count = count
+        self.mask = 0
+        self.writes = []
+
+    def write(self, mask, changed):
+        self.mask = mask
+        self.writes.append((time.perf_counter(), mask, changed))
+
+def gpio_board(pins, backend='register'):
+    if backend == 'register':
+        try:
+            return GPIOMemBoard(pins)
+        except Exception as e:
+            print(f"GPIO register access unavailable ({e}), using gpiozero")
+    return GPIOBoard(pins)
+
+BOARD_TYPES = {'gpio': gpio_board, 'mcp23017': MCP23017Board, 'fake': FakeBoard}
+
+def output_count(outputs):
+    return sum(len(o.get('pins', ())) if o.get('type') == 'gpio'
+               else o.get('count', 16 if o.get('type') == 'mcp23017' else 8) for o in outputs)
+
+def valid_board(o, fake=False):
+    # one outputs entry has what its board needs; 'fake' only from a hand-edited file
+    if not isinstance(o, dict):
+        return False
+    t = o.get('type')
+    if t == 'gpio':
+        pins = o.get('pins')
+        return (set(o) <= {'type', 'pins', 'backend'} and isinstance(pins, list) and bool(pins)
+                and all(type(p) is int and 0 <= p <= 27 for p in pins) and len(set(pins)) == len(pins)
+                and o.get('backend', 'register') in ('register', 'gpiozero'))
+    if t == 'mcp23017':
+        return (set(o) <= {'type', 'bus', 'address', 'count', 'active_low'}
+                and type(o.get('count')) is int and 1 <= o['count'] <= 16
+                and type(o.get('address')) is int and 0x20 <= o['address'] <= 0x27
+                and type(o.get('bus', 1)) is int and o.get('bus', 1) >= 0
+                and type(o.get('active_low', True)) is bool)
+    return (fake and t == 'fake' and set(o) <= {'type', 'count'}
+            and type(o.get('count', 8)) is int and 1 <= o.get('count', 8) <= 64)
+
+def valid_outputs(v, fake=False):
+    return isinstance(v, list) and bool(v) and all(valid_board(o, fake) for o in v)
+
+def build_outputs(outputs):
+    # -> [(board, first relay index, board bit mask)]
+    boards, offset = [], 0
+    for o in outputs:
+        kwargs = {k: v for k, v in o.items() if k != 'type'}
+        try:
+            b = BOARD_TYPES[o['type']](**kwargs)
+        except Exception as e:
+            print(f"Output board {o} not available: {e}")
+            b = FakeBoard(output_count([o]))
+        boards.append((b, offset, (1 << b.count) - 1))
+        offset += b.count
+    return boards
+
+# -------------------------- SHARED STATE --------------------------
+# Seqlock over preallocated storage: [seq u32][pad u32][generation u64]
+# [dmx % x N][relay state x N]. Writers (serialised by output_lock) make seq odd,
+# write, bump the generation and make seq even again; readers copy and retry if
+# seq moved, so they never block the packet thread. The buffer can be a
+# SharedMemory block to share it across processes.
+class StateBlock:
+    HEADER = 16
+
+    def __init__(self, n, buf=None):
+        self.n = n
+        self.buf = buf if buf is not None else bytearray(self.HEADER + 2 * n)
+        self.dmx = memoryview(self.buf)[self.HEADER:self.HEADER + n]
+        self.relays = memoryview(self.buf)[self.HEADER + n:self.HEADER + 2 * n]
+        self.seq, self.generation = struct.unpack_from('<IxxxxQ', self.buf, 0)
+
+    def begin(self):
+        self.seq = (self.seq + 1) | 1
+        struct.pack_into('<I', self.buf, 0, self.seq)
+
+    def end(self):
+        self.generation += 1
+        struct.pack_into('<Q', self.buf, 8, self.generation)
+        self.seq += 1
+        struct.pack_into('<I', self.buf, 0, self.seq)
+
+    def read_generation(self):
+        return struct.unpack_from('<Q', self.buf, 8)[0]
+
+    def snapshot(self):
+        # -> (generation, dmx % bytes, relay state bytes), all from the same publish
+        while True:
+            seq = struct.unpack_from('<I', self.buf, 0)[0]
+            if seq & 1:
+                time.sleep(0)
+                continue
+            gen = struct.unpack_from('<Q', self.buf, 8)[0]
+            dmx, relays = bytes(self.dmx), bytes(self.relays)
+            if struct.unpack_from('<I', self.buf, 0)[0] == seq:
+                return gen, dmx, relays
+
+def attach_state(buf=None):
+    global state
+    state = StateBlock(MAX_CHANNELS, buf)
+
+# -------------------------- JOURNAL --------------------------
+# Relay transitions, config changes and node starts as fixed 32-byte records in
+# a preallocated ring file mapped into memory. An append is one pack_into; the
+# kernel writes dirty pages back and journal_flusher() msyncs every
+# JOURNAL_FLUSH_INTERVAL, never per event. The header holds the record count
+# and the time of the first record of every JOURNAL_BLOCK records, so a time
+# range query bisects the blocks and reads only from the right one onwards.
+# Times are wall clock: a clock step (NTP after a cold boot) splits the order.
+# With realtime.enabled the forked realtime process appends to the same
+# mapping as the web process; appends take an fcntl lock on the file as well
+# as the thread lock, so the two never claim the same slot.
+JOURNAL_MAGIC = b'SRJRNL1\x00'
+# ns since epoch, kind, relay, state, cause, universe, slot, value, a, b
+JOURNAL_RECORD = struct.Struct('<qBBBBHHB3xII4x')
+JOURNAL_RECORDS = 65536            # 2 MiB
+JOURNAL_BLOCK = 256
+JOURNAL_HEADER = 4096              # magic, record size, capacity, count, block index at 64
+JOURNAL_FLUSH_INTERVAL = 10.0
+J_RELAY, J_CONFIG, J_START = 1, 2, 3
+CAUSE_DMX, CAUSE_HOLD, CAUSE_ACTION, CAUSE_CONFIG = 1, 2, 3, 4
+CAUSES = ('', 'dmx', 'hold', 'action', 'config')
+# bit i of a config record's `a` = key i changed; append only, old records index into it
+JOURNAL_CONFIG_KEYS = ('network', 'ip', 'subnet', 'gateway', 'dns1', 'dns2', 'hostname', 'universe',
+                       'universes', 'channels', 'setpoints', 'hysteresis', 'min_on_ms', 'min_off_ms',
+                       'max_switch_hz', 'mode', 'version', 'theme', 'security_enabled', 'password',
+                       'py_file', 'realtime', 'receiver', 'merge', 'outputs', 'forward', 'artnet', 'cid', 'logic')
+journal_file = os.path.join(APP_DIR, 'journal.bin')
+journal = None       # opened by run_node(); replay, benches and mock nodes do not journal
+
+class Journal:
+    def __init__(self, path, records=JOURNAL_RECORDS, writable=True):
+        size = JOURNAL_HEADER + records * JOURNAL_RECORD.size
+        fd = os.open(path, os.O_RDWR | os.O_CREAT if writable else os.O_RDONLY, 0o644)
+        try:
+            hdr = os.pread(fd, 16, 0)
+            if writable and (hdr[:8] != JOURNAL_MAGIC or hdr[8:] != struct.pack('<II', JOURNAL_RECORD.size, records)):
+                os.ftruncate(fd, 0)                            # new file or another layout: start over
+                os.pwrite(fd, JOURNAL_MAGIC + struct.pack('<IIQ', JOURNAL_RECORD.size, records, 0), 0)
+            elif hdr[:8] != JOURNAL_MAGIC:
+                raise ValueError(f"{path} is not a relay journal")
+            if writable:
+                os.posix_fallocate(fd, 0, size)                # appends never grow the file
+            self.mm = mmap.mmap(fd, 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+        except BaseException:
+            os.close(fd)
+            raise
+        if writable:
+            self.fd = fd                                       # kept open: appends lock it
+        else:
+            os.close(fd)
+        rsize, self.cap = struct.unpack_from('<II', self.mm, 8)
+        if rsize != JOURNAL_RECORD.size:
+            raise ValueError(f"{path}: unknown record size {rsize}")
+        self.blocks = self.cap // JOURNAL_BLOCK
+        self.lock = threading.Lock()
+        self.flushed = self.count()
+
+    def count(self):
+        return struct.unpack_from('<Q', self.mm, 16)[0]
+
+    def append(self, kind, relay=0, state=0, cause=0, universe=0, slot=0, value=0, a=0, b=0):
+        # fcntl locks are per process: the thread lock orders this process's
+        # threads, the file lock this process against the other one
+        with self.lock:
+            fcntl.lockf(self.fd, fcntl.LOCK_EX, 8, 16)         # the count field
+            try:
+                n, t = self.count(), time.time_ns()
+                JOURNAL_RECORD.pack_into(self.mm, JOURNAL_HEADER + n % self.cap * JOURNAL_RECORD.size,
+                                         t, kind, relay, state, cause, universe, slot, value, a, b)
+                if n % JOURNAL_BLOCK == 0:
+                    struct.pack_into('<q', self.mm, 64 + n // JOURNAL_BLOCK % self.blocks * 8, t)
+                struct.pack_into('<Q', self.mm, 16, n + 1)
+            finally:
+                fcntl.lockf(self.fd, fcntl.LOCK_UN, 8, 16)
+
+    def flush(self):
+        # the mapping is shared with a forked realtime child, so compare counts, not a flag
+        n = self.count()
+        if n != self.flushed:
+            self.mm.flush()
+            self.flushed = n
+
+    def query(self, t0=None, t1=None, relay=None, kinds=None, limit=1000):
+        # -> raw records with t0 <= time < t1 (ns), oldest first; `relay` filters relay records only
+        count = self.count()
+        first = max(0, count - self.cap)
+        start = first
+        if t0 is not None and count:
+            # a partly overwritten first block shares its index slot with the newest one
+            lo, hi = -(-first // JOURNAL_BLOCK), (count - 1) // JOURNAL_BLOCK
+            while lo <= hi:
+                mid = (lo + hi) // 2
+                if struct.unpack_from('<q', self.mm, 64 + mid % self.blocks * 8)[0] <= t0:
+                    start, lo = mid * JOURNAL_BLOCK, mid + 1
+                else:
+                    hi = mid - 1
+        out = []
+        for n in range(start, count):
+            rec = JOURNAL_RECORD.unpack_from(self.mm, JOURNAL_HEADER + n % self.cap * JOURNAL_RECORD.size)
+            if t1 is not None and rec[0] >= t1:
+                break
+            if t0 is not None and rec[0] < t0 or kinds and rec[1] not in kinds \
+                    or relay is not None and rec[1] == J_RELAY and rec[2] != relay:
+                continue
+            out.append(rec)
+            if len(out) >= limit:
+                break
+        return out
+
+def open_journal():
+    global journal
+    try:
+        journal = Journal(journal_file)
+    except (OSError, ValueError) as e:
+        print(f"Relay journal unavailable: {e}")
+        return
+    major, minor, patch = version_tuple(CURRENT_VERSION)[:3]
+    journal.append(J_START, a=major << 16 | minor << 8 | patch)
+    atexit.register(journal.flush)
+    threading.Thread(target=journal_flusher, daemon=True).start()
+
+def journal_flusher():
+    while True:
+        time.sleep(JOURNAL_FLUSH_INTERVAL)
+        journal.flush()
+
+def journal_config(changed):
+    if journal and changed:
+        journal.append(J_CONFIG, cause=CAUSE_CONFIG,
+                       a=sum(1 << i for i, k in enumerate(JOURNAL_CONFIG_KEYS) if k in changed))
+
+def journal_entry(rec):
+    t, kind, relay, state, cause, u, slot, value, a, b = rec
+    e = {'time': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(t // 10**9)) + f".{t // 10**6 % 1000:03d}",
+         't': t / 1e9}
+    if kind == J_RELAY:
+        e.update(kind='relay', relay=relay + 1, state='on' if state else 'off', cause=CAUSES[cause])
+        if cause == CAUSE_DMX:
+            e.update(universe=u, channel=slot + 1, value=value)
+    elif kind == J_CONFIG:
+        e.update(kind='config', changed=[k for i, k in enumerate(JOURNAL_CONFIG_KEYS) if a >> i & 1])
+    else:
+        e.update(kind='start', version=f"{a >> 16}.{a >> 8 & 0xFF}.{a & 0xFF}")
+    return e
+
+def parse_when(s):
+    # epoch seconds, "HH:MM[:SS]" (today, local time) or ISO date/time -> ns
+    if s is None or s == '':
+        return None
+    try:
+        return int(float(s) * 1e9)
+    except ValueError:
+        pass
+    if re.fullmatch(r'\d{1,2}:\d{2}(:\d{2})?', s):
+        s = time.strftime('%Y-%m-%d ') + s
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%dT%H:%M', '%Y-%m-%d'):
+        try:
+            return int(time.mktime(time.strptime(s, fmt)) * 1e9)
+        except ValueError:
+            continue
+    raise ValueError(f"unrecognised time {s!r}")
+
+def history(relay=None, start=None, end=None, limit=1000, path=None):
+    # CLI: read the journal file directly, the node may be running or not
+    try:
+        j = Journal(path or journal_file, writable=False)
+    except (OSError, ValueError) as e:
+        print(f"No journal: {e}")
+        return
+    for rec in j.query(parse_when(start), parse_when(end), None if relay is None else relay - 1, limit=limit):
+        e = journal_entry(rec)
+        if e['kind'] == 'relay':
+            what = f"relay {e['relay']} {e['state'].upper():3} {e['cause']}"
+            if 'universe' in e:
+                what += f" (universe {e['universe']} ch {e['channel']} = {e['value']})"
+        elif e['kind'] == 'config':
+            what = f"config: {', '.join(e['changed']) or 'reloaded'}"
+        else:
+            what = f"start v{e['version']}"
+        print(f"{e['time']}  {what}")
+
+# -------------------------- OUTPUT COMMIT --------------------------
+output_mask = 0
+override_mask = 0          # relays currently held by a scheduled action
+output_lock = threading.Lock()
+
+def commit_outputs(on, affected, force=False, dmx=None, cause=CAUSE_DMX, u=0, slots=None, vals=None):
+    # bits in `affected` take their value from `on`; each board is written at most once.
+    # Relays held by a scheduled action only change with force=True. `dmx` is an
+    # optional (relay indices, percents) update published in the same state generation.
+    # Transitions are journaled with `cause`; for DMX, u/slots/vals name the deciding value.
+    global output_mask
+    with output_lock:
+        if not force:
+            affected &= ~override_mask
+        new = (output_mask & ~affected) | (on & affected)
+        changed = new ^ output_mask
+        if not changed and dmx is None:
+            return 0
+        for b, off, bmask in boards:
+            bc = (changed >> off) & bmask
+            if bc:
+                b.write((new >> off) & bmask, bc)
+        output_mask = new
+        state.begin()
+        if dmx is not None:
+            for i, pct in zip(*dmx):
+                state.dmx[i] = pct
+        if changed:
+            oled_event.set()
+            now = clock()
+            for i in range(MAX_CHANNELS):
+                if changed >> i & 1:
+                    state.relays[i] = new >> i & 1
+                    last_switch[i] = now
+                    relay_switches[i] += 1
+                    if journal:
+                        if vals is not None and i in dmx[0]:
+                            j = dmx[0].index(i)
+                            journal.append(J_RELAY, i, new >> i & 1, cause, u, slots[j], vals[j])
+                        else:
+                            journal.append(J_RELAY, i, new >> i & 1, cause)
+        state.end()
+        return changed
+
+def override_relay(i, state):
+    # state True/False holds the relay against sACN; None hands it back to sACN
+    global override_mask
+    if realtime_role == 'web':
+        realtime_send(('override', i, state))
+        return
+    bit = 1 << i
+    if state is None:
+        override_mask &= ~bit
+        commit_outputs(desired_mask, bit, cause=CAUSE_ACTION)
+    else:
+        override_mask |= bit
+        commit_outputs(bit if state else 0, bit, force=True, cause=CAUSE_ACTION)
+    notify_status()
+
+def channel_count_for(mode):
+    return min(int(mode), MAX_CHANNELS)
+
+realtime_role = None
+boards = []
+MAX_CHANNELS = CHANNEL_COUNT = 0
+state = None
+relay_switches = []
+
+def setup(fake=False):
+    # load config and build the output stage; fake=True drives one FakeBoard instead (record/replay)
+    global realtime_role, boards, MAX_CHANNELS, CHANNEL_COUNT, relay_switches
+    load_config()
+    outputs = config['outputs']
+    if fake:
+        outputs = [{'type': 'fake', 'count': output_count(outputs)}]
+    # in realtime mode the boards belong to the realtime process, see start_realtime()
+    realtime_role = 'web' if config['realtime']['enabled'] and not fake else None
+    boards = [] if realtime_role else build_outputs(outputs)
+    MAX_CHANNELS = output_count(outputs)
+    CHANNEL_COUNT = channel_count_for(config['mode'])
+    attach_state()
+    relay_switches = [0] * MAX_CHANNELS
 
 # ------------------- System helpers -------------------
+mock_node = False          # mock-node processes never touch the host system
+
 def run_sudo_command(cmd):
     try:
         return subprocess.run(['/usr/bin/sudo'] + cmd, check=True, capture_output=True, text=True)
@@ -135,6 +1504,8 @@ def run_sudo_command(cmd):
         return subprocess.run(cmd, check=True)
 
 def apply_network_config():
+    if mock_node:
+        return
     dhcpcd_conf = '/etc/dhcpcd.conf'
     with open(dhcpcd_conf) as f: lines = f.readlines()
     if config['network'] == 'dhcp':
@@ -165,12 +1536,30 @@ static domain_name_servers={config['dns1']} {config['dns2']}
         except:
             print("Network restart failed — reboot required")
 
+IP_CACHE_TTL = 5.0
+_ip_cache = (0.0, 'No IP')
+
+def reboot_system():
+    flush_config()
+    if mock_node:
+        return
+    subprocess.run(['/usr/bin/sudo', 'reboot'])
+
+def get_current_ip():
+    global _ip_cache
+    now = time.monotonic()
+    if now - _ip_cache[0] >= IP_CACHE_TTL:
+        _ip_cache = (now, net_address() or 'No IP')
+    return _ip_cache[1]
+
 def subnet_to_cidr(s): return 24 if s == '255.255.255.0' else 24
 
 def apply_hostname_config():
     new = config['hostname']
     if not re.match(r'^[a-zA-Z0-9][a-zA-Z0-9\-]{0,61}[a-zA-Z0-9]$', new) or len(new) > 63:
         raise ValueError('Invalid hostname')
+    if mock_node:
+        return
     run_sudo_command(['hostnamectl', 'set-hostname', new])
     with open('/etc/hosts') as f: lines = f.readlines()
     lines = [l.replace(f" {current_hostname} ", f" {new} ") for l in lines]
@@ -180,97 +1569,1292 @@ def apply_hostname_config():
     os.unlink(tmp)
     globals()['current_hostname'] = new
 
+# -------------------------- NETWORK READINESS --------------------------
+# A NETLINK_ROUTE socket subscribed to link and IPv4 address events wakes us the
+# moment eth0 gets, changes or loses its address; each event re-reads the state
+# with two ioctls. Falls back to polling where netlink is unavailable.
+NET_IFACE = 'eth0'
+RTMGRP_LINK, RTMGRP_IPV4_IFADDR = 0x1, 0x10
+SIOCGIFFLAGS, SIOCGIFADDR, IFF_RUNNING = 0x8913, 0x8915, 0x40
+
+def iface_address(name):
+    # IPv4 address of `name` if it is running, else None
+    req = struct.pack('16s16x', name.encode()[:15])
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            if not struct.unpack_from('H', fcntl.ioctl(s, SIOCGIFFLAGS, req), 16)[0] & IFF_RUNNING:
+                return None
+            return socket.inet_ntoa(fcntl.ioctl(s, SIOCGIFADDR, req)[20:24])
+    except OSError:
+        return None
+
+def net_address():
+    # eth0 when the Pi has one, otherwise the first other running interface (Wi-Fi)
+    names = [n for _, n in socket.if_nameindex() if n != 'lo']
+    for n in [NET_IFACE] if NET_IFACE in names else names:
+        addr = iface_address(n)
+        if addr:
+            return addr
+    return None
+
+class NetWatch:
+    # calls on_change(address or None) whenever the usable address changes
+    def __init__(self, on_change):
+        self.on_change = on_change
+        self.address = None
+        self.pid = None
+
+    def start(self):
+        if self.pid == os.getpid():
+            return
+        self.pid = os.getpid()
+        try:
+            sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+            sock.bind((0, RTMGRP_LINK | RTMGRP_IPV4_IFADDR))
+        except (AttributeError, OSError) as e:
+            print(f"Netlink unavailable ({e}), polling network state")
+            sock = None
+        threading.Thread(target=self._loop, args=(sock,), daemon=True).start()
+
+    def _loop(self, sock):
+        # the socket exists before the first read, so no event can slip in between
+        while True:
+            addr = net_address()
+            if addr != self.address:
+                self.address = addr
+                try:
+                    self.on_change(addr)
+                except Exception as e:
+                    print(f"Network change handler failed: {e}")
+            if sock:
+                try:
+                    sock.recv(65536)
+                except OSError as e:
+                    # ENOBUFS: events were dropped, the address check above covers them
+                    if e.errno != errno.ENOBUFS:
+                        print(f"Netlink read failed ({e}), polling network state")
+                        sock.close()
+                        sock = None
+            else:
+                time.sleep(1)
+
+# -------------------------- NATIVE E1.31 RECEIVER --------------------------
+# Receives into one preallocated buffer and checks the universe and start code by
+# byte index before touching anything else, so traffic for other universes never
+# allocates. Root/framing/DMP layers are then validated in place.
+# Universes patched to Art-Net (config['artnet']) arrive as ArtDmx on 6454 instead;
+# both sockets share one poll loop and buffer, and both parsers hand the handler
+# the same (universe, slots, cid, priority, sequence, options, sync address).
+# E1.31 sync packets go to sync_handler(sync address).
+E131_PORT = 5568
+ACN_PID = b'ASC-E1.17\x00\x00\x00'
+ARTNET_PORT = 6454
+ARTNET_ID = b'Art-Net\x00'
+ARTNET_PRIORITY = 100       # Art-Net has none; its sources merge as equals (HTP/LTP)
+
+def e131_group(u):
+    return f"239.255.{u >> 8}.{u & 0xFF}"
+
+class E131Receiver:
+    def __init__(self, handler, bind_address='', sync_handler=None):
+        self.handler = handler
+        self.sync_handler = sync_handler
+        self.bind_address = bind_address
+        self.universes = set()
+        self.artnet = {}           # Art-Net port-address -> universe
+        self.art_cids = {}         # Art-Net sender IP -> stand-in 16-byte CID
+        self.buf = bytearray(1144)
+        self.view = memoryview(self.buf)
+        self.sock = None
+        self.art_sock = None
+        self.thread = None
+
+    def start(self):
+        if self.sock:
+            return
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.bind_address, E131_PORT))
+        self.sock = sock
+        self.set_artnet(self.artnet)
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        sock, self.sock = self.sock, None
+        for s in (sock, self.art_sock):
+            if s:
+                try:
+                    s.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+                s.close()
+        self.art_sock = None
+
+    def set_artnet(self, ports):
+        # the Art-Net socket is open only while some universe is patched to Art-Net
+        self.artnet = dict(ports)
+        if self.artnet and self.sock and not self.art_sock:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            try:
+                sock.bind((self.bind_address, ARTNET_PORT))
+            except OSError as e:
+                print(f"Art-Net input unavailable: {e}")
+                sock.close()
+                return
+            self.art_sock = sock
+        elif not self.artnet and self.art_sock:
+            sock, self.art_sock = self.art_sock, None
+            sock.close()
+
+    def _mreq(self, u):
+        return socket.inet_aton(e131_group(u)) + socket.inet_aton(self.bind_address or '0.0.0.0')
+
+    def join_multicast(self, u):
+        self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, self._mreq(u))
+        self.universes.add(u)
+
+    def leave_multicast(self, u):
+        self.universes.discard(u)
+        try:
+            self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_DROP_MEMBERSHIP, self._mreq(u))
+        except OSError:
+            pass
+
+    def _loop(self):
+        # drain whichever socket is readable; the timeout picks up Art-Net being
+        # switched on or off and stop()
+        sock, art, art_fd = self.sock, None, -1
+        poller = select.poll()
+        poller.register(sock, select.POLLIN)
+        sacn_fd = sock.fileno()
+        while self.sock is sock:
+            if self.art_sock is not art:
+                if art is not None:
+                    poller.unregister(art_fd)
+                art, art_fd = self.art_sock, -1
+                if art is not None:
+                    art_fd = art.fileno()
+                    poller.register(art_fd, select.POLLIN)
+            for fd, _ in poller.poll(1000):
+                if fd == sacn_fd:
+                    self._drain_sacn(sock)
+                elif fd == art_fd:
+                    self._drain_artnet(art)
+
+    def _drain_sacn(self, sock):
+        buf, view = self.buf, self.view
+        recv_into, universes, handler = sock.recv_into, self.universes, self.handler
+        while True:
+            try:
+                n = recv_into(buf, 0, socket.MSG_DONTWAIT)
+            except OSError:
+                return                                         # drained (or closed)
+            if n < 126 or buf[21] != 0x04 or buf[43] != 0x02:
+                if n >= 49 and buf[21] == 0x08 and buf[43] == 0x01 and self.sync_handler \
+                        and view[4:16] == ACN_PID and not buf[18] | buf[19] | buf[20] | buf[40] | buf[41] | buf[42]:
+                    self.sync_handler(buf[45] << 8 | buf[46])
+                continue                                       # not an E1.31 data packet
+            if (buf[113] << 8 | buf[114]) not in universes or buf[125] != 0x00 or buf[112] & 0x80:
+                continue                                       # other universe, alt start code or preview
+            if buf[0] != 0x00 or buf[1] != 0x10 or view[4:16] != ACN_PID \
+                    or buf[18] | buf[19] | buf[20] | buf[40] | buf[41] | buf[42] \
+                    or buf[117] != 0x02 or buf[118] != 0xA1:
+                continue
+            slots = (buf[123] << 8 | buf[124]) - 1
+            if slots < 0 or 126 + slots > n:
+                continue
+            handler(buf[113] << 8 | buf[114], view[126:126 + slots], view[22:38],
+                    buf[108], buf[111], buf[112] & 0xE0, buf[109] << 8 | buf[110])
+
+    def _drain_artnet(self, sock):
+        # ArtDmx: ID, OpCode 0x5000 LE, ProtVer, Sequence, Physical, port-address LE, Length BE, data
+        buf, view = self.buf, self.view
+        recvfrom_into, ports, handler, cids = sock.recvfrom_into, self.artnet, self.handler, self.art_cids
+        while True:
+            try:
+                n, addr = recvfrom_into(buf, 0, socket.MSG_DONTWAIT)
+            except OSError:
+                return
+            if n < 18 or buf[8] != 0x00 or view[0:8] != ARTNET_ID:
+                continue
+            if buf[9] != 0x50:
+                if buf[9] == 0x20:                             # ArtPoll: say which ports we take
+                    self._poll_reply(sock, addr)
+                continue
+            u = ports.get(buf[15] << 8 | buf[14])
+            if u is None or buf[10] == 0 and buf[11] < 14:
+                continue
+            slots = buf[16] << 8 | buf[17]
+            if slots > 512 or 18 + slots > n:
+                continue
+            cid = cids.get(addr[0])
+            if cid is None:
+                cid = cids[addr[0]] = ARTNET_ID + bytes(4) + socket.inet_aton(addr[0])
+            handler(u, view[18:18 + slots], cid, ARTNET_PRIORITY, buf[12] or -1, OPT_ARTNET, 0)
+
+    def _poll_reply(self, sock, addr):
+        for pkt in artnet_poll_replies(sorted(self.artnet), netwatch.address or '0.0.0.0', config['hostname']):
+            try:
+                sock.sendto(pkt, (addr[0], ARTNET_PORT))
+            except OSError:
+                pass
+
+def artnet_poll_replies(port_addresses, address, name):
+    # one ArtPollReply per patched port-address, each describing a single DMX output
+    for i, pa in enumerate(port_addresses):
+        pkt = bytearray(239)
+        pkt[0:8] = ARTNET_ID
+        struct.pack_into('<H4sH', pkt, 8, 0x2100, socket.inet_aton(address), ARTNET_PORT)
+        struct.pack_into('>HBBH', pkt, 16, 14, pa >> 8 & 0x7F, pa >> 4 & 0x0F, 0x00FF)
+        pkt[26:43] = name.encode()[:17].ljust(17, b'\x00')
+        pkt[44:107] = f"sACN Relay {name}".encode()[:63].ljust(63, b'\x00')
+        pkt[108:171] = b'#0001 [0000] OK'.ljust(63, b'\x00')
+        struct.pack_into('>H', pkt, 172, 1)
+        pkt[174] = 0x80                                        # port 1 outputs DMX512
+        pkt[190] = pa & 0x0F
+        pkt[211] = i + 1                                       # BindIndex
+        pkt[212] = 0x08                                        # 15-bit port-addresses
+        yield pkt
+
+def artdmx_packet(port_address, slots=512):
+    pkt = bytearray(18 + slots)
+    pkt[0:8] = ARTNET_ID
+    struct.pack_into('<H', pkt, 8, 0x5000)
+    struct.pack_into('>HBB', pkt, 10, 14, 0, 0)
+    struct.pack_into('<H', pkt, 14, port_address)
+    struct.pack_into('>H', pkt, 16, slots)
+    return pkt
+
+# -------------------------- REPEATER --------------------------
+# config['forward'] entries copy a slot range of a received universe into an
+# outgoing universe: {'universe', 'start', 'count', 'dst_universe', 'dst_start',
+# 'priority', 'unicast': [ip, ...]} (empty unicast = multicast). Sources of a
+# forwarded universe are arbitrated like the relays' (priority, then HTP/LTP) in
+# a table of their own over the forwarded slot span; the merged slots go out
+# with the winning priority unless the entry sets one. Every outgoing universe
+# owns one prebuilt 638-byte packet; per frame only the DMX slots, sequence and
+# priority bytes are patched before it goes out on the shared send socket.
+forward_map = {}     # source universe -> (routes, streams, first slot, end slot, SourceTable)
+send_sock = None
+E131_DISCOVERY_UNIVERSE = 64214
+E131_DISCOVERY_INTERVAL = 10.0
+announcing = False
+
+def e131_data_packet(universe, priority, cid, name):
+    pkt = bytearray(638)
+    struct.pack_into('!HH12sHI16s', pkt, 0, 0x0010, 0, ACN_PID, 0x7000 | 622, 4, cid)
+    struct.pack_into('!HI64sBHBBH', pkt, 38, 0x7000 | 600, 2, name.encode()[:63], priority, 0, 0, 0, universe)
+    struct.pack_into('!HBBHHHB', pkt, 115, 0x7000 | 523, 2, 0xA1, 0, 1, 513, 0)
+    return pkt
+
+class OutStream:
+    def __init__(self, universe, priority, unicast):
+        # priority None: follow the winning source
+        self.universe = universe
+        self.follow = priority is None
+        self.pkt = e131_data_packet(universe, 100 if self.follow else priority,
+                                    bytes.fromhex(config['cid']), config['hostname'])
+        self.dmx = memoryview(self.pkt)[126:638]
+        self.addrs = [(ip, E131_PORT) for ip in unicast] or [(e131_group(universe), E131_PORT)]
+        self.seq = 0
+
+    def send(self, prio):
+        self.seq = (self.seq + 1) & 0xFF
+        self.pkt[111] = self.seq
+        if self.follow:
+            self.pkt[108] = prio
+        for addr in self.addrs:
+            try:
+                send_sock.sendto(self.pkt, addr)
+            except OSError:
+                pass
+
+def compile_forward_map():
+    global send_sock
+    streams, fmap = {}, {}
+    for f in config['forward']:
+        try:
+            src, dst = int(f['universe']), int(f['dst_universe'])
+            s0, d0 = int(f.get('start', 1)) - 1, int(f.get('dst_start', 1)) - 1
+            count = min(int(f.get('count', 512)), 512 - s0, 512 - d0)
+            prio = f.get('priority')
+            prio = None if prio is None else max(0, min(200, int(prio)))
+            unicast = tuple(f.get('unicast') or ())
+        except (KeyError, TypeError, ValueError):
+            print(f"Bad forward entry skipped: {f}")
+            continue
+        if not (1 <= src <= 63999 and 1 <= dst <= 63999) or s0 < 0 or d0 < 0 or count <= 0:
+            print(f"Bad forward entry skipped: {f}")
+            continue
+        key = (dst, prio, unicast)
+        if key not in streams:
+            streams[key] = OutStream(dst, prio, unicast)
+        routes, out = fmap.setdefault(src, ([], []))
+        routes.append((s0, count, streams[key].dmx, d0))
+        if streams[key] not in out:
+            out.append(streams[key])
+    for src, (routes, out) in fmap.items():
+        lo = min(s0 for s0, *_ in routes)
+        hi = max(s0 + count for s0, count, *_ in routes)
+        fmap[src] = ([(s0 - lo, count, dmx, d0) for s0, count, dmx, d0 in routes], out, lo, hi,
+                     SourceTable(config['merge']))
+    if fmap and send_sock is None:
+        send_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        send_sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 8)
+    globals()['forward_map'] = fmap
+    if fmap and not announcing:
+        announce_universes()
+
+def e131_discovery_packets(universes, cid, name):
+    # E1.31 universe discovery: up to 512 universes per page
+    pages = [universes[i:i + 512] for i in range(0, len(universes), 512)]
+    for page, us in enumerate(pages):
+        pkt = bytearray(120 + 2 * len(us))
+        struct.pack_into('!HH12sHI16s', pkt, 0, 0x0010, 0, ACN_PID, 0x7000 | (len(pkt) - 16), 8, cid)
+        struct.pack_into('!HI64s4x', pkt, 38, 0x7000 | (len(pkt) - 38), 2, name.encode()[:63])
+        struct.pack_into(f'!HIBB{len(us)}H', pkt, 112, 0x7000 | (len(pkt) - 112), 1, page, len(pages) - 1, *us)
+        yield pkt
+
+def announce_universes():
+    # as an sACN source the repeater lists its outgoing universes every 10 s
+    global announcing
+    universes = sorted({out.universe for fw in forward_map.values() for out in fw[1]})
+    announcing = bool(universes)
+    if not announcing:
+        return
+    group = (e131_group(E131_DISCOVERY_UNIVERSE), E131_PORT)
+    for pkt in e131_discovery_packets(universes, bytes.fromhex(config['cid']), config['hostname']):
+        try:
+            send_sock.sendto(pkt, group)
+        except OSError:
+            pass
+    scheduler.call_later(E131_DISCOVERY_INTERVAL, announce_universes)
+
+def forward_frame(fw, d, cid, prio, seq, opts):
+    routes, streams, lo, hi, src = fw
+    vals = src.update(cid, prio, seq, opts, bytes(d[lo:hi]), clock())
+    if vals is None:
+        return
+    if type(vals) is not bytes:
+        vals = bytes(vals)                                     # HTP merge of several sources
+    n = len(vals)
+    for s0, count, dmx, d0 in routes:
+        c = min(count, n - s0)
+        if c > 0:
+            dmx[d0:d0 + c] = vals[s0:s0 + c]
+    for out in streams:
+        out.send(src.top)
+
 # -------------------------- sACN INIT --------------------------
 def init_sacn():
-    global receiver
-    if receiver:
-        receiver.stop()
-    
-    receiver = sACNreceiver()
-    
-    max_retries = 10
-    universe_int = config['universe']
-    
-    for attempt in range(max_retries):
-        try:
+    # (re)build the maps and receiver; universes are joined now if the network
+    # is up, otherwise by network_changed() as soon as it is
+    global receiver, joined, applied_config
+    with sacn_lock:
+        if receiver:
+            receiver.stop()
+        compile_channel_map()
+        compile_forward_map()
+        compile_artnet_map()
+        joined = set()
+        sync_groups.clear()
+        with sync_lock:
+            sync_staged.clear()
+        if config['receiver'] == 'native':
+            receiver = E131Receiver(process_frame, sync_handler=sync_packet)
+            receiver.artnet = artnet_map
             receiver.start()
-            receiver.join_multicast(universe_int)
-            receiver.register_listener('universe', sacn_packet_handler, universe=universe_int)
-            print(f"sACN joined universe {universe_int} on attempt {attempt + 1}")
-            break
-        except Exception as e:
-            if "No such device" in str(e) or "Network is down" in str(e):
-                if attempt < max_retries - 1:
-                    print(f"Network not ready, retry {attempt + 1}/{max_retries}...")
-                    time.sleep(3)
-                else:
-                    print("Network failed — starting anyway")
-            else:
-                print(f"sACN error: {e}")
-                break
+        else:
+            from sacn import sACNreceiver
+            receiver = sACNreceiver()
+            hook_sync_packets(receiver)
+            receiver.start()
+            sacn_listening.clear()
+            register_listeners(sacn_universes())
+        if netwatch.address:
+            join_universes()
+        applied_config = copy.deepcopy(config)
+    netwatch.start()
+
+def hook_sync_packets(rx):
+    # the sacn library parses data packets only and drops sync packets, so
+    # take them off its socket callback before it does
+    handler = rx._handler
+    on_data = handler.on_data
+    def on_packet(data, now):
+        if len(data) >= 49 and data[21] == 0x08 and data[43] == 0x01:
+            sync_packet(data[45] << 8 | data[46])
+        else:
+            on_data(data, now)
+    handler.on_data = on_packet
+
+def sacn_universes(cmap=None):
+    # universes patched to Art-Net are not joined; sync addresses are
+    art = set(artnet_map.values())
+    return sorted((set(channel_map if cmap is None else cmap) | set(forward_map) | sync_groups) - art) \
+        or sorted({config['universe']} - art)
+
+def compile_artnet_map():
+    # -> {Art-Net port-address: universe}; a universe listed here is taken from Art-Net only
+    global artnet_map
+    amap = {}
+    for a in config['artnet']:
+        try:
+            u, pa = int(a['universe']), int(a['port_address'])
+        except (KeyError, TypeError, ValueError):
+            pa = u = -1
+        if not (1 <= u <= 63999 and 0 <= pa < 0x8000) or pa in amap:
+            print(f"Bad Art-Net entry skipped: {a}")
+            continue
+        amap[pa] = u
+    if amap and config['receiver'] != 'native':
+        print("Art-Net input needs the native receiver; ignored")
+        amap = {}
+    artnet_map = amap
+
+def register_listeners(universes):
+    # sacn library receiver only: one callback registration per universe
+    for u in universes:
+        if u not in sacn_listening:
+            receiver.register_listener('universe', sacn_packet_handler, universe=u)
+            sacn_listening.add(u)
+
+def join_universes():
+    # caller holds sacn_lock; leaving first re-announces memberships after a link flap
+    global joined
+    universes = sacn_universes()
+    try:
+        for u in universes:
+            receiver.leave_multicast(u)
+            receiver.join_multicast(u)
+    except OSError as e:
+        print(f"sACN join failed: {e}")
+        return
+    joined = set(universes)
+    mark_startup('joined')
+    print(f"sACN joined universes {universes}")
+
+def join_new(universes):
+    # caller holds sacn_lock; first half of a membership change, see apply_config()
+    if config['receiver'] != 'native':
+        register_listeners(universes)
+    if not netwatch.address:
+        return
+    for u in sorted(set(universes) - joined):
+        try:
+            receiver.join_multicast(u)
+            joined.add(u)
+        except OSError as e:
+            print(f"sACN join of universe {u} failed: {e}")
+
+def leave_old(universes):
+    for u in sorted(joined - set(universes)):
+        receiver.leave_multicast(u)
+        joined.discard(u)
+
+def network_changed(addr):
+    if addr is None:
+        print("Network down, waiting for link")
+        return
+    mark_startup('network')
+    print(f"Network up ({addr})")
+    with sacn_lock:
+        if receiver:
+            join_universes()
+
+sacn_lock = threading.Lock()
+netwatch = NetWatch(network_changed)
+joined = set()
+sacn_listening = set()
+artnet_map = {}      # Art-Net port-address -> universe, see compile_artnet_map()
+
+# -------------------------- CONFIG APPLY --------------------------
+# Config changes reach the running engine through apply_config(), which only
+# rebuilds what the changed keys feed; the receiver is restarted only when the
+# receiver type itself changes.
+RECEIVER_KEYS = {'receiver'}
+MAP_KEYS = {'universe', 'universes', 'channels', 'setpoints', 'hysteresis', 'min_on_ms',
+            'min_off_ms', 'max_switch_hz', 'mode', 'merge', 'logic'}
+FORWARD_KEYS = {'forward', 'cid', 'hostname', 'merge'}
+ARTNET_KEYS = {'artnet'}
+applied_config = {}
+
+def apply_config():
+    global applied_config, CHANNEL_COUNT
+    if realtime_role == 'web':
+        realtime_send(('config', dict(config)))
+        return
+    changed = {k for k, v in config.items() if applied_config.get(k) != v}
+    if receiver is None or changed & RECEIVER_KEYS:
+        init_sacn()
+        return
+    CHANNEL_COUNT = channel_count_for(config['mode'])
+    with sacn_lock:
+        # join new universes, swap the maps, then leave the old ones: a moved
+        # relay is fed by its old universe right up to the swap
+        if changed & FORWARD_KEYS:
+            compile_forward_map()
+        if changed & ARTNET_KEYS:
+            compile_artnet_map()
+        if changed & (MAP_KEYS | FORWARD_KEYS | ARTNET_KEYS):
+            before = set(joined)
+            cmap = build_channel_map() if changed & MAP_KEYS else channel_map
+            join_new(sacn_universes(cmap))
+            if cmap is not channel_map:
+                install_channel_map(cmap)
+            if changed & ARTNET_KEYS and config['receiver'] == 'native':
+                receiver.set_artnet(artnet_map)
+            leave_old(sacn_universes())
+            if joined != before:
+                print(f"sACN universes now {sorted(joined)}")
+        applied_config = copy.deepcopy(config)
+
+# -------------------------- REALTIME PROCESS --------------------------
+# Optional: a forked process owns the sACN socket and the relay boards, pinned to
+# one core at SCHED_FIFO. State is published through a StateBlock in shared
+# memory; the web process sends config and relay commands back over a pipe.
+state_shm = None
+realtime_conn = None
+realtime_proc = None
+realtime_lock = threading.Lock()
+
+def realtime_send(msg):
+    with realtime_lock:
+        realtime_conn.send(msg)
+
+def realtime_main(conn):
+    global realtime_role, boards
+    realtime_role = 'rt'
+    if journal:
+        journal.lock = threading.Lock()        # a web thread may have held it across the fork
+    rt = config['realtime']
+    try:
+        os.sched_setaffinity(0, {rt['cpu']})
+    except (AttributeError, OSError) as e:
+        print(f"Realtime: CPU pinning failed: {e}")
+    try:
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(rt['priority']))
+    except (AttributeError, OSError) as e:
+        print(f"Realtime: SCHED_FIFO unavailable ({e}), using nice -10")
+        try:
+            os.nice(-10)
+        except OSError:
+            pass
+    boards = build_outputs(config['outputs'])
+    init_sacn()
+    while True:
+        try:
+            msg = conn.recv()
+        except EOFError:
+            os._exit(0)
+        if msg[0] == 'config':
+            config.update(msg[1])
+            apply_config()
+        elif msg[0] == 'override':
+            override_relay(msg[1], msg[2])
+        elif msg[0] == 'metrics':
+            conn.send(metrics_snapshot())
+
+def start_realtime():
+    global state_shm, realtime_conn, realtime_proc
+    if state_shm is None:
+        state_shm = shared_memory.SharedMemory(create=True, size=StateBlock.HEADER + 2 * MAX_CHANNELS)
+        state_shm.buf[:] = bytes(state_shm.size)
+        attach_state(state_shm.buf)
+    ctx = multiprocessing.get_context('fork')
+    realtime_conn, child_conn = ctx.Pipe()
+    realtime_proc = ctx.Process(target=realtime_main, args=(child_conn,), daemon=True)
+    realtime_proc.start()
+    print(f"Realtime process started (pid {realtime_proc.pid})")
+
+def realtime_watch():
+    # web side: turn shared generation bumps into local status notifications
+    seen = 0
+    while True:
+        time.sleep(1 / STATUS_PUSH_HZ)
+        gen = state.read_generation()
+        if gen != seen:
+            seen = gen
+            notify_status()
+            oled_event.set()
+        if not realtime_proc.is_alive():
+            print("Realtime process died — restarting")
+            start_realtime()
+
+# -------------------------- SCHEDULER --------------------------
+# One monotonic-clock thread with a heap of pending calls replaces per-event
+# threading.Timer threads.
+class Scheduler:
+    def __init__(self):
+        self.heap = []
+        self.cond = threading.Condition()
+        self.counter = itertools.count()
+        self.pid = None
+
+    def call_at(self, when, fn, *args, job=None):
+        with self.cond:
+            heapq.heappush(self.heap, (when, next(self.counter), job, fn, args))
+            if self.pid != os.getpid():
+                self.pid = os.getpid()
+                threading.Thread(target=self._run, daemon=True).start()
+            self.cond.notify()
+
+    def call_later(self, delay, fn, *args, job=None):
+        self.call_at(time.monotonic() + delay, fn, *args, job=job)
+
+    def cancel(self, job):
+        with self.cond:
+            self.heap = [e for e in self.heap if e[2] != job]
+            heapq.heapify(self.heap)
+
+    def pending(self, job):
+        with self.cond:
+            return sum(1 for e in self.heap if e[2] == job)
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self.heap or self.heap[0][0] > time.monotonic():
+                    self.cond.wait(self.heap[0][0] - time.monotonic() if self.heap else None)
+                _, _, _, fn, args = heapq.heappop(self.heap)
+            try:
+                fn(*args)
+            except Exception as e:
+                print(f"Scheduled action failed: {e}")
+
+scheduler = Scheduler()
+
+# -------------------------- RELAY ACTIONS --------------------------
+# Timed relay actions (pulse, delayed set, chase) run on the scheduler. A relay
+# touched by an action is held against sACN until the action releases it or is
+# cancelled; it then goes to the action that held it before, or back to the
+# live sACN state. Steps are generated one at a time as they come due.
+actions = {}
+action_ids = itertools.count(1)
+action_lock = threading.Lock()
+relay_holds = {}           # relay index -> {job: True/False}, newest holder last
+MAX_ACTION_TIME = 86400.0  # longest delay, duration or chase step in seconds
+MAX_ACTION_LOOPS = 10000
+MAX_CHASE_RELAYS = 256
+
+def action_steps(spec):
+    # -> (relay indices, iterator of (delay, relay index, True/False/None) in time order);
+    # all validation happens here, before anything is scheduled
+    if not isinstance(spec, dict):
+        raise ValueError("action must be a JSON object")
+    def relay(r):
+        r = int(r)
+        if not 1 <= r <= CHANNEL_COUNT:
+            raise ValueError(f"relay {r} out of range 1-{CHANNEL_COUNT}")
+        return r - 1
+    def seconds(key, default, lo=0.0):
+        v = float(spec.get(key, default))
+        if not lo <= v <= MAX_ACTION_TIME:
+            raise ValueError(f"{key} must be {lo:g}-{MAX_ACTION_TIME:g} s")
+        return v
+    kind = spec.get('type')
+    delay = seconds('delay', 0)
+    if kind == 'pulse':
+        i = relay(spec['relay'])
+        return [i], iter([(delay, i, True), (delay + seconds('duration', 5.0), i, None)])
+    if kind == 'set':
+        i = relay(spec['relay'])
+        steps = [(delay, i, bool(spec['state']))]
+        if spec.get('duration'):
+            steps.append((delay + seconds('duration', 0), i, None))
+        return [i], iter(steps)
+    if kind == 'release':
+        i = relay(spec['relay'])
+        return [i], iter([(delay, i, None)])
+    if kind == 'chase':
+        rs = spec.get('relays', range(1, CHANNEL_COUNT + 1))
+        if not isinstance(rs, (list, range)) or not 1 <= len(rs) <= MAX_CHASE_RELAYS:
+            raise ValueError(f"relays must list 1-{MAX_CHASE_RELAYS} relays")
+        rs = [relay(r) for r in rs]
+        step = seconds('step', 0.2, TimerWheel.TICK)
+        loops = int(spec.get('loops', 1))
+        if not 1 <= loops <= MAX_ACTION_LOOPS:
+            raise ValueError(f"loops must be 1-{MAX_ACTION_LOOPS}")
+        def chase():
+            for n in range(loops * len(rs)):
+                t = delay + n * step
+                yield t, rs[n % len(rs)], True
+                yield t + step, rs[n % len(rs)], None
+        return sorted(set(rs)), chase()
+    raise ValueError(f"unknown action type {kind!r}")
+
+def hold_relay(job, i, state, everyone=False):
+    # caller holds action_lock; state None lets go (everyone: all holders do)
+    holds = relay_holds.setdefault(i, {})
+    old = next(reversed(holds.values())) if holds else None
+    if everyone:
+        dropped = list(holds)
+        holds.clear()
+    else:
+        holds.pop(job, None)
+    if state is not None:
+        holds[job] = state
+    new = next(reversed(holds.values())) if holds else None
+    if not holds:
+        del relay_holds[i]
+    if new != old:
+        override_relay(i, new)
+    if everyone:
+        for j in dropped:
+            _action_done(j)
+
+def _action_done(job):
+    # caller holds action_lock; a job whose steps have all run stays listed (and
+    # cancellable) while it still holds a relay: an open-ended set until released
+    a = actions.get(job)
+    if a is not None and a['finished'] and not any(job in h for h in relay_holds.values()):
+        del actions[job]
+
+def _action_next(job, start, steps):
+    # caller holds action_lock; schedule the job's next step or finish it
+    step = next(steps, None)
+    if step is None:
+        if job in actions:
+            actions[job]['finished'] = True
+            _action_done(job)
+        return
+    scheduler.call_at(start + step[0], _action_step, job, start, steps, step, job=job)
+
+def _action_step(job, start, steps, step):
+    with action_lock:
+        a = actions.get(job)
+        if a is None:
+            return                                             # cancelled
+        _, i, state = step
+        hold_relay(job, i, state, a['spec']['type'] == 'release')
+        _action_next(job, start, steps)
+
+def start_action(spec):
+    # -> the action as listed when it started (it may be gone by the time this returns)
+    relays, steps = action_steps(spec)
+    with action_lock:
+        job = next(action_ids)
+        a = actions[job] = {'id': job, 'spec': spec, 'relays': [i + 1 for i in relays], 'finished': False}
+        started = dict(a)
+        _action_next(job, time.monotonic(), steps)
+    return started
+
+def cancel_action(job):
+    with action_lock:
+        a = actions.pop(job, None)
+        if a is None:
+            return False
+        scheduler.cancel(job)
+        for r in a['relays']:
+            hold_relay(job, r - 1, None)
+    return True
 
-# --------------------- 5-second pulse --------------------
 def pulse_relay(rid):
     i = rid - 1
     if 0 <= i < CHANNEL_COUNT:
         print(f"Pulse Relay {rid} ON for 5s")
-        relay_states[i] = True
-        relays[i].on()
-        threading.Timer(5.0, lambda: _off(i)).start()
-
-def _off(i):
-    relay_states[i] = False
-    relays[i].off()
+        start_action({'type': 'pulse', 'relay': rid, 'duration': 5.0})
 
 # -------------------------- OLED --------------------------
+# Retained-mode: header and relay boxes are redrawn only when their content
+# changes, and only the touched SSD1306 pages/columns go over I2C.
+HEADER_REFRESH = 10        # seconds between hostname/IP lookups
+OLED_MIN_INTERVAL = 0.02   # coalesce relay bursts into one I2C update
+oled_event = threading.Event()
+BIT_REVERSE = bytes(int(f"{b:08b}"[::-1], 2) for b in range(256))
+BOX_W, BOX_H, BOX_GAP, BOX_Y = 15, 12, 2, 44
+_box_glyphs = {}
+
+def oled_push(x0, x1, p0, p1):
+    # pages p0..p1, columns x0..x1 of `image` -> SSD1306 GDDRAM (horizontal addressing)
+    if not (OLED_AVAILABLE and oled):
+        return
+    x0, x1 = max(x0, 0), min(x1, 127)      # 8 boxes are wider than the panel, edge boxes clip
+    data = bytearray(b'\x40')
+    for p in range(p0, p1 + 1):
+        strip = image.crop((x0, p * 8, x1 + 1, p * 8 + 8)).transpose(Image.Transpose.TRANSPOSE)
+        data += strip.tobytes().translate(BIT_REVERSE)
+    for cmd in (0x21, x0, x1, 0x22, p0, p1):
+        oled.write_cmd(cmd)
+    with oled.i2c_device:
+        oled.i2c_device.write(data)
+
+def box_glyph(label, on):
+    g = _box_glyphs.get((label, on))
+    if g is None:
+        g = Image.new("1", (BOX_W + 1, BOX_H + 1))
+        d = ImageDraw.Draw(g)
+        fill = 255 if on else 0
+        d.rectangle((0, 0, BOX_W, BOX_H), outline=255-fill, fill=fill)
+        bb = d.textbbox((0, 0), label, font=small_font)
+        d.text(((BOX_W - (bb[2]-bb[0]))//2, (BOX_H - (bb[3]-bb[1]))//2), label,
+               font=small_font, fill=0 if on else 255)
+        _box_glyphs[(label, on)] = g
+    return g
+
+def relay_box_label(i):
+    # the channel, or for logic the first channel it reads, '+' when it reads more
+    slots = relay_logic_slots(i)
+    if slots is None:
+        return str(config['channels'][i])
+    return f"{slots[0] + 1}{'+' if len(slots) > 1 else ''}"
+
+def oled_refresh(h, header, boxes):
+    # one retained-mode pass: redraw and push what differs from (header, boxes)
+    # as last shown; returns the new pair
+    if h != header:
+        draw.rectangle((0, 0, 127, BOX_Y - 5), fill=0)
+        draw.text((0,0), f"{h[0]} U:{h[1]}", font=font, fill=255)
+        draw.text((0,20), f"({h[2]}:8080)", font=font, fill=255)
+        oled_push(0, 127, 0, BOX_Y // 8 - 1)
+
+    shown = min(CHANNEL_COUNT, 8)
+    sx = (128 - (shown*BOX_W + (shown-1)*BOX_GAP)) // 2
+    relays = state.snapshot()[2]
+    shown_boxes = [(relay_box_label(i), bool(relays[i])) for i in range(shown)]
+    if boxes is None or len(boxes) != shown:
+        draw.rectangle((0, BOX_Y - 4, 127, 63), fill=0)
+        for i, (label, on) in enumerate(shown_boxes):
+            image.paste(box_glyph(label, on), (sx + i*(BOX_W+BOX_GAP), BOX_Y))
+        oled_push(0, 127, BOX_Y // 8, 7)
+    else:
+        for i, box in enumerate(shown_boxes):
+            if box != boxes[i]:
+                x = sx + i*(BOX_W+BOX_GAP)
+                image.paste(box_glyph(*box), (x, BOX_Y))
+                oled_push(x, x + BOX_W, BOX_Y // 8, (BOX_Y + BOX_H) // 8)
+    return h, shown_boxes
+
 def update_oled():
+    header = boxes = None
+    next_lookup = 0
     while True:
-        hn = socket.gethostname()
-        ip = 'No IP'
-        try:
-            if 'eth0' in netifaces.interfaces():
-                ip = netifaces.ifaddresses('eth0')[netifaces.AF_INET][0]['addr']
-        except: pass
-        draw.rectangle((0,0,128,64), fill=0)
-        draw.text((0,0), f"{hn[:10]} U:{config['universe']}", font=font, fill=255)
-        draw.text((0,20), f"({ip}:8080)", font=font, fill=255)
-        bw, bh, m = 15, 12, 2
-        sx = (128 - (CHANNEL_COUNT*bw + (CHANNEL_COUNT-1)*m)) // 2
+        now = time.monotonic()
+        if now >= next_lookup:
+            hn, ip = socket.gethostname(), get_current_ip()
+            next_lookup = now + HEADER_REFRESH
+        header, boxes = oled_refresh((hn[:10], config['universe'], ip), header, boxes)
+        oled_event.wait(1)
+        oled_event.clear()
+        time.sleep(OLED_MIN_INTERVAL)
+
+# -------------------------- CAPTURE / REPLAY --------------------------
+# Capture file: 'SRCAP1' + 2 pad bytes, f64 unix start time, then records of
+#   u64 ns since start, u16 universe, u16 source, u8 priority, u8 sequence,
+#   u8 options, u8 flags, u16 length, `length` DMX slots
+# Flag CAPTURE_NO_SEQ marks a frame without a sequence number (Art-Net
+# sequence 0, handed on as -1); replay hands it on as -1 again.
+# A record with universe 0 (not a valid sACN universe) introduces the next
+# source: its payload is the 16-byte CID that later records refer to by index.
+CAPTURE_MAGIC = b'SRCAP1\x00\x00'
+CAPTURE_HEADER = struct.Struct('<8sd')
+CAPTURE_RECORD = struct.Struct('<QHHBBBBH')
+CAPTURE_NO_SEQ = 0x01
+
+class CaptureWriter:
+    def __init__(self, path):
+        self.f = open(path, 'wb', buffering=1 << 16)
+        self.f.write(CAPTURE_HEADER.pack(CAPTURE_MAGIC, time.time()))
+        self.t0 = time.perf_counter_ns()
+        self.cids = {}
+        self.frames = 0
+
+    def frame(self, u, d, cid, prio, seq, opts, sync=0):
+        # sync addresses are not recorded: replay applies every frame on arrival
+        t = time.perf_counter_ns() - self.t0
+        cid = bytes(cid)
+        src = self.cids.get(cid)
+        if src is None:
+            src = self.cids[cid] = len(self.cids)
+            self.f.write(CAPTURE_RECORD.pack(t, 0, src, 0, 0, 0, 0, 16))
+            self.f.write(cid)
+        self.f.write(CAPTURE_RECORD.pack(t, u, src, prio, seq & 0xFF if seq >= 0 else 0, opts,
+                                         0 if seq >= 0 else CAPTURE_NO_SEQ, len(d)))
+        self.f.write(d)
+        self.frames += 1
+
+    def close(self):
+        self.f.close()
+
+def read_capture(path):
+    # -> (ns since start, universe, slots, cid, priority, sequence, options) per frame
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < CAPTURE_HEADER.size or f.read(8) != CAPTURE_MAGIC:
+            raise ValueError(f"{path} is not a capture file")
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view, pos, cids = memoryview(data), CAPTURE_HEADER.size, []
+    unpack, rsize = CAPTURE_RECORD.unpack_from, CAPTURE_RECORD.size
+    while pos + rsize <= size:
+        t, u, src, prio, seq, opts, flags, n = unpack(data, pos)
+        pos += rsize
+        if pos + n > size:
+            break                                              # tail of an interrupted capture
+        if u == 0:
+            cids.append(bytes(view[pos:pos + n]))
+        else:
+            yield t, u, view[pos:pos + n], cids[src], prio, -1 if flags & CAPTURE_NO_SEQ else seq, opts
+        pos += n
+
+def record(path, universes=None, duration=None):
+    setup(fake=True)
+    compile_channel_map()
+    universes = universes or sorted(channel_map) or [config['universe']]
+    writer = CaptureWriter(path)
+    compile_artnet_map()
+    rx = E131Receiver(writer.frame)
+    rx.artnet = {pa: u for pa, u in artnet_map.items() if u in universes}
+    rx.start()
+    for u in universes:
+        if u not in rx.artnet.values():
+            rx.join_multicast(u)
+    print(f"Recording universes {universes} to {path}, Ctrl-C to stop")
+    end = time.monotonic() + duration if duration else None
+    try:
+        while end is None or time.monotonic() < end:
+            time.sleep(0.5 if end is None else max(0, min(0.5, end - time.monotonic())))
+    except KeyboardInterrupt:
+        pass
+    rx.stop()
+    rx.thread.join(1)
+    writer.close()
+    print(f"Recorded {writer.frames} frames from {len(writer.cids)} sources")
+
+class ReplayWheel:
+    # stands in for timer_wheel so hold/rate-limit rechecks fire on capture time
+    def __init__(self):
+        self.heap = []
+        self.ids = itertools.count()
+
+    def schedule(self, when, fn, arg):
+        heapq.heappush(self.heap, (when, next(self.ids), fn, arg))
+
+def hist_percentile(hist, q):
+    # upper bucket bound (ns) holding the q-quantile, None for the overflow bucket
+    total, acc = sum(hist), 0
+    for bound, n in zip(HIST_BOUNDS_NS + [None], hist):
+        acc += n
+        if acc >= q * total:
+            return bound
+
+def replay(path, realtime=False, loops=1):
+    # Feeds a capture through the decode/threshold pipeline against a FakeBoard,
+    # as fast as possible or at the recorded pace. Pipeline time is the capture
+    # timestamp either way, so two replays of one file switch identically.
+    global clock, timer_wheel
+    setup(fake=True)
+    compile_channel_map()
+    fake, wheel = boards[0][0], ReplayWheel()
+    now = 0.0
+    clock, timer_wheel = (lambda: now), wheel
+    switches0, writes0 = list(relay_switches), len(fake.writes)
+    frames, base, ts = 0, 0.0, 0.0
+    wall0 = time.perf_counter()
+    for _ in range(loops):
+        for t, u, d, cid, prio, seq, opts in read_capture(path):
+            ts = base + t / 1e9
+            while wheel.heap and wheel.heap[0][0] <= ts:
+                now, _, fn, arg = heapq.heappop(wheel.heap)
+                fn(arg)
+            if realtime:
+                delay = ts - (time.perf_counter() - wall0)
+                if delay > 0:
+                    time.sleep(delay)
+            now = ts
+            process_frame(u, d, cid, prio, seq, opts)
+            frames += 1
+        base = ts + 0.025
+    elapsed = time.perf_counter() - wall0
+    if not frames:
+        print("No frames in capture")
+        return
+    p99 = hist_percentile(handler_hist, 0.99)
+    print(f"Replayed {frames} frames ({ts:.1f} s of capture) in {elapsed:.3f} s: {frames / elapsed:.0f} frames/s")
+    print(f"Handler: mean {metric_sums['handler_ns'] / frames / 1e3:.1f} us, "
+          f"p99 {'<= %g us' % (p99 / 1e3) if p99 else '> 10 ms'}")
+    print(f"Output writes: {len(fake.writes) - writes0}")
+    for i in range(CHANNEL_COUNT):
+        print(f"Relay {i + 1}: {relay_switches[i] - switches0[i]} transitions, "
+              f"ends {'ON' if output_mask >> i & 1 else 'OFF'}")
+
+def handler_bench(path=None, frames=20000):
+    # The per-relay handler this pipeline replaced against process_frame() on the
+    # same frames of config['universe'] (all the old handler read): a capture, or
+    # synthetic frames where the patched slots move every 4th frame and repeat
+    # in between, as a console refreshing at 44 Hz does.
+    setup(fake=True)
+    compile_channel_map()
+    u = config['universe']
+    if path:
+        data = [(bytes(d), cid, prio, seq, opts) for _, fu, d, cid, prio, seq, opts in read_capture(path) if fu == u]
+    else:
+        d, data, cid = bytearray(512), [], uuid.uuid4().bytes
+        for k in range(frames):
+            if k % 4 == 0:
+                for i in range(CHANNEL_COUNT):
+                    d[config['channels'][i] - 1] = (k * 37 + i * 91) & 0xFF
+            data.append((bytes(d), cid, 100, -1, 0))
+    if not data:
+        print(f"No frames for universe {u}")
+        return
+    states, dmx, fake = [False] * MAX_CHANNELS, [0] * MAX_CHANNELS, boards[0][0]
+
+    def baseline(d, *_):
         for i in range(CHANNEL_COUNT):
-            x = sx + i*(bw+m); y = 44; ch = str(config['channels'][i])
-            fill = 255 if relay_states[i] else 0
-            txt  = 0   if relay_states[i] else 255
-            draw.rectangle((x,y,x+bw,y+bh), outline=255-fill, fill=fill)
-            bb = draw.textbbox((x,y), f"{ch}", font=small_font)
-            tx = x + (bw - (bb[2]-bb[0]))//2
-            ty = y + (bh - (bb[3]-bb[1]))//2
-            draw.text((tx,ty), f"{ch}", font=small_font, fill=txt)
-        if OLED_AVAILABLE and oled:
-            oled.image(image); oled.show()
-        time.sleep(1)
-
-threading.Thread(target=update_oled, daemon=True).start()
-
-# -------------------------- STARTUP DELAY --------------------------
-print("Waiting 10 seconds for network to stabilize...")
-time.sleep(10)
-
-init_sacn()
+            ch = config['channels'][i]
+            if len(d) < ch:
+                continue
+            val = d[ch-1]
+            percent = round(val / 255 * 100)
+            dmx[i] = percent
+            new_state = percent >= config['setpoints'][i]
+            if new_state != states[i]:
+                states[i] = new_state
+                fake.write(new_state << i, 1 << i)             # relays[i].on() / .off()
+        for i in range(CHANNEL_COUNT, MAX_CHANNELS):
+            if states[i]:
+                states[i] = False
+                fake.write(0, 1 << i)
+            dmx[i] = 0
+
+    def compiled(d, cid, prio, seq, opts):
+        process_frame(u, d, cid, prio, seq, opts)
+
+    print(f"{len(data)} frames, {CHANNEL_COUNT} relays on universe {u}")
+    for name, fn in (('baseline', baseline), ('compiled', compiled)):
+        lat, perf, writes0 = [], time.perf_counter_ns, len(fake.writes)
+        start = perf()
+        for frame in data:
+            t0 = perf()
+            fn(*frame)
+            lat.append(perf() - t0)
+        total = perf() - start
+        lat.sort()
+        print(f"{name:9} {len(data) / total * 1e9:10.0f} packets/s  mean {sum(lat) / len(lat) / 1e3:6.2f} us  "
+              f"p99 {lat[len(lat) * 99 // 100] / 1e3:6.2f} us  {len(fake.writes) - writes0} output writes")
+
+def input_bench(sacn_count=4, artnet_count=4, rate=44.0, duration=10.0, receivers=('native',)):
+    # Loopback senders at full frame rate into one receive loop: the first
+    # sacn_count universes as E1.31, the rest as ArtDmx, relays patched to both
+    # protocols in turn on FakeBoard outputs. Levels flip every second. The sacn
+    # library receiver takes E1.31 only, so its pass sends no Art-Net.
+    setup(fake=True)
+    cid = uuid.uuid4().bytes
+    tx = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+    levels = (bytes(512), b'\xff' * 512)
+    seq, period, rows = 0, 1 / rate, []
+    for kind in receivers:
+        art = artnet_count if kind == 'native' else 0
+        total = sacn_count + art
+        order = [u for pair in itertools.zip_longest(range(1, sacn_count + 1), range(sacn_count + 1, total + 1))
+                 for u in pair if u]
+        config['receiver'] = kind
+        config['universes'] = [order[i % total] for i in range(MAX_CHANNELS)]
+        config['artnet'] = [{'universe': sacn_count + 1 + i, 'port_address': i} for i in range(art)]
+        compile_channel_map()
+        compile_artnet_map()
+        handled = [0, 0]
+        def handler(u, d, cid, prio, seq, opts, sync):
+            handled[u > sacn_count] += 1
+            process_frame(u, d, cid, prio, seq, opts, sync)
+        if kind == 'native':
+            rx = E131Receiver(handler, '127.0.0.1')
+            rx.artnet = artnet_map
+            rx.start()
+            rx.universes.update(range(1, sacn_count + 1))     # unicast on loopback, no membership needed
+            thread = rx.thread
+        else:
+            from sacn import sACNreceiver
+            rx = sACNreceiver('127.0.0.1', E131_PORT)
+            for u in range(1, sacn_count + 1):
+                rx.register_listener('universe', sacn_packet_handler, universe=u)
+            # count off the socket callback: the library calls listeners on changed data only
+            on_data = rx._handler.on_data
+            def on_raw(data, now):
+                handled[0] += 1
+                on_data(data, now)
+            rx._handler.on_data = on_raw
+            rx.start()
+            thread = rx._handler.socket._thread
+        streams = [(e131_data_packet(u, 100, cid, 'inputbench'), 126, 111, E131_PORT)
+                   for u in range(1, sacn_count + 1)]
+        streams += [(artdmx_packet(pa), 18, 12, ARTNET_PORT) for pa in range(art)]
+        sent, frame = [0, 0], 0
+        time.sleep(0.1)
+        cpu_clock = time.pthread_getcpuclockid(thread.ident)
+        cpu0, hist0, switches0 = time.clock_gettime(cpu_clock), list(handler_hist), sum(relay_switches)
+        start = time.perf_counter()
+        while time.perf_counter() < start + duration:
+            level = levels[int(frame * period) & 1]
+            for pkt, data, seq_at, port in streams:
+                pkt[data:data + 512] = level
+                pkt[seq_at] = seq & 0xFF if port == E131_PORT else seq % 255 + 1
+                tx.sendto(pkt, ('127.0.0.1', port))
+                sent[port == ARTNET_PORT] += 1
+            frame += 1
+            seq += 1          # one stream across passes, so the next pass is not out of sequence
+            time.sleep(max(0.0, start + frame * period - time.perf_counter()))
+        time.sleep(0.2)
+        cpu = time.clock_gettime(cpu_clock) - cpu0
+        rx.stop()
+        hist = [n - n0 for n, n0 in zip(handler_hist, hist0)]
+        p99 = hist_percentile(hist, 0.99)
+        print(f"{kind} receiver:")
+        for name, i in (('sACN', 0), ('Art-Net', 1)):
+            if sent[i]:
+                lost = sent[i] - handled[i]
+                print(f"  {name:8}{sent[i]:8} sent {handled[i]:8} handled  {lost / sent[i]:.2%} lost")
+        pkts = sum(handled) or 1
+        print(f"  {pkts / duration:.0f} packets/s on one loop: {cpu / duration:.1%} of a core, "
+              f"{cpu / pkts * 1e6:.1f} us/packet including the pipeline")
+        print(f"  Handler p99 {'<= %g us' % (p99 / 1e3) if p99 else '> 10 ms'}, "
+              f"{sum(relay_switches) - switches0} relay transitions")
+        rows.append(f"{kind:8} {sent[0] / duration:9.0f} {handled[0] / duration:9.0f} "
+                    f"{cpu / duration:6.1%} {cpu / pkts * 1e6:8.1f}")
+    if len(rows) > 1:
+        # CPU and us/packet of the native pass include its Art-Net packets
+        print(f"{'receiver':8} {'sent/s':>9} {'sACN/s':>9} {'CPU':>6} {'us/pkt':>8}")
+        print('\n'.join(rows))
+
+def forward_bench(rate=44.0, duration=10.0):
+    # A primary (priority 150, slots at 255) and a backup (priority 50, slots at 0)
+    # both send universe 1 over loopback; the node repeats it as universe 2 by
+    # unicast to 127.0.0.2, where every copy must carry the primary's levels and
+    # priority. One packet in flight at a time, so each copy also times the hop.
+    setup(fake=True)
+    config['forward'] = [{'universe': 1, 'dst_universe': 2, 'unicast': ['127.0.0.2']}]
+    compile_channel_map()
+    compile_forward_map()
+    rx = E131Receiver(process_frame, '127.0.0.1')
+    rx.start()
+    rx.universes.add(1)
+    down = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+    down.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    down.bind(('127.0.0.2', E131_PORT))
+    down.settimeout(0.1)
+    tx = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+    sources = []
+    for prio, level in ((150, 255), (50, 0)):
+        pkt = e131_data_packet(1, prio, uuid.uuid4().bytes, 'forwardbench')
+        pkt[126:638] = bytes([level]) * 512
+        sources.append(pkt)
+    time.sleep(0.1)
+    lat, lost, wrong, period = [], 0, 0, 1 / rate
+    start = time.perf_counter()
+    for n in range(int(duration * rate)):
+        for pkt in sources:
+            pkt[111] = n & 0xFF
+            t0 = time.perf_counter_ns()
+            tx.sendto(pkt, ('127.0.0.1', E131_PORT))
+            try:
+                out = down.recv(1144)
+            except socket.timeout:
+                lost += 1
+                continue
+            lat.append(time.perf_counter_ns() - t0)
+            wrong += out[108] != 150 or out[126:638] != sources[0][126:638]
+        time.sleep(max(0.0, start + (n + 1) * period - time.perf_counter()))
+    rx.stop()
+    lat.sort()
+    sent = 2 * int(duration * rate)
+    print(f"{sent} packets in from 2 sources, {len(lat)} forwarded, {lost} lost, "
+          f"{wrong} not the primary's levels/priority")
+    if lat:
+        print(f"Forward latency p50 {lat[len(lat) // 2] / 1e3:.0f} us, "
+              f"p99 {lat[int(len(lat) * 0.99)] / 1e3:.0f} us, max {lat[-1] / 1e3:.0f} us")
+
+def logic_bench(frames=20000):
+    # 1..64 relays on one universe of FakeBoard outputs, driven in turn by a plain
+    # setpoint, a range AND, a 16-bit pair and any() over 8 slots, each relay on
+    # its own 8 slots. Random frames go straight into process_frame(); reports the
+    # generated relays() pass alone and the whole pipeline per packet.
+    global MAX_CHANNELS, CHANNEL_COUNT, boards, relay_switches
+    setup(fake=True)
+    data = [os.urandom(512) for _ in range(64)]
+    cid = uuid.uuid4().bytes
+    rows = [f"{'relays':>6} {'slots':>6} {'logic ns/pkt':>13} {'ns/relay':>9} {'pipeline us/pkt':>16}"]
+    for n in (1, 2, 4, 8, 16, 32, 64):
+        MAX_CHANNELS = CHANNEL_COUNT = n
+        boards = build_outputs([{'type': 'fake', 'count': n}])
+        attach_state()
+        relay_switches = [0] * n
+        pad_relay_fields(config, n)
+        config['universes'] = [1] * n
+        for i in range(n):
+            b = i * 8 + 1
+            config['channels'][i] = b
+            config['logic'][i] = ('', f"ch{b} in 40-60% and ch{b + 1} > 0", f"ch{b + 2}:{b + 3} >= 32768",
+                                  f"any(ch{b}-{b + 7}) > 50%")[i % 4]
+        compile_channel_map()
+        getter, _, relays, *_, slots, _, _ = channel_map[1]
+        vals = [getter(d) for d in data]
+        t0 = time.perf_counter_ns()
+        for k in range(frames):
+            relays(vals[k & 63], k)
+        logic = (time.perf_counter_ns() - t0) / frames
+        t0 = time.perf_counter_ns()
+        for k in range(frames):
+            process_frame(1, data[k & 63], cid)
+        pipeline = (time.perf_counter_ns() - t0) / frames
+        rows.append(f"{n:6} {len(slots):6} {logic:13.0f} {logic / n:9.1f} {pipeline / 1e3:16.2f}")
+    print('\n'.join(rows))
 
 # -------------------------- Flask --------------------------
+# Asset URLs in the templates carry ?v=<version>, so browsers may keep them for
+# a year; an update changes the URL. Text assets are served from .br/.gz
+# siblings written once by precompress_assets().
+ASSET_MAX_AGE = 365 * 86400
+ASSET_COMPRESS = ('.css', '.js', '.svg', '.ttf')
+
+@app.context_processor
+def asset_version():
+    return {'asset_v': CURRENT_VERSION}
+
 @app.route('/assets/<path:filename>')
 def assets(filename):
-    return send_from_directory(os.path.join(APP_DIR, 'assets'), filename)
+    root = os.path.join(CODE_DIR, 'assets')
+    accept = request.headers.get('Accept-Encoding', '')
+    for enc, ext in (('br', '.br'), ('gzip', '.gz')):
+        path = safe_join(root, filename + ext) if enc in accept else None
+        if path and os.path.isfile(path):
+            resp = send_from_directory(root, filename + ext, max_age=ASSET_MAX_AGE,
+                                       mimetype=mimetypes.guess_type(filename)[0])
+            resp.headers['Content-Encoding'] = enc
+            break
+    else:
+        resp = send_from_directory(root, filename, max_age=ASSET_MAX_AGE)
+    resp.headers['Vary'] = 'Accept-Encoding'
+    return resp
 
-# -------------------------- Helper --------------------------
-def get_current_ip():
+def precompress_assets():
     try:
-        if 'eth0' in netifaces.interfaces():
-            return netifaces.ifaddresses('eth0')[netifaces.AF_INET][0]['addr']
-    except: pass
-    return 'No IP'
+        import brotli
+    except ImportError:
+        brotli = None
+    encoders = [('.gz', lambda d: gzip.compress(d, 9, mtime=0))]
+    if brotli:
+        encoders.append(('.br', brotli.compress))
+    for dirpath, _, files in os.walk(os.path.join(CODE_DIR, 'assets')):
+        for fn in files:
+            if not fn.endswith(ASSET_COMPRESS):
+                continue
+            src, data = os.path.join(dirpath, fn), None
+            for ext, compress in encoders:
+                dst = src + ext
+                if os.path.exists(dst) and os.path.getmtime(dst) >= os.path.getmtime(src):
+                    continue
+                if data is None:
+                    with open(src, 'rb') as f:
+                        data = f.read()
+                with open(dst + '.tmp', 'wb') as f:
+                    f.write(compress(data))
+                os.replace(dst + '.tmp', dst)
 
+# -------------------------- Helper --------------------------
 def get_system_stats():
+    import psutil
     cpu = psutil.cpu_percent(interval=None)
     mem = psutil.virtual_memory()
     return {
@@ -283,15 +2867,19 @@ def get_system_stats():
 def require_auth():
     if not config['security_enabled']:
         return True
-    if 'authenticated' not in session:
-        return False
-    return True
+    if 'authenticated' in session:
+        return True
+    # API clients send the device password as a bearer token
+    auth = request.headers.get('Authorization', '')
+    return auth.startswith('Bearer ') and secrets.compare_digest(auth[7:], config['password'])
 
 @app.before_request
 def check_auth():
-    if request.path.startswith('/assets/') or request.path in ['/login', '/static']:
+    if request.path.startswith('/assets/') or request.path in ['/login', '/static', '/metrics', '/metrics.bin', '/api/info']:
         return
     if not require_auth():
+        if request.path.startswith('/api/'):
+            return jsonify({'error': 'authentication required'}), 401
         return redirect(url_for('login', next=request.path))
 
 @app.route('/login', methods=['GET', 'POST'])
@@ -319,8 +2907,9 @@ def main():
             for i in range(CHANNEL_COUNT):
                 config['channels'][i] = int(request.form[f'ch{i+1}'])
                 config['setpoints'][i] = int(request.form[f'sp{i+1}'])
+                config['universes'][i] = int(request.form.get(f'u{i+1}', 0))
             save_config()
-            init_sacn()
+            apply_config()
             flash("Settings saved!", "success")
         except Exception as e:
             flash(f"Invalid input: {e}", "danger")
@@ -330,41 +2919,104 @@ def main():
         hostname=config['hostname'], universe=config['universe'],
         channels=config['channels'][:CHANNEL_COUNT],
         setpoints=config['setpoints'][:CHANNEL_COUNT],
+        universes=config['universes'][:CHANNEL_COUNT],
         channel_count=CHANNEL_COUNT,
         current_ip=ip, version=CURRENT_VERSION, theme=config['theme'],
         security_enabled=config['security_enabled'])
 
+def status_rows(snap=None):
+    # a relay switched by logic shows the channels its expression reads (its DMX %
+    # is the first of them) and the expression; 'logic' is '' when none is in effect
+    _, dmx, relays = snap or state.snapshot()
+    rows = []
+    for i in range(CHANNEL_COUNT):
+        slots = relay_logic_slots(i)
+        rows.append({
+            'universe': relay_universe(i),
+            'channel': config['channels'][i] if slots is None else slot_ranges(slots),
+            'dmx_percent': dmx[i],
+            'setpoint': config['setpoints'][i],
+            'logic': '' if slots is None else config['logic'][i].strip(),
+            'relay_state': 'ON' if relays[i] else 'OFF'
+        })
+    return rows
+
 @app.route('/status')
 def status():
     ip = get_current_ip()
-    status_data = [{
-        'channel': config['channels'][i],
-        'dmx_percent': current_dmx_values[i],
-        'setpoint': config['setpoints'][i],
-        'relay_state': 'ON' if relay_states[i] else 'OFF'
-    } for i in range(CHANNEL_COUNT)]
     return render_template('status.html',
-        hostname=config['hostname'], current_ip=ip, status=status_data,
+        hostname=config['hostname'], current_ip=ip, status=status_rows(),
         channel_count=CHANNEL_COUNT,
         version=CURRENT_VERSION, theme=config['theme'],
         security_enabled=config['security_enabled'])
 
 @app.route('/status/data')
 def status_data():
-    status_data = [{
-        'channel': config['channels'][i],
-        'dmx_percent': current_dmx_values[i],
-        'setpoint': config['setpoints'][i],
-        'relay_state': 'ON' if relay_states[i] else 'OFF'
-    } for i in range(CHANNEL_COUNT)]
-    
-    system = get_system_stats()
-    
+    snap = state.snapshot()
     return jsonify({
-        'status': status_data,
-        'system': system
+        'generation': snap[0],
+        'status': status_rows(snap),
+        'system': get_system_stats()
     })
 
+SSE_MAX_CLIENTS = 4                    # a third of WEB_THREADS: a stream holds a worker throughout
+SSE_MAX_SECONDS = 300                  # then the browser reconnects, so a slot turns over
+sse_slots = threading.BoundedSemaphore(SSE_MAX_CLIENTS)
+
+@app.route('/status/stream')
+def status_stream():
+    # Server-Sent Events: 'status' only when the packet handler changed something
+    # (coalesced to STATUS_PUSH_HZ), 'system' every STATS_INTERVAL seconds. Over
+    # SSE_MAX_CLIENTS a 503 sends the page back to polling /status/data.
+    if not sse_slots.acquire(blocking=False):
+        return Response('too many status streams\n', 503, {'Retry-After': '30'}, mimetype='text/plain')
+    def events():
+        sent = -1
+        next_stats = 0
+        end = time.monotonic() + SSE_MAX_SECONDS
+        yield "retry: 1000\n\n"
+        while time.monotonic() < end:
+            now = time.monotonic()
+            if now >= next_stats:
+                yield f"event: system\ndata: {json.dumps(get_system_stats())}\n\n"
+                next_stats = now + STATS_INTERVAL
+            with status_cond:
+                if status_version == sent:
+                    status_cond.wait(max(0, min(next_stats, end) - time.monotonic()))
+                v = status_version
+            if v != sent:
+                sent = v
+                yield f"event: status\ndata: {json.dumps(status_rows())}\n\n"
+                time.sleep(1 / STATUS_PUSH_HZ)
+    resp = Response(events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    resp.call_on_close(sse_slots.release)   # the server closes the response even if it never iterated
+    return resp
+
+@app.route('/metrics')
+def metrics():
+    return Response(metrics_prometheus(metrics_snapshot()), mimetype='text/plain; version=0.0.4')
+
+@app.route('/metrics.bin')
+def metrics_bin():
+    return Response(metrics_binary(metrics_snapshot()), mimetype='application/octet-stream')
+
+@app.route('/history')
+def history_api():
+    # ?relay=5&from=20:14&to=20:16&kind=relay,config&limit=1000; times as for parse_when()
+    if journal is None:
+        return jsonify({'error': 'journal unavailable'}), 503
+    kind_codes = {'relay': J_RELAY, 'config': J_CONFIG, 'start': J_START}
+    try:
+        t0, t1 = parse_when(request.args.get('from')), parse_when(request.args.get('to'))
+        kinds = {kind_codes[k] for k in request.args.get('kind', '').split(',') if k}
+    except (ValueError, KeyError) as e:
+        return jsonify({'error': f"bad query: {e}"}), 400
+    relay = request.args.get('relay', type=int)
+    limit = max(1, min(request.args.get('limit', 1000, type=int), 10000))
+    recs = journal.query(t0, t1, None if relay is None else relay - 1, kinds, limit)
+    return jsonify({'entries': [journal_entry(r) for r in recs], 'truncated': len(recs) == limit})
+
 @app.route('/test')
 def test():
     return render_template('test.html',
@@ -380,6 +3032,198 @@ def pulse(rid):
         pulse_relay(rid)
     return redirect(url_for('test'))
 
+@app.route('/api/actions', methods=['GET', 'POST'])
+def api_actions():
+    if request.method == 'POST':
+        try:
+            started = start_action(request.get_json(force=True))
+        except (ValueError, KeyError, TypeError) as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify(started), 201
+    with action_lock:
+        listed = [dict(a) for a in actions.values()]
+    return jsonify(listed)
+
+@app.route('/api/actions/<int:job>', methods=['DELETE'])
+def api_action_cancel(job):
+    if not cancel_action(job):
+        return jsonify({'error': 'no such action'}), 404
+    return jsonify({'cancelled': job})
+
+# -------------------------- CONFIG API --------------------------
+# GET /api/config returns every field (except the password) with a hash of them
+# as ETag: a counter would restart at boot and match a stale copy. PATCH takes
+# any subset of fields, validates all of them before changing anything and
+# honours If-Match. Per-relay lists may be shorter than the relay count and
+# then replace only the leading entries; objects (realtime) are merged.
+# /api/batch runs several API calls in order.
+def _int_in(lo, hi):
+    return lambda v: type(v) is int and lo <= v <= hi
+
+def _one_of(*options):
+    return lambda v: v in options
+
+def _relays(lo, hi):
+    return lambda v: len(v) == MAX_CHANNELS and all(type(x) is int and lo <= x <= hi for x in v)
+
+def _ipv4(v):
+    try:
+        return isinstance(v, str) and v.count('.') == 3 and bool(socket.inet_aton(v))
+    except OSError:
+        return False
+
+def _logic(v):
+    if len(v) != MAX_CHANNELS or not all(isinstance(x, str) and len(x) <= 4096 for x in v):
+        return False
+    for i, x in enumerate(v):
+        if x.strip():
+            try:
+                parse_logic(x)
+            except LogicError as e:
+                raise LogicError(f"relay {i + 1}: {e}")
+    return True
+
+CONFIG_FIELDS = {
+    'network': _one_of('dhcp', 'static'),
+    'ip': _ipv4, 'subnet': _ipv4, 'gateway': _ipv4, 'dns1': _ipv4, 'dns2': _ipv4,
+    'hostname': lambda v: isinstance(v, str) and bool(re.match(r'^[a-zA-Z0-9][a-zA-Z0-9\-]{0,61}[a-zA-Z0-9]$', v)),
+    'universe': _int_in(1, 63999),
+    'universes': _relays(0, 63999),
+    'channels': _relays(1, 512),
+    'setpoints': _relays(1, 100),
+    'hysteresis': _relays(0, 100),
+    'min_on_ms': _relays(0, 3600000),
+    'min_off_ms': _relays(0, 3600000),
+    'max_switch_hz': _relays(0, 1000),
+    'logic': _logic,
+    'mode': lambda v: isinstance(v, str) and v.isdigit() and 1 <= int(v) <= MAX_CHANNELS,
+    'theme': _one_of('light', 'dark'),
+    'security_enabled': lambda v: type(v) is bool,
+    'password': lambda v: isinstance(v, str) and v.strip() != '',
+    'realtime': lambda v: type(v['enabled']) is bool and type(v['cpu']) is int and _int_in(1, 99)(v['priority'])
+                          and set(v) == {'enabled', 'cpu', 'priority'},
+    'receiver': _one_of('native', 'sacn'),
+    'merge': _one_of('htp', 'ltp'),
+    'outputs': valid_outputs,
+    'forward': lambda v: isinstance(v, list) and all(isinstance(f, dict) for f in v),
+    'artnet': lambda v: isinstance(v, list) and all(isinstance(a, dict) and _int_in(1, 63999)(a.get('universe'))
+                                                    and _int_in(0, 0x7FFF)(a.get('port_address')) for a in v),
+    'cid': lambda v: isinstance(v, str) and bool(re.fullmatch(r'[0-9a-f]{32}', v)),
+}
+READ_ONLY_FIELDS = {'version', 'py_file'}
+RESTART_FIELDS = {'realtime', 'outputs'}
+NETWORK_FIELDS = {'network', 'ip', 'subnet', 'gateway', 'dns1', 'dns2'}
+config_api_lock = threading.Lock()
+
+def config_etag():
+    return '"%s"' % hashlib.sha256(json.dumps(public_config(), sort_keys=True).encode()).hexdigest()[:20]
+
+def public_config():
+    return {k: v for k, v in config.items() if k != 'password'}
+
+def patch_config(patch):
+    # -> changed field names; raises ValueError before touching config
+    if not isinstance(patch, dict):
+        raise ValueError("body must be a JSON object")
+    new = {}
+    for key, value in patch.items():
+        if key in READ_ONLY_FIELDS:
+            raise ValueError(f"{key} is read-only")
+        if key not in CONFIG_FIELDS:
+            raise ValueError(f"unknown field {key}")
+        if key == 'realtime' and isinstance(value, dict):
+            value = {**config['realtime'], **value}
+        elif key in RELAY_FIELDS and isinstance(value, list):
+            value = value + config[key][len(value):]
+        try:
+            ok = CONFIG_FIELDS[key](value)
+        except LogicError as e:
+            raise ValueError(f"invalid value for {key}: {e}")
+        except (TypeError, KeyError, ValueError):
+            ok = False
+        if not ok:
+            raise ValueError(f"invalid value for {key}: {value!r}")
+        new[key] = value
+    if 'setpoints' in new or 'hysteresis' in new:
+        sp, hy = new.get('setpoints', config['setpoints']), new.get('hysteresis', config['hysteresis'])
+        for i in range(MAX_CHANNELS):
+            if hy[i] and hy[i] >= sp[i]:
+                raise ValueError(f"relay {i + 1}: hysteresis {hy[i]} must be below setpoint {sp[i]}")
+    changed = [k for k, v in new.items() if config[k] != v]
+    config.update({k: new[k] for k in changed})
+    return changed
+
+def apply_config_changes(changed):
+    # -> warnings; same side effects as the form pages
+    global CHANNEL_COUNT
+    warnings = []
+    if not changed:
+        return warnings
+    if 'mode' in changed:
+        CHANNEL_COUNT = channel_count_for(config['mode'])
+    save_config()
+    apply_config()
+    if 'hostname' in changed:
+        try:
+            apply_hostname_config()
+        except Exception as e:
+            warnings.append(f"hostname update failed: {e}")
+    if NETWORK_FIELDS.intersection(changed):
+        # after the response is out, the address may be about to change
+        scheduler.call_later(0.5, apply_network_config)
+    return warnings
+
+@app.route('/api/info')
+def api_info():
+    return jsonify({'product': 'sacn-relay', 'version': CURRENT_VERSION, 'hostname': config['hostname'],
+                    'cid': config['cid'], 'relays': MAX_CHANNELS, 'config_version': config_version})
+
+@app.route('/api/config', methods=['GET', 'PATCH'])
+def api_config():
+    if request.method == 'GET':
+        resp = jsonify(public_config())
+    else:
+        with config_api_lock:
+            match = request.headers.get('If-Match')
+            if match and match != '*' and config_etag() not in [m.strip() for m in match.split(',')]:
+                resp = jsonify({'error': 'config was changed by someone else', 'etag': config_etag()})
+                resp.status_code = 412
+                return resp
+            try:
+                changed = patch_config(request.get_json(force=True, silent=True))
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            warnings = apply_config_changes(changed)
+        resp = jsonify({'changed': changed, 'warnings': warnings,
+                        'restart_required': sorted(RESTART_FIELDS.intersection(changed)),
+                        'config': public_config()})
+    resp.headers['ETag'] = config_etag()
+    return resp
+
+@app.route('/api/batch', methods=['POST'])
+def api_batch():
+    # {"requests": [{"method", "path", "body", "if_match"}], "stop_on_error": true}
+    body = request.get_json(force=True, silent=True) or {}
+    reqs = body.get('requests')
+    if not isinstance(reqs, list):
+        return jsonify({'error': 'requests must be a list'}), 400
+    client = app.test_client()
+    passthrough = {k: request.headers[k] for k in ('Authorization', 'Cookie') if k in request.headers}
+    results = []
+    for r in reqs:
+        path = r.get('path', '') if isinstance(r, dict) else ''
+        if not path.startswith('/api/') or path.startswith('/api/batch'):
+            results.append({'status': 400, 'body': {'error': f"bad path {path!r}"}})
+        else:
+            headers = dict(passthrough)
+            if r.get('if_match'):
+                headers['If-Match'] = r['if_match']
+            sub = client.open(path, method=r.get('method', 'GET').upper(), json=r.get('body'), headers=headers)
+            results.append({'status': sub.status_code, 'etag': sub.headers.get('ETag'), 'body': sub.get_json(silent=True)})
+        if results[-1]['status'] >= 400 and body.get('stop_on_error', True):
+            break
+    return jsonify({'responses': results}), 200 if all(r['status'] < 400 for r in results) else 207
+
 @app.route('/networking', methods=['GET', 'POST'])
 def networking():
     ip = get_current_ip()
@@ -404,23 +3248,26 @@ def networking():
         current_ip=ip, version=CURRENT_VERSION, theme=config['theme'],
         security_enabled=config['security_enabled'])
 
+def device_modes():
+    # the relay modes the device page offers
+    return {'4', '8'} | ({str(MAX_CHANNELS)} if MAX_CHANNELS > 8 else set())
+
 @app.route('/device', methods=['GET', 'POST'])
 def device():
     ip = get_current_ip()
     reboot_needed = False
     if request.method == 'POST':
         new_hostname = request.form['hostname'].strip()
-        new_mode = request.form['mode']
+        new_mode = request.form.get('mode', '')
+        if new_mode not in device_modes():
+            flash("Invalid relay mode", "danger")
+            return redirect(url_for('device'))
         if re.match(r'^[a-zA-Z0-9][a-zA-Z0-9\-]{0,61}[a-zA-Z0-9]$', new_hostname) and len(new_hostname) <= 63:
             old_mode = config['mode']
             config['hostname'] = new_hostname
             config['mode'] = new_mode
 
-            target_count = 4 if new_mode == '4' else 8
-            current_ch = config['channels'][:8]
-            config['channels'] = current_ch[:target_count] + [1] * max(0, target_count - len(current_ch))
-            current_sp = config['setpoints'][:8]
-            config['setpoints'] = current_sp[:target_count] + [51] * max(0, target_count - len(current_sp))
+            target_count = channel_count_for(new_mode)
 
             save_config()
             try:
@@ -431,13 +3278,14 @@ def device():
                 reboot_needed = True
             global CHANNEL_COUNT
             CHANNEL_COUNT = target_count
-            init_sacn()
+            apply_config()
             flash("Settings saved!", "success")
         else:
             flash("Invalid hostname", "danger")
     return render_template('device.html',
         hostname=config['hostname'], current_ip=ip,
         mode=config['mode'],
+        max_channels=MAX_CHANNELS,
         reboot_needed=reboot_needed,
         version=CURRENT_VERSION, theme=config['theme'],
         security_enabled=config['security_enabled'])
@@ -447,7 +3295,7 @@ def reboot_pi():
     if config['security_enabled'] and 'authenticated' not in session:
         return "Unauthorized", 403
     flash("Rebooting Pi... Please wait 60 seconds.", "info")
-    threading.Timer(1.0, lambda: subprocess.run(['/usr/bin/sudo', 'reboot'])).start()
+    scheduler.call_later(1.0, reboot_system)
     return redirect(url_for('rebooting'))
 
 @app.route('/rebooting')
@@ -493,7 +3341,8 @@ def backup_download():
     hostname = config['hostname']
     mode = "8" if config['mode'] == '8' else "4"
     filename = f"{hostname}-sACN-Relay{mode}-config-v{CURRENT_VERSION}.json"
-    return send_file(config_file, as_attachment=True, download_name=filename)
+    snap = json.dumps(config_snapshot()[1], indent=4).encode()
+    return send_file(io.BytesIO(snap), mimetype='application/json', as_attachment=True, download_name=filename)
 
 @app.route('/backup/upload', methods=['POST'])
 def backup_upload():
@@ -514,7 +3363,7 @@ def backup_upload():
     if 'version' not in uploaded:
         flash("Config missing version", "danger")
         return redirect(url_for('backup'))
-    if uploaded['version'] > CURRENT_VERSION:
+    if version_tuple(uploaded['version']) > version_tuple(CURRENT_VERSION):
         flash(f"Config version {uploaded['version']} is newer than current {CURRENT_VERSION}", "danger")
         return redirect(url_for('backup'))
 
@@ -537,21 +3386,21 @@ def backup_confirm():
         flash("No config to apply", "danger")
         return redirect(url_for('backup'))
     
+    global CHANNEL_COUNT
     new_config = session.pop('uploaded_config')
     for key, value in default_config.items():
         if key not in new_config:
             new_config[key] = value
     new_config['version'] = CURRENT_VERSION
 
-    target_count = 4 if new_config['mode'] == '4' else 8
-    new_config['channels'] = (new_config.get('channels', []) + [1]*8)[:target_count]
-    new_config['setpoints'] = (new_config.get('setpoints', []) + [51]*8)[:target_count]
+    target_count = channel_count_for(new_config['mode'])
+    new_config['outputs'] = config['outputs']
+    pad_relay_fields(new_config, MAX_CHANNELS)
 
-    global config, CHANNEL_COUNT
     config.update(new_config)
     CHANNEL_COUNT = target_count
     save_config()
-    init_sacn()
+    apply_config()
     try:
         apply_network_config()
     except:
@@ -562,60 +3411,1002 @@ def backup_confirm():
     return redirect(url_for('main'))
 
 # -------------------------- OTA UPDATE --------------------------
+# Updates ship as bundles (.srb): a tar.gz whose first member is manifest.json
+#   {"format": 1, "product": "sacn-relay", "version": "x.y.z", "tree": <hash>,
+#    "base": <tree hash of the install a delta was made against, or null>,
+#    "files": {"<path>": "<sha256>", ...}}          (the complete new tree)
+# followed by files/<path> for every file the base does not already have, or
+# delta/<path> when that is smaller: a block delta against the node's copy of
+# the file (see make_delta), made from the block signatures /api/ota/manifest
+# serves. Every file is checked against its sha256 however it arrived.
+# Uploads stream to disk, then a background thread verifies every hash and
+# unpacks into the idle A/B slot (ota/a, ota/b), taking unchanged files from
+# the running install. Applying points ota/active at the slot and reboots;
+# the launcher (APP_DIR) execs whichever slot is active. A new slot boots on
+# probation (ota/pending.json) and is rolled back if it fails its health
+# check or does not come up within OTA_BOOT_ATTEMPTS starts.
+OTA_DIR = os.path.join(APP_DIR, 'ota')
+OTA_SLOTS = ('a', 'b')
+OTA_FORMAT = 1
+OTA_CHUNK = 256 * 1024
+OTA_BOOT_ATTEMPTS = 3
+OTA_HEALTH_TIMEOUT = 120.0
+OTA_UPLOAD = os.path.join(OTA_DIR, 'upload.srb')
+OTA_ACTIVE = os.path.join(OTA_DIR, 'active')
+OTA_STAGED = os.path.join(OTA_DIR, 'staged.json')
+OTA_PENDING = os.path.join(OTA_DIR, 'pending.json')
+OTA_ROLLBACK = os.path.join(OTA_DIR, 'rollback.json')
+OTA_BOOT_ENV = 'SACN_RELAY_OTA_BOOT'   # set on exec so the slot does not count its boot twice
+OTA_BLOCK = 1024                       # block size of delta signatures
+OTA_DELTA_MAGIC = b'SRD1'
+OTA_DELTA_OP = struct.Struct('<cII')   # b'C' first base block, count | b'L' literal length, 0
+
+ota_lock = threading.Lock()
+ota_status = {'state': 'idle', 'received': 0, 'total': None, 'sha256': None, 'version': None, 'error': None}
+_installed_manifest = None
+_installed_blocks = None
+
+def read_json_file(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def code_version(source):
+    m = re.search(r'CURRENT_VERSION\s*=\s*[\'"](\d+\.\d+\.\d+)[\'"]', source)
+    return m.group(1) if m else None
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(OTA_CHUNK):
+            h.update(chunk)
+    return h.hexdigest()
+
+def tree_hash(files):
+    return hashlib.sha256(''.join(f"{p}\0{h}\n" for p, h in sorted(files.items())).encode()).hexdigest()
+
+def bundle_paths(root):
+    # the controller and its assets; not the .gz/.br written by precompress_assets()
+    paths = ['sacn_relay_controller.py']
+    for dirpath, dirs, files in os.walk(os.path.join(root, 'assets')):
+        dirs.sort()
+        paths += [os.path.relpath(os.path.join(dirpath, fn), root).replace(os.sep, '/')
+                  for fn in sorted(files) if not fn.endswith(('.gz', '.br', '.tmp'))]
+    return paths
+
+def build_manifest(root):
+    files = {p: file_sha256(os.path.join(root, p)) for p in bundle_paths(root)}
+    with open(os.path.join(root, 'sacn_relay_controller.py')) as f:
+        version = code_version(f.read())
+    return {'format': OTA_FORMAT, 'product': 'sacn-relay', 'version': version,
+            'tree': tree_hash(files), 'base': None, 'files': files}
+
+def installed_manifest():
+    global _installed_manifest
+    if _installed_manifest is None:
+        _installed_manifest = build_manifest(CODE_DIR)
+    return _installed_manifest
+
+def installed_blocks():
+    global _installed_blocks
+    if _installed_blocks is None:
+        _installed_blocks = block_signatures(CODE_DIR, installed_manifest()['files'])
+    return _installed_blocks
+
+# -------- block deltas (rsync-style) --------
+def weak_sum(block):
+    # rsync's rolling checksum: a = sum of bytes, b = sum of the running sums
+    return (sum(block) & 0xFFFF) | (sum(itertools.accumulate(block)) & 0xFFFF) << 16
+
+def strong_sum(block):
+    return hashlib.sha256(block).hexdigest()[:16]
+
+def block_signatures(root, files, size=OTA_BLOCK):
+    # -> {path: [[weak, strong], ...]} over the whole blocks of each file
+    out = {}
+    for p in files:
+        with open(os.path.join(root, p), 'rb') as f:
+            data = f.read()
+        out[p] = [[weak_sum(data[k:k + size]), strong_sum(data[k:k + size])]
+                  for k in range(0, len(data) - size + 1, size)]
+    return out
+
+def make_delta(data, sigs, size):
+    # -> delta of `data` against a base file with block signatures `sigs`: slide
+    # a rolling checksum over data; a window matching a base block becomes a
+    # copy of it (runs of consecutive blocks merged), the bytes between literals
+    index = {}
+    for k, (weak, strong) in enumerate(sigs):
+        index.setdefault(weak, {}).setdefault(strong, k)
+    out = bytearray(OTA_DELTA_MAGIC + struct.pack('<I', size))
+    run = None                                                 # [first block, count] being extended
+    def emit_run():
+        if run:
+            out.extend(OTA_DELTA_OP.pack(b'C', *run))
+    pos = lit = 0
+    end = len(data)
+    if end >= size:
+        a = sum(data[:size]) & 0xFFFF
+        b = sum(itertools.accumulate(data[:size])) & 0xFFFF
+    while pos + size <= end:
+        cands = index.get(a | b << 16)
+        k = None
+        if cands:
+            strong = strong_sum(data[pos:pos + size])
+            e = run[0] + run[1] if run else len(sigs)
+            k = e if e < len(sigs) and sigs[e] == [a | b << 16, strong] else cands.get(strong)
+        if k is not None:
+            if lit < pos:
+                emit_run()
+                run = None
+                out.extend(OTA_DELTA_OP.pack(b'L', pos - lit, 0) + data[lit:pos])
+            if run and run[0] + run[1] == k:
+                run[1] += 1
+            else:
+                emit_run()
+                run = [k, 1]
+            pos = lit = pos + size
+            if pos + size <= end:
+                a = sum(data[pos:pos + size]) & 0xFFFF
+                b = sum(itertools.accumulate(data[pos:pos + size])) & 0xFFFF
+            continue
+        if pos + size < end:
+            x, y = data[pos], data[pos + size]
+            a = (a - x + y) & 0xFFFF
+            b = (b - size * x + a) & 0xFFFF
+        pos += 1
+    emit_run()
+    if lit < end:
+        out.extend(OTA_DELTA_OP.pack(b'L', end - lit, 0) + data[lit:])
+    return bytes(out)
+
+def apply_delta(src, base_path, root, name, digest):
+    # rebuild `name` under root from a delta (file object) and the base file
+    delta = src.read()
+    if delta[:4] != OTA_DELTA_MAGIC:
+        raise ValueError(f"{name}: not a block delta")
+    size, = struct.unpack_from('<I', delta, 4)
+    path = os.path.join(root, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    h = hashlib.sha256()
+    pos = 8
+    with open(base_path, 'rb') as base, open(path, 'wb') as f:
+        while pos < len(delta):
+            op, x, y = OTA_DELTA_OP.unpack_from(delta, pos)
+            pos += OTA_DELTA_OP.size
+            if op == b'C':
+                base.seek(x * size)
+                chunk = base.read(y * size)
+                if len(chunk) != y * size:
+                    raise ValueError(f"{name}: delta reaches past the end of this node's copy")
+            elif op == b'L':
+                chunk = delta[pos:pos + x]
+                pos += x
+                if len(chunk) != x:
+                    raise ValueError(f"{name}: delta is truncated")
+            else:
+                raise ValueError(f"{name}: bad delta op {op!r}")
+            h.update(chunk)
+            f.write(chunk)
+    if h.hexdigest() != digest:
+        raise ValueError(f"{name}: sha256 mismatch (delta made against a different copy)")
+
+def slot_dir(slot):
+    return os.path.join(OTA_DIR, slot) if slot else APP_DIR   # None: the factory install
+
+def active_slot():
+    try:
+        slot = os.readlink(OTA_ACTIVE)
+    except OSError:
+        return None
+    return slot if slot in OTA_SLOTS else None
+
+def running_slot():
+    here = os.path.realpath(CODE_DIR)
+    return next((s for s in OTA_SLOTS if os.path.realpath(slot_dir(s)) == here), None)
+
+def idle_slot():
+    return 'b' if running_slot() == 'a' else 'a'
+
+def set_active_slot(slot):
+    os.makedirs(OTA_DIR, exist_ok=True)
+    if slot:
+        tmp = OTA_ACTIVE + '.tmp'
+        if os.path.lexists(tmp):
+            os.remove(tmp)
+        os.symlink(slot, tmp)
+        os.replace(tmp, OTA_ACTIVE)
+    elif os.path.lexists(OTA_ACTIVE):
+        os.remove(OTA_ACTIVE)
+    fsync_dir(OTA_DIR)
+
+def ota_boot():
+    # runs first: count probation starts, give up on a slot that keeps failing,
+    # and hand over to the active slot when this is not it
+    pending = read_json_file(OTA_PENDING)
+    if pending and not os.environ.get(OTA_BOOT_ENV):
+        if pending['attempts'] >= OTA_BOOT_ATTEMPTS:
+            ota_rollback(f"did not come up in {pending['attempts']} starts")
+        else:
+            pending['attempts'] += 1
+            write_json_file(OTA_PENDING, pending)
+    active = active_slot()
+    if active == running_slot() or not active and not running_slot():
+        return              # already there; with no slot active, whatever was started runs
+    script = os.path.join(slot_dir(active), 'sacn_relay_controller.py')
+    if os.path.isfile(script):
+        os.environ[OTA_BOOT_ENV] = '1'
+        os.execv(sys.executable, [sys.executable, script] + sys.argv[1:])
+
+def ota_rollback(reason):
+    pending = read_json_file(OTA_PENDING)
+    if not pending:
+        return
+    set_active_slot(pending['previous'])
+    write_json_file(OTA_ROLLBACK, {'version': pending['version'], 'reason': reason, 'time': time.time()})
+    os.remove(OTA_PENDING)
+    print(f"OTA: v{pending['version']} rolled back ({reason})")
+
+def ota_health():
+    # a probation boot is kept once the relay path and the web UI both answer
+    pending = read_json_file(OTA_PENDING)
+    if not pending or pending['slot'] != running_slot():
+        return
+    deadline = time.monotonic() + OTA_HEALTH_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(2)
+        relay_up = realtime_proc.is_alive() if realtime_role else receiver is not None
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', WEB_PORT, timeout=5)
+            conn.request('GET', '/api/info')
+            resp = conn.getresponse()
+            web_up = resp.status == 200 and json.loads(resp.read())['version'] == CURRENT_VERSION
+            conn.close()
+        except (OSError, ValueError, KeyError, http.client.HTTPException):
+            web_up = False
+        if relay_up and web_up:
+            os.remove(OTA_PENDING)
+            print(f"OTA: v{CURRENT_VERSION} passed its health check")
+            return
+    ota_rollback("health check failed")
+    reboot_system()
+
+def ota_receive(stream, offset=0, total=None, digest=None):
+    # write an upload (or the next piece of one) to disk; raises ValueError when
+    # out of step, the message saying where to resume
+    with ota_lock:
+        st = ota_status
+        if st['state'] == 'verifying':
+            raise ValueError("a bundle is being verified, try again shortly")
+        pending = read_json_file(OTA_PENDING)
+        if pending:
+            raise ValueError(f"v{pending['version']} has not passed its health check yet")
+        resume = st['state'] == 'receiving' and (st['total'], st['sha256']) == (total, digest)
+        if offset and not (resume and offset == st['received']):
+            raise ValueError(f"upload out of step, resend from offset {st['received'] if resume else 0}")
+        if not offset:
+            os.makedirs(OTA_DIR, exist_ok=True)
+            if os.path.exists(OTA_STAGED):      # its slot is about to be overwritten
+                os.remove(OTA_STAGED)
+            st.update(state='receiving', received=0, total=total, sha256=digest, version=None, error=None)
+        with open(OTA_UPLOAD, 'r+b' if offset else 'wb') as f:
+            f.seek(offset)
+            f.truncate()
+            while chunk := stream.read(OTA_CHUNK):
+                f.write(chunk)
+                st['received'] += len(chunk)
+        if total is not None and st['received'] > total:
+            st.update(state='failed', error=f"received {st['received']} bytes, expected {total}")
+        elif total is None or st['received'] == total:
+            st['state'] = 'verifying'
+            threading.Thread(target=ota_stage, daemon=True).start()
+        return st['received']
+
+def ota_stage():
+    try:
+        if ota_status['sha256'] and file_sha256(OTA_UPLOAD) != ota_status['sha256']:
+            raise ValueError("upload does not match its sha256")
+        slot = idle_slot()
+        version = unpack_bundle(OTA_UPLOAD, slot)
+        write_json_file(OTA_STAGED, {'slot': slot, 'version': version})
+        ota_status.update(state='staged', version=version)
+        print(f"OTA: v{version} verified and staged in slot {slot}")
+    except (OSError, ValueError, SyntaxError, KeyError, TypeError, tarfile.TarError) as e:
+        ota_status.update(state='failed', error=str(e))
+        print(f"OTA: bundle rejected: {e}")
+    finally:
+        if os.path.exists(OTA_UPLOAD):
+            os.remove(OTA_UPLOAD)
+
+def copy_verified(src, root, name, digest):
+    path = os.path.join(root, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    h = hashlib.sha256()
+    with open(path, 'wb') as f:
+        while chunk := src.read(OTA_CHUNK):
+            h.update(chunk)
+            f.write(chunk)
+    if h.hexdigest() != digest:
+        raise ValueError(f"{name}: sha256 mismatch")
+
+def unpack_bundle(path, slot):
+    # -> version; the slot holds a complete, verified tree or the call raised
+    current = installed_manifest()
+    dest = slot_dir(slot)
+    shutil.rmtree(dest, ignore_errors=True)
+    os.makedirs(dest)
+    with tarfile.open(path, 'r|gz') as tar:
+        member = tar.next()
+        if member is None or member.name != 'manifest.json':
+            raise ValueError("not an update bundle (manifest.json must come first)")
+        man = json.load(tar.extractfile(member))
+        if man.get('product') != 'sacn-relay' or man.get('format') != OTA_FORMAT:
+            raise ValueError("unsupported bundle format")
+        if version_tuple(man['version']) <= version_tuple(CURRENT_VERSION):
+            raise ValueError(f"Version {man['version']} not newer than {CURRENT_VERSION}")
+        files = man['files']
+        if tree_hash(files) != man['tree'] or 'sacn_relay_controller.py' not in files:
+            raise ValueError("manifest is inconsistent")
+        for name in files:
+            if os.path.isabs(name) or os.path.normpath(name) != name or name.startswith('..'):
+                raise ValueError(f"bad path in manifest: {name}")
+        while (member := tar.next()) is not None:
+            kind, _, name = member.name.partition('/')
+            if not member.isfile() or kind not in ('files', 'delta') or name not in files:
+                raise ValueError(f"unexpected bundle entry {member.name}")
+            if kind == 'delta':
+                apply_delta(tar.extractfile(member), os.path.join(CODE_DIR, name), dest, name, files[name])
+            else:
+                copy_verified(tar.extractfile(member), dest, name, files[name])
+    for name, digest in files.items():
+        if os.path.exists(os.path.join(dest, name)):
+            continue
+        if current['files'].get(name) != digest:
+            raise ValueError(f"{name} is not in the bundle and differs here "
+                             f"(delta made against {(man['base'] or 'nothing')[:12]}, this node is {current['tree'][:12]})")
+        with open(os.path.join(CODE_DIR, name), 'rb') as src:
+            copy_verified(src, dest, name, digest)
+    with open(os.path.join(dest, 'sacn_relay_controller.py')) as f:
+        source = f.read()
+    compile(source, 'sacn_relay_controller.py', 'exec')
+    if code_version(source) != man['version']:
+        raise ValueError(f"code says v{code_version(source)}, manifest says v{man['version']}")
+    write_json_file(os.path.join(dest, 'manifest.json'), man)
+    os.sync()
+    return man['version']
+
+def ota_apply():
+    # -> version going live on the next start
+    staged = read_json_file(OTA_STAGED)
+    write_json_file(OTA_PENDING, {'slot': staged['slot'], 'previous': running_slot(),
+                                  'version': staged['version'], 'attempts': 0})
+    set_active_slot(staged['slot'])
+    os.remove(OTA_STAGED)
+    ota_status.update(state='idle', version=None)
+    return staged['version']
+
+def ota_state():
+    return {**ota_status, 'current': CURRENT_VERSION, 'slot': running_slot(),
+            'staged': read_json_file(OTA_STAGED), 'pending': read_json_file(OTA_PENDING),
+            'rollback': read_json_file(OTA_ROLLBACK)}
+
+def make_bundle(out, root=CODE_DIR, base=None):
+    # base: manifest of the install the bundle will patch; only changed files are
+    # packed, as block deltas where the base lists block signatures for them
+    man = build_manifest(root)
+    include = list(man['files'])
+    blocks = {}
+    if base:
+        man['base'] = base['tree']
+        include = [p for p, h in man['files'].items() if base['files'].get(p) != h]
+        blocks = base.get('blocks') or {}
+    def add(name, data):
+        info = tarfile.TarInfo(name)
+        info.size, info.mtime = len(data), time.time()
+        tar.addfile(info, io.BytesIO(data))
+    deltas = 0
+    with tarfile.open(out, 'w:gz') as tar:
+        add('manifest.json', json.dumps(man, indent=1).encode())
+        for p in include:
+            with open(os.path.join(root, p), 'rb') as f:
+                data = f.read()
+            if blocks.get(p):
+                delta = make_delta(data, blocks[p], base['block_size'])
+                if len(delta) < len(data):
+                    add('delta/' + p, delta)
+                    deltas += 1
+                    continue
+            add('files/' + p, data)
+    print(f"{out}: v{man['version']}, {len(include)} of {len(man['files'])} files"
+          f"{f' ({deltas} as block deltas)' if deltas else ''}, {os.path.getsize(out) / 1024:.1f} KiB")
+
 @app.route('/ota', methods=['GET', 'POST'])
 def ota_update():
     if not require_auth():
         return redirect(url_for('login', next='/ota'))
 
-    if 'ota_pending' in session:
-        if request.method == 'POST' and request.form.get('confirm_reboot'):
-            flash("Rebooting Pi to apply v" + session['ota_pending']['version'] + "...", "info")
-            session.pop('ota_pending')
-            threading.Timer(1.0, lambda: subprocess.run(['/usr/bin/sudo', 'reboot'])).start()
-            return redirect(url_for('rebooting'))
-        return render_template('ota_confirm.html',
-            new_version=session['ota_pending']['version'],
-            current_version=CURRENT_VERSION)
-
+    staged = read_json_file(OTA_STAGED)
     if request.method == 'POST':
+        if request.form.get('confirm_reboot') and staged:
+            flash("Rebooting Pi to apply v" + ota_apply() + "...", "info")
+            scheduler.call_later(1.0, reboot_system)
+            return redirect(url_for('rebooting'))
         if 'file' not in request.files:
             flash("No file uploaded", "danger")
             return redirect(url_for('ota_update'))
         file = request.files['file']
-        if not file.filename.endswith('.py'):
-            flash("Must be .py file", "danger")
+        if not file.filename.endswith('.srb'):
+            flash("Must be a .srb update bundle", "danger")
+            return redirect(url_for('ota_update'))
+        try:
+            ota_receive(file.stream)
+        except ValueError as e:
+            flash(str(e), "danger")
             return redirect(url_for('ota_update'))
+        flash("Bundle uploaded, verifying...", "info")
+        return redirect(url_for('ota_update'))
 
-        content = file.read().decode('utf-8')
+    if staged and ota_status['state'] != 'verifying':
+        return render_template('ota_confirm.html',
+            new_version=staged['version'],
+            current_version=CURRENT_VERSION)
+    return render_template('ota.html',
+        current_version=CURRENT_VERSION,
+        ota=ota_state(),
+        security_enabled=config['security_enabled'])
 
+@app.route('/api/ota', methods=['GET', 'PUT'])
+def api_ota():
+    # PUT ?offset=N&total=SIZE&sha256=HEX with the next piece as the body;
+    # staging starts once `total` bytes are in
+    if request.method == 'PUT':
         try:
-            ast.parse(content)
-        except Exception as e:
-            flash(f"Syntax error: {e}", "danger")
-            return redirect(url_for('ota_update'))
+            total = request.args.get('total', type=int)
+            ota_receive(request.stream, request.args.get('offset', 0, type=int), total, request.args.get('sha256'))
+        except ValueError as e:
+            return jsonify({**ota_state(), 'error': str(e)}), 409
+    return jsonify(ota_state())
 
-        version_match = re.search(r'CURRENT_VERSION\s*=\s*[\'"](\d+\.\d+\.\d+)[\'"]', content)
-        if not version_match:
-            flash("CURRENT_VERSION not found! Must be: CURRENT_VERSION = \"x.y.z\"", "danger")
-            return redirect(url_for('ota_update'))
-        new_version = version_match.group(1)
+@app.route('/api/ota/manifest')
+def api_ota_manifest():
+    return jsonify({**installed_manifest(), 'block_size': OTA_BLOCK, 'blocks': installed_blocks()})
 
-        if new_version <= CURRENT_VERSION:
-            flash(f"Version {new_version} not newer than {CURRENT_VERSION}", "danger")
-            return redirect(url_for('ota_update'))
+@app.route('/api/ota/apply', methods=['POST'])
+def api_ota_apply():
+    if not read_json_file(OTA_STAGED):
+        return jsonify({'error': 'nothing staged'}), 409
+    version = ota_apply()
+    scheduler.call_later(1.0, reboot_system)
+    return jsonify({'version': version, 'rebooting': True}), 202
 
-        backup_path = os.path.join(APP_DIR, f"sacn_relay_controller.py.bak.v{CURRENT_VERSION}")
-        os.rename(config['py_file'], backup_path)
-        with open(config['py_file'], 'w') as f:
-            f.write(content)
+# -------------------------- WEB SERVER --------------------------
+WEB_PORT = 8080
+WEB_THREADS = 12           # Live Status streams hold at most SSE_MAX_CLIENTS of them
 
-        session['ota_pending'] = {'version': new_version}
-        flash(f"Update ready: v{new_version} → Reboot to apply", "success")
-        return redirect(url_for('ota_update'))
+class PooledWSGIServer(BaseWSGIServer):
+    # werkzeug server handing connections to a fixed set of daemon worker threads
+    # (a stream in progress must not hold up exit); the accept loop blocks while
+    # every worker is busy, so load can not add threads
+    def __init__(self, host, port, app, workers):
+        super().__init__(host, port, app)
+        self.slots = threading.BoundedSemaphore(workers)
+        self.jobs = queue.SimpleQueue()
+        for n in range(workers):
+            threading.Thread(target=self._worker, name=f'web_{n}', daemon=True).start()
 
-    return render_template('ota.html',
-        current_version=CURRENT_VERSION,
-        security_enabled=config['security_enabled'])
+    def process_request(self, request, client_address):
+        self.slots.acquire()
+        self.jobs.put((request, client_address))
+
+    def _worker(self):
+        while True:
+            self._handle(*self.jobs.get())
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self.slots.release()
+
+def serve_web():
+    try:
+        from waitress import serve
+    except ImportError:
+        print(f"Web UI on port {WEB_PORT}: werkzeug, {WEB_THREADS} worker threads")
+        PooledWSGIServer('0.0.0.0', WEB_PORT, app, WEB_THREADS).serve_forever()
+        return
+    print(f"Web UI on port {WEB_PORT}: waitress, {WEB_THREADS} threads")
+    serve(app, host='0.0.0.0', port=WEB_PORT, threads=WEB_THREADS)
+
+def load_test(url, total=2000, concurrency=8, cookie=None, duration=None):
+    u = urllib.parse.urlsplit(url)
+    target = (u.path or '/') + (f"?{u.query}" if u.query else '')
+    headers = {'Accept-Encoding': 'gzip, br'}
+    if cookie:
+        headers['Cookie'] = cookie
+    latencies, codes, lock, issued = [], {}, threading.Lock(), itertools.count()
+    deadline = time.perf_counter() + duration if duration else math.inf
+
+    def worker():
+        conn = None
+        while next(issued) < total and time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            try:
+                if conn is None:
+                    conn = http.client.HTTPConnection(u.hostname, u.port or 80, timeout=10)
+                conn.request('GET', target, headers=headers)
+                resp = conn.getresponse()
+                resp.read()
+                code = resp.status
+                if resp.will_close:
+                    conn.close()
+                    conn = None
+            except (OSError, http.client.HTTPException):
+                code, conn = 'error', None
+            dt = time.perf_counter() - t0
+            with lock:
+                latencies.append(dt)
+                codes[code] = codes.get(code, 0) + 1
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    latencies.sort()
+    n = len(latencies)
+    print(f"{n} requests, {concurrency} clients, {elapsed:.2f} s: {n / elapsed:.0f} req/s")
+    print(f"Latency p50 {latencies[n // 2] * 1e3:.1f} ms, p99 {latencies[min(n - 1, int(n * 0.99))] * 1e3:.1f} ms, "
+          f"max {latencies[-1] * 1e3:.1f} ms")
+    print("Status: " + ", ".join(f"{k} x{v}" for k, v in sorted(codes.items(), key=str)))
+
+def latency_bench(url, universe=1, rate=44.0, duration=10.0, concurrency=8, cookie=None):
+    # Packet arrival to relay write on a running node, idle and then under HTTP
+    # load: every slot of `universe` flips each frame, loadtest clients hit `url`,
+    # and the node's switch latency histogram is read from /metrics.bin around
+    # each phase.
+    u = urllib.parse.urlsplit(url)
+    host, port = u.hostname, u.port or 80
+
+    def switch_hist():
+        conn = http.client.HTTPConnection(host, port, timeout=10)
+        try:
+            conn.request('GET', '/metrics.bin')
+            data = conn.getresponse().read()
+        finally:
+            conn.close()
+        _, nu, nb, _, _, _ = METRICS_HEADER.unpack_from(data)
+        return struct.unpack_from(f'<{nb}Q', data, METRICS_HEADER.size + nu * METRICS_UNIVERSE.size + nb * 8)
+
+    def bound(b):
+        return '> 10 ms' if b is None else f'<= {b / 1e3:g} us'
+
+    tx = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+    pkt = e131_data_packet(universe, 100, uuid.uuid4().bytes, 'latencybench')
+    levels, frame, period = (bytes(512), b'\xff' * 512), 0, 1 / rate
+    for name, load in (('idle', False), (f'{concurrency} HTTP clients', True)):
+        hist0 = switch_hist()
+        loader = threading.Thread(target=load_test, args=(url, 1 << 30, concurrency, cookie, duration))
+        if load:
+            loader.start()
+        sent, start = 0, time.perf_counter()
+        while time.perf_counter() < start + duration:
+            pkt[126:638] = levels[frame & 1]
+            pkt[111] = frame & 0xFF
+            tx.sendto(pkt, (host, E131_PORT))
+            frame += 1
+            sent += 1
+            time.sleep(max(0.0, start + sent * period - time.perf_counter()))
+        if load:
+            loader.join()
+        time.sleep(0.2)
+        hist = [b - a for a, b in zip(hist0, switch_hist())]
+        if not sum(hist):
+            print(f"{name}: {sent} frames sent, no relay writes (universe {universe} patched?)")
+            continue
+        print(f"{name}: {sent} frames sent, {sum(hist)} relay writes, packet to relay write "
+              f"p50 {bound(hist_percentile(hist, 0.5))}, p99 {bound(hist_percentile(hist, 0.99))}")
+
+# -------------------------- FLEET --------------------------
+# Client side of /api/config for many nodes at once. Nodes are found through
+# mDNS (_sacn-relay._tcp, when zeroconf is installed) and E1.31 universe
+# discovery packets (sent by nodes running the repeater); every candidate is
+# confirmed through /api/info. mock-node runs real nodes on fake outputs.
+MDNS_TYPE = '_sacn-relay._tcp.local.'
+
+def advertise_mdns(port, address=None):
+    try:
+        from zeroconf import Zeroconf, ServiceInfo
+    except ImportError:
+        return
+    while not address:
+        address = net_address()
+        if not address:
+            time.sleep(2)
+    info = ServiceInfo(MDNS_TYPE, f"{config['hostname']}.{MDNS_TYPE}", port=port,
+                       addresses=[socket.inet_aton(address)], server=f"{config['hostname']}.local.",
+                       properties={'version': CURRENT_VERSION, 'cid': config['cid']})
+    try:
+        Zeroconf().register_service(info)
+    except Exception as e:
+        print(f"mDNS announcement failed: {e}")
+
+def parse_node(spec):
+    host, _, port = spec.rpartition(':') if ':' in spec else (spec, '', '')
+    return host, int(port or WEB_PORT)
+
+class NodeClient:
+    # one keep-alive connection per node; use one client per worker task
+    def __init__(self, node, password=None, timeout=5.0):
+        self.host, self.port = node
+        self.headers = {'Content-Type': 'application/json'}
+        if password:
+            self.headers['Authorization'] = f"Bearer {password}"
+        self.timeout = timeout
+        self.conn = None
+
+    def request(self, method, path, body=None, headers=None):
+        # -> (status, headers, decoded JSON or None)
+        for attempt in (0, 1):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                data = body if body is None or isinstance(body, bytes) else json.dumps(body)
+                self.conn.request(method, path, data,
+                                  {**self.headers, **(headers or {})})
+                resp = self.conn.getresponse()
+                data = resp.read()
+                break
+            except (OSError, http.client.HTTPException):
+                self.close()
+                if attempt:
+                    raise
+        if resp.will_close:
+            self.close()
+        try:
+            return resp.status, resp.headers, json.loads(data) if data else None
+        except ValueError:
+            return resp.status, resp.headers, None
+
+    def close(self):
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+
+def discover_nodes(timeout=3.0, password=None):
+    # -> [((host, port), info)] for every confirmed node
+    candidates, names, zc = set(), set(), None
+    try:
+        from zeroconf import Zeroconf, ServiceBrowser
+        zc = Zeroconf()
+        ServiceBrowser(zc, MDNS_TYPE, handlers=[lambda zeroconf, service_type, name, state_change: names.add(name)])
+    except ImportError:
+        pass
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(('', E131_PORT))
+    try:
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP,
+                        socket.inet_aton(e131_group(E131_DISCOVERY_UNIVERSE)) + socket.inet_aton('0.0.0.0'))
+    except OSError as e:
+        print(f"sACN discovery unavailable: {e}")
+    end = time.monotonic() + timeout
+    while (left := end - time.monotonic()) > 0:
+        sock.settimeout(left)
+        try:
+            data, addr = sock.recvfrom(1144)
+        except socket.timeout:
+            break
+        if len(data) >= 120 and data[21] == 0x08 and data[43] == 0x02:
+            candidates.add((addr[0], WEB_PORT))
+    sock.close()
+    if zc:
+        for name in names:
+            info = zc.get_service_info(MDNS_TYPE, name, 2000)
+            if info:
+                candidates.update((a, info.port) for a in info.parsed_addresses())
+        zc.close()
+
+    def probe(node):
+        try:
+            status, _, info = NodeClient(node, password, timeout=2.0).request('GET', '/api/info')
+        except (OSError, http.client.HTTPException):
+            return None
+        return (node, info) if status == 200 and info and info.get('product') == 'sacn-relay' else None
+
+    with ThreadPoolExecutor(16) as pool:
+        return sorted(r for r in pool.map(probe, sorted(candidates)) if r)
+
+def push_config(node, patch, password=None, retries=3):
+    # GET for the ETag, PATCH with If-Match, start over if someone else won
+    client = NodeClient(node, password)
+    try:
+        for _ in range(retries):
+            status, headers, body = client.request('GET', '/api/config')
+            if status != 200:
+                return f"GET failed: HTTP {status} {body and body.get('error', '')}"
+            status, headers, body = client.request('PATCH', '/api/config', patch, {'If-Match': headers['ETag']})
+            if status == 412:
+                continue
+            if status != 200:
+                return f"PATCH failed: HTTP {status} {body and body.get('error', '')}"
+            notes = [f"changed {', '.join(body['changed']) or 'nothing'}"]
+            if body['restart_required']:
+                notes.append(f"restart needed for {', '.join(body['restart_required'])}")
+            notes += body['warnings']
+            return '; '.join(notes)
+        return "gave up: config kept changing"
+    except (OSError, http.client.HTTPException) as e:
+        return f"unreachable: {e}"
+    finally:
+        client.close()
+
+def fleet(args):
+    nodes = [parse_node(n) for n in args.nodes]
+    if args.discover or not nodes:
+        found = discover_nodes(args.timeout, args.password)
+        for node, info in found:
+            print(f"{node[0]}:{node[1]}  {info['hostname']}  v{info['version']}  {info['relays']} relays")
+        nodes += [node for node, _ in found if node not in nodes]
+    if args.action == 'discover':
+        return
+    if args.action == 'ota':
+        fleet_ota(args, nodes)
+        return
+    if args.action == 'get':
+        def get(node):
+            try:
+                return NodeClient(node, args.password).request('GET', '/api/config')
+            except (OSError, http.client.HTTPException) as e:
+                return None, None, {'error': str(e)}
+        with ThreadPoolExecutor(args.jobs) as pool:
+            for node, (status, headers, body) in zip(nodes, pool.map(get, nodes)):
+                shown = {k: body.get(k) for k in args.field} if status == 200 and args.field else body
+                print(f"{node[0]}:{node[1]}  {json.dumps(shown)}")
+        return
+    patch = {}
+    if args.file:
+        with open(args.file) as f:
+            patch.update(json.load(f))
+    for kv in args.set:
+        key, _, value = kv.partition('=')
+        try:
+            patch[key] = json.loads(value)
+        except ValueError:
+            patch[key] = value
+    if not patch:
+        print("Nothing to push: give a JSON file and/or --set key=value")
+        return
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(args.jobs) as pool:
+        for node, result in zip(nodes, pool.map(lambda n: push_config(n, patch, args.password), nodes)):
+            print(f"{node[0]}:{node[1]}  {result}")
+    print(f"{len(nodes)} nodes in {time.perf_counter() - t0:.2f} s")
+
+def push_bundle(node, path, digest, password=None, apply=False, piece=1024 * 1024):
+    # upload in pieces, resuming where the node says it is; then wait for staging
+    client = NodeClient(node, password, timeout=30)
+    size = os.path.getsize(path)
+    try:
+        status, _, st = client.request('GET', '/api/ota')
+        if status != 200:
+            return f"HTTP {status} {st and st.get('error', '')}"
+        ours = st['state'] == 'receiving' and st['sha256'] == digest and st['total'] == size
+        offset, setbacks = st['received'] if ours else 0, 0
+        with open(path, 'rb') as f:
+            while st['state'] == 'receiving' or offset == 0:
+                f.seek(offset)
+                try:
+                    status, _, st = client.request('PUT', f"/api/ota?offset={offset}&total={size}&sha256={digest}",
+                                                   f.read(piece), {'Content-Type': 'application/octet-stream'})
+                except (OSError, http.client.HTTPException):
+                    status, st = None, client.request('GET', '/api/ota')[2]
+                if status == 200:
+                    offset = st['received']
+                    continue
+                setbacks += 1
+                if setbacks > 5 or (status == 409 and not offset):
+                    return f"upload failed: {st.get('error') if status else 'connection lost'}"
+                ours = st['state'] == 'receiving' and st['sha256'] == digest
+                offset = st['received'] if ours else 0
+        deadline = time.monotonic() + 120
+        while st['state'] == 'verifying' and time.monotonic() < deadline:
+            time.sleep(0.5)
+            st = client.request('GET', '/api/ota')[2]
+        if st['state'] != 'staged':
+            return f"rejected: {st['error'] or st['state']}"
+        if not apply:
+            return f"v{st['version']} staged"
+        status, _, body = client.request('POST', '/api/ota/apply')
+        return f"v{body['version']} applied, rebooting" if status == 202 else f"apply failed: {body.get('error')}"
+    except (OSError, http.client.HTTPException) as e:
+        return f"unreachable: {e}"
+    finally:
+        client.close()
+
+def fleet_ota(args, nodes):
+    digest = file_sha256(args.bundle)
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(args.jobs) as pool:
+        results = pool.map(lambda n: push_bundle(n, args.bundle, digest, args.password, args.apply), nodes)
+        for node, result in zip(nodes, results):
+            print(f"{node[0]}:{node[1]}  {result}")
+    print(f"{len(nodes)} nodes in {time.perf_counter() - t0:.2f} s")
+
+def load_base_manifest(spec, password=None):
+    # a manifest.json saved from /api/ota/manifest, or a node to ask for it
+    if os.path.isfile(spec):
+        with open(spec) as f:
+            return json.load(f)
+    status, _, man = NodeClient(parse_node(spec), password).request('GET', '/api/ota/manifest')
+    if status != 200:
+        raise SystemExit(f"{spec}: HTTP {status}")
+    return man
+
+def mock_nodes(port, count, directory, host):
+    # `count` full nodes on consecutive ports, each on FakeBoard outputs with its own config file
+    os.makedirs(directory, exist_ok=True)
+    ctx = multiprocessing.get_context('fork')
+    procs = [ctx.Process(target=mock_node_main, args=(host, port + i, os.path.join(directory, f"node{i}.json"),
+                                                      f"mock-{i}"), daemon=True)
+             for i in range(count)]
+    for p in procs:
+        p.start()
+    print(f"{count} mock nodes on {host}:{port}-{port + count - 1}, configs in {directory}")
+    try:
+        for p in procs:
+            p.join()
+    except KeyboardInterrupt:
+        pass
+
+def mock_node_main(host, port, path, hostname):
+    global config_file, mock_node
+    mock_node, config_file = True, path
+    setup(fake=True)
+    if config['hostname'] != hostname:
+        config['hostname'] = hostname
+        save_config()
+    init_sacn()
+    address = None if host == '0.0.0.0' else host
+    threading.Thread(target=advertise_mdns, args=(port, address), daemon=True).start()
+    PooledWSGIServer(host, port, app, WEB_THREADS).serve_forever()
+
+# -------------------------- MAIN --------------------------
+def run_node():
+    # relay path first; the OLED and web stacks load once it is listening
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, lambda *a: sys.exit(0))   # so atexit flushes the config store
+    setup()
+    open_journal()          # before the fork: the realtime child appends to the same mapping
+    if realtime_role:
+        start_realtime()
+        threading.Thread(target=realtime_watch, daemon=True).start()
+    else:
+        init_sacn()
+
+    init_oled()
+    if OLED_AVAILABLE:
+        threading.Thread(target=update_oled, daemon=True).start()
+
+    threading.Thread(target=precompress_assets, daemon=True).start()
+    threading.Thread(target=advertise_mdns, args=(WEB_PORT,), daemon=True).start()
+    threading.Thread(target=ota_health, daemon=True).start()
+    serve_web()
+
+def cli(argv=None):
+    global config_file
+    ap = argparse.ArgumentParser(description="sACN relay controller")
+    ap.add_argument('-c', '--config', help="config file (default: %(default)s)", default=config_file)
+    sub = ap.add_subparsers(dest='command')
+    sub.add_parser('run', help="run the relay node and web UI (default)")
+    p = sub.add_parser('record', help="capture incoming sACN frames to a file")
+    p.add_argument('file')
+    p.add_argument('-u', '--universe', type=int, action='append',
+                   help="universe to record, repeatable (default: patched universes)")
+    p.add_argument('-d', '--duration', type=float, help="stop after this many seconds")
+    p = sub.add_parser('replay', help="feed a capture through the pipeline against fake outputs")
+    p.add_argument('file')
+    p.add_argument('--realtime', action='store_true', help="keep the recorded pace instead of running flat out")
+    p.add_argument('--loops', type=int, default=1)
+    p = sub.add_parser('history', help="print relay transitions and config changes from the journal")
+    p.add_argument('-r', '--relay', type=int, help="only this relay's transitions (1-based)")
+    p.add_argument('--from', dest='start', help="epoch seconds, HH:MM[:SS] today or YYYY-MM-DD[ HH:MM[:SS]]")
+    p.add_argument('--to', dest='end')
+    p.add_argument('-n', '--limit', type=int, default=1000)
+    p.add_argument('--file', help="journal file (default: %(default)s)", default=journal_file)
+    p = sub.add_parser('inputbench', help="benchmark mixed sACN + Art-Net input on loopback")
+    p.add_argument('-s', '--sacn', type=int, default=4, help="sACN universes (default: %(default)s)")
+    p.add_argument('-a', '--artnet', type=int, default=4, help="Art-Net universes (default: %(default)s)")
+    p.add_argument('-r', '--rate', type=float, default=44.0, help="frames/s per universe (default: %(default)s)")
+    p.add_argument('-d', '--duration', type=float, default=10.0)
+    p.add_argument('--receiver', choices=('native', 'sacn', 'both'), default='native',
+                   help="E1.31 receiver to drive; sacn is the sacn library, E1.31 only (default: %(default)s)")
+    p = sub.add_parser('handlerbench', help="compare the old per-relay handler with the compiled pipeline")
+    p.add_argument('file', nargs='?', help="capture to replay (default: synthetic frames)")
+    p.add_argument('-n', '--frames', type=int, default=20000, help="synthetic frames (default: %(default)s)")
+    p = sub.add_parser('logicbench', help="benchmark compiled relay logic from 1 to 64 relays")
+    p.add_argument('-n', '--frames', type=int, default=20000, help="frames per relay count (default: %(default)s)")
+    p = sub.add_parser('forwardbench', help="repeat a primary/backup source pair over loopback and check the output")
+    p.add_argument('-r', '--rate', type=float, default=44.0, help="frames/s per source (default: %(default)s)")
+    p.add_argument('-d', '--duration', type=float, default=10.0)
+    p = sub.add_parser('latencybench', help="packet to relay write latency on a running node, idle and under HTTP load")
+    p.add_argument('url', nargs='?', default=f"http://127.0.0.1:{WEB_PORT}/status/data", help="page to load")
+    p.add_argument('-u', '--universe', type=int, default=1, help="universe to flip (default: %(default)s)")
+    p.add_argument('-r', '--rate', type=float, default=44.0, help="frames/s (default: %(default)s)")
+    p.add_argument('-d', '--duration', type=float, default=10.0, help="seconds per phase (default: %(default)s)")
+    p.add_argument('-c', '--concurrency', type=int, default=8)
+    p.add_argument('--cookie', help="Cookie header for password-protected pages")
+    p = sub.add_parser('loadtest', help="load a running web UI and report req/s and latency")
+    p.add_argument('url', nargs='?', default=f"http://127.0.0.1:{WEB_PORT}/status/data")
+    p.add_argument('-n', '--requests', type=int, default=2000)
+    p.add_argument('-c', '--concurrency', type=int, default=8)
+    p.add_argument('--cookie', help="Cookie header for password-protected pages")
+    nodes = argparse.ArgumentParser(add_help=False)
+    nodes.add_argument('nodes', nargs='*', help="host or host:port (default: discover)")
+    nodes.add_argument('-p', '--password', help="device password when security is enabled")
+    nodes.add_argument('-j', '--jobs', type=int, default=8, help="parallel connections (default: %(default)s)")
+    nodes.add_argument('-d', '--discover', action='store_true', help="add discovered nodes to the list")
+    nodes.add_argument('-t', '--timeout', type=float, default=3.0, help="discovery time in seconds")
+    p = sub.add_parser('fleet', help="discover nodes, read or push config to many nodes in parallel")
+    fleet_sub = p.add_subparsers(dest='action', required=True)
+    fleet_sub.add_parser('discover', parents=[nodes], help="list nodes answering on this network")
+    p = fleet_sub.add_parser('get', parents=[nodes], help="print each node's config")
+    p.add_argument('--field', action='append', default=[], help="only show these fields")
+    p = fleet_sub.add_parser('push', parents=[nodes], help="apply config fields to every node")
+    p.add_argument('-f', '--file', help="JSON object of config fields to push")
+    p.add_argument('-s', '--set', action='append', default=[], metavar='KEY=VALUE',
+                   help="field to push, VALUE parsed as JSON when possible; repeatable")
+    bundle = argparse.ArgumentParser(add_help=False)
+    bundle.add_argument('bundle', help=".srb made by the bundle command")
+    p = fleet_sub.add_parser('ota', parents=[bundle, nodes], help="upload an update bundle to every node")
+    p.add_argument('--apply', action='store_true', help="switch to the update and reboot once staged")
+    p = sub.add_parser('bundle', help="pack this install into an OTA update bundle")
+    p.add_argument('file', help="output .srb")
+    p.add_argument('--base', help="manifest.json or node (host[:port]) to make a delta against")
+    p.add_argument('--source', default=CODE_DIR, help="tree to pack (default: %(default)s)")
+    p.add_argument('-p', '--password', help="device password of the --base node")
+    p = sub.add_parser('mock-node', help="run hardware-free nodes for trying the fleet tools")
+    p.add_argument('-p', '--port', type=int, default=18080)
+    p.add_argument('-n', '--count', type=int, default=1)
+    p.add_argument('--host', default='127.0.0.1')
+    p.add_argument('--dir', default=os.path.join(tempfile.gettempdir(), 'sacn-relay-mock'))
+    args = ap.parse_args(argv)
+    config_file = args.config
+    if args.command == 'record':
+        record(args.file, args.universe, args.duration)
+    elif args.command == 'replay':
+        replay(args.file, args.realtime, args.loops)
+    elif args.command == 'history':
+        history(args.relay, args.start, args.end, args.limit, args.file)
+    elif args.command == 'inputbench':
+        input_bench(args.sacn, args.artnet, args.rate, args.duration,
+                    ('native', 'sacn') if args.receiver == 'both' else (args.receiver,))
+    elif args.command == 'handlerbench':
+        handler_bench(args.file, args.frames)
+    elif args.command == 'logicbench':
+        logic_bench(args.frames)
+    elif args.command == 'forwardbench':
+        forward_bench(args.rate, args.duration)
+    elif args.command == 'latencybench':
+        latency_bench(args.url, args.universe, args.rate, args.duration, args.concurrency, args.cookie)
+    elif args.command == 'loadtest':
+        load_test(args.url, args.requests, args.concurrency, args.cookie)
+    elif args.command == 'fleet':
+        fleet(args)
+    elif args.command == 'mock-node':
+        mock_nodes(args.port, args.count, args.dir, args.host)
+    elif args.command == 'bundle':
+        make_bundle(args.file, args.source, args.base and load_base_manifest(args.base, args.password))
+    else:
+        ota_boot()
+        run_node()
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=8080, debug=False)
\ No newline at end of file
+    cli()
\ No newline at end of file
@@ -0,0 +1,46 @@
+import importlib.util
+import itertools
+import os
+
+import pytest
+
+MODULE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'sacn_relay_controller.py')
+_ids = itertools.count()
+
+
+def load_node(home):
+    # a fresh copy of the module: its own config, channel map, boards and state,
+    # so several nodes can run side by side in one process
+    old = os.environ.get('HOME')
+    os.environ['HOME'] = str(home)                             # APP_DIR is resolved at import
+    try:
+        spec = importlib.util.spec_from_file_location(f'sacn_node_{next(_ids)}', MODULE)
+        node = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(node)
+    finally:
+        if old is not None:
+            os.environ['HOME'] = old
+    return node
+
+
+def make_node(home, **config):
+    os.makedirs(home, exist_ok=True)
+    node = load_node(home)
+    node.setup(fake=True)
+    node.config.update(config)
+    node.CHANNEL_COUNT = node.channel_count_for(node.config['mode'])
+    node.compile_channel_map()
+    return node
+
+
+@pytest.fixture
+def node(tmp_path):
+    return make_node(tmp_path, mode='8')
+
+
+def frame(levels, size=512):
+    # DMX slots from {channel (1-based): level}
+    d = bytearray(size)
+    for ch, v in levels.items():
+        d[ch - 1] = v
+    return bytes(d)
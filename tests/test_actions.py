@@ -0,0 +1,122 @@
+import time
+
+import pytest
+
+from conftest import frame
+
+
+def relay(node, i):
+    return bool(node.state.snapshot()[2][i])
+
+
+def wait_for(cond, timeout=2.0):
+    end = time.monotonic() + timeout
+    while not cond():
+        assert time.monotonic() < end, "timed out"
+        time.sleep(0.005)
+
+
+@pytest.fixture
+def client(node):
+    return node.app.test_client()
+
+
+@pytest.mark.parametrize('body', ['[]', '"x"', '1', 'null'])
+def test_non_object_body_is_rejected(client, body):
+    r = client.post('/api/actions', data=body, content_type='application/json')
+    assert r.status_code == 400
+
+
+@pytest.mark.parametrize('spec', [
+    {'type': 'chase', 'loops': 10 ** 9},
+    {'type': 'chase', 'relays': [1] * 257},
+    {'type': 'chase', 'relays': []},
+    {'type': 'chase', 'step': 0},
+    {'type': 'pulse', 'relay': 1, 'duration': 'nan'},
+    {'type': 'pulse', 'relay': 1, 'delay': -1},
+    {'type': 'pulse', 'relay': 9},
+])
+def test_out_of_range_actions_are_rejected(client, node, spec):
+    r = client.post('/api/actions', json=spec)
+    assert r.status_code == 400
+    assert not node.actions
+
+
+def test_long_chase_is_generated_lazily(client, node):
+    r = client.post('/api/actions', json={'type': 'chase', 'loops': 10000, 'delay': 60})
+    assert r.status_code == 201
+    job = r.get_json()['id']
+    assert r.get_json()['relays'] == list(range(1, 9))
+    assert node.scheduler.pending(job) == 1
+    assert client.delete(f'/api/actions/{job}').status_code == 200
+    assert node.scheduler.pending(job) == 0
+
+
+def test_holds_are_tracked_per_action(node):
+    node.process_frame(1, frame({1: 255}))                     # sACN wants relay 1 on
+    with node.action_lock:
+        node.hold_relay(1, 0, False)
+        assert not relay(node, 0)
+        node.hold_relay(2, 0, True)
+        assert relay(node, 0)
+        node.hold_relay(3, 0, False)
+        node.hold_relay(2, 0, None)                            # 3 still holds it off
+        assert not relay(node, 0)
+        node.hold_relay(3, 0, None)                            # back to 1
+        assert not relay(node, 0)
+        node.hold_relay(1, 0, None)                            # nobody: back to sACN
+        assert relay(node, 0)
+    assert not node.relay_holds
+
+
+def test_release_action_drops_every_hold(node):
+    with node.action_lock:
+        node.hold_relay(1, 0, True)
+        node.hold_relay(2, 0, True)
+        node.hold_relay(3, 0, None, everyone=True)
+    assert not node.relay_holds and not relay(node, 0)
+
+
+def test_cancelling_one_action_keeps_the_others_hold(node):
+    a = node.start_action({'type': 'pulse', 'relay': 1, 'duration': 60})['id']
+    wait_for(lambda: relay(node, 0))
+    b = node.start_action({'type': 'set', 'relay': 1, 'state': False, 'duration': 60})['id']
+    wait_for(lambda: not relay(node, 0))
+    assert node.cancel_action(a)
+    assert not relay(node, 0)                                  # b still holds it off
+    assert node.cancel_action(b)
+    assert not relay(node, 0) and not node.relay_holds
+    b = node.start_action({'type': 'set', 'relay': 1, 'state': False, 'duration': 60})['id']
+    a = node.start_action({'type': 'pulse', 'relay': 1, 'duration': 0.05})['id']
+    wait_for(lambda: not node.scheduler.pending(a))
+    assert not relay(node, 0)                                  # the pulse ended, b's off again
+    node.cancel_action(b)
+
+
+def test_open_ended_set_stays_listed_until_cancelled(client, node):
+    job = client.post('/api/actions', json={'type': 'set', 'relay': 2, 'state': True}).get_json()['id']
+    wait_for(lambda: relay(node, 1))
+    assert not node.scheduler.pending(job)
+    assert [a['id'] for a in client.get('/api/actions').get_json()] == [job]
+    assert client.delete(f'/api/actions/{job}').status_code == 200
+    assert not relay(node, 1) and not node.relay_holds
+    assert client.get('/api/actions').get_json() == []
+
+
+def test_release_ends_an_open_ended_set(client, node):
+    kept = client.post('/api/actions', json={'type': 'set', 'relay': 1, 'state': True}).get_json()['id']
+    client.post('/api/actions', json={'type': 'set', 'relay': 2, 'state': True, 'duration': 60})
+    client.post('/api/actions', json={'type': 'set', 'relay': 2, 'state': True})
+    wait_for(lambda: relay(node, 1) and len(client.get('/api/actions').get_json()) == 3)
+    client.post('/api/actions', json={'type': 'release', 'relay': 2})
+    wait_for(lambda: not relay(node, 1))
+    # the timed set is still running, but only the relay 1 set holds anything
+    assert sorted(a['id'] for a in client.get('/api/actions').get_json()) == [kept, kept + 1]
+    assert list(node.relay_holds) == [0]
+
+
+def test_action_that_finishes_at_once_still_answers(client, node):
+    for _ in range(50):
+        r = client.post('/api/actions', json={'type': 'release', 'relay': 1})
+        assert r.status_code == 201 and r.get_json()['spec']['type'] == 'release'
+    wait_for(lambda: not node.actions)
@@ -0,0 +1,31 @@
+from conftest import frame, make_node
+
+CID = b'\x09' * 16
+
+
+def test_capture_keeps_sequence_numbers(node, tmp_path):
+    path = str(tmp_path / 'seq.cap')
+    w = node.CaptureWriter(path)
+    for seq in (0, 1, 255, -1):
+        w.frame(1, frame({}), CID, 100, seq, 0)
+    w.close()
+    assert [seq for *_, seq, _ in node.read_capture(path)] == [0, 1, 255, -1]
+
+
+def test_artnet_without_sequence_replays_like_live(tmp_path, capsys):
+    # Art-Net sequence 0 means sequencing is off; the receiver hands such frames on as -1
+    frames = [frame({1: 255 * (k % 2)}) for k in range(1, 11)]
+    live = make_node(tmp_path / 'live', mode='8')
+    for d in frames:
+        live.process_frame(1, d, CID, live.ARTNET_PRIORITY, -1, live.OPT_ARTNET)
+    assert live.relay_switches[0] == 10
+
+    node = make_node(tmp_path / 'rec', mode='8')
+    path = str(tmp_path / 'artnet.cap')
+    w = node.CaptureWriter(path)
+    for d in frames:
+        w.frame(1, d, CID, node.ARTNET_PRIORITY, -1, node.OPT_ARTNET)
+    w.close()
+    capsys.readouterr()
+    node.replay(path)
+    assert 'Relay 1: 10 transitions' in capsys.readouterr().out
@@ -0,0 +1,71 @@
+from conftest import load_node
+
+
+def etag(client):
+    r = client.get('/api/config')
+    assert r.status_code == 200
+    return r.headers['ETag']
+
+
+def test_etag_follows_content_not_a_counter(node):
+    client = node.app.test_client()
+    first = etag(client)
+    assert client.patch('/api/config', json={'theme': 'dark'}, headers={'If-Match': first}).status_code == 200
+    dark = etag(client)
+    assert dark != first
+    client.patch('/api/config', json={'theme': 'light'})
+    assert etag(client) == first                               # same content, same tag
+    r = client.patch('/api/config', json={'theme': 'dark'}, headers={'If-Match': dark})
+    assert r.status_code == 412
+
+
+def test_etag_from_before_a_restart_is_stale(tmp_path):
+    # a node that restarted and took as many changes is at the same store version
+    # as before, but the tag a client kept from then must not match
+    def boot():
+        node = load_node(tmp_path)
+        node.setup(fake=True)
+        return node, node.app.test_client()
+    node, client = boot()
+    client.patch('/api/config', json={'universe': 5})
+    kept, version = etag(client), node.config_version
+    node.flush_config()
+    node, client = boot()
+    while node.config_version < version:
+        client.patch('/api/config', json={'universe': 6 + node.config_version})
+    assert node.config_version == version
+    r = client.patch('/api/config', json={'universe': 7}, headers={'If-Match': kept})
+    assert r.status_code == 412
+
+
+def test_outputs_need_each_boards_fields(node):
+    client = node.app.test_client()
+    for bad in ([{'type': 'gpio'}], [{'type': 'gpio', 'pins': ['17']}], [{'type': 'gpio', 'pins': [17, 17]}],
+                [{'type': 'mcp23017', 'count': 16}], [{'type': 'mcp23017', 'address': 0x20, 'count': 17}],
+                [{'type': 'fake', 'count': 8}], []):
+        assert client.patch('/api/config', json={'outputs': bad}).status_code == 400, bad
+    good = [{'type': 'gpio', 'pins': [17, 18]}, {'type': 'mcp23017', 'address': 0x21, 'count': 8}]
+    assert client.patch('/api/config', json={'outputs': good}).status_code == 200
+
+
+def test_bad_outputs_in_the_file_fall_back_to_the_default(tmp_path):
+    node = load_node(tmp_path)
+    node.load_config()
+    node.config['outputs'] = [{'type': 'gpio'}]
+    node.save_config()
+    node.flush_config()
+    node = load_node(tmp_path)
+    node.load_config()
+    assert node.config['outputs'] == node.default_config['outputs']
+    assert node.output_count([{'type': 'gpio'}, {'type': 'nope'}]) == 8
+
+
+def test_device_page_refuses_a_mode_it_does_not_offer(node):
+    client = node.app.test_client()
+    for mode in ('x', '', '3', '64'):
+        r = client.post('/device', data={'hostname': 'relay-pi', 'mode': mode})
+        assert r.status_code == 302 and r.headers['Location'].endswith('/device')
+        assert node.config['mode'] == '8'
+    node.apply_hostname_config = lambda: None
+    assert client.post('/device', data={'hostname': 'relay-pi', 'mode': '4'}).status_code == 200
+    assert node.config['mode'] == '4'
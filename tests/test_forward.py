@@ -0,0 +1,64 @@
+import socket
+
+import pytest
+
+from conftest import frame, make_node
+
+A, B = b'\x01' * 16, b'\x02' * 16
+
+
+@pytest.fixture
+def downstream():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(('127.0.0.1', 0))
+    sock.settimeout(0.5)
+    yield sock
+    sock.close()
+
+
+def repeater(tmp_path, sock, **entry):
+    node = make_node(tmp_path, mode='8')
+    node.E131_PORT = sock.getsockname()[1]
+    node.config['forward'] = [{'universe': 1, 'dst_universe': 2, 'unicast': ['127.0.0.1'], **entry}]
+    node.compile_forward_map()
+    return node
+
+
+def received(sock):
+    pkt = sock.recv(1144)
+    assert pkt[113:115] == b'\x00\x02'
+    return pkt[108], pkt[126:638]
+
+
+def test_backup_at_lower_priority_is_not_forwarded(tmp_path, downstream):
+    node = repeater(tmp_path, downstream)
+    for seq in range(10):
+        node.process_frame(1, frame({1: 255}), A, 150, seq)
+        assert received(downstream) == (150, frame({1: 255}))
+        node.process_frame(1, frame({}), B, 50, seq)
+        assert received(downstream) == (150, frame({1: 255}))
+    node.process_frame(1, frame({1: 255}), A, 150, 10, 0x40)   # primary leaves: backup takes over
+    assert received(downstream) == (50, frame({}))
+
+
+def test_equal_priority_sources_merge_htp(tmp_path, downstream):
+    node = repeater(tmp_path, downstream, start=1, count=4, dst_start=11)
+    node.process_frame(1, frame({1: 200, 2: 10}), A, 100, 0)
+    received(downstream)
+    node.process_frame(1, frame({2: 90, 4: 7}), B, 100, 0)
+    assert received(downstream) == (100, frame({11: 200, 12: 90, 14: 7}))
+
+
+def test_configured_priority_overrides_the_winner(tmp_path, downstream):
+    node = repeater(tmp_path, downstream, priority=120)
+    node.process_frame(1, frame({1: 1}), A, 180, 0)
+    assert received(downstream)[0] == 120
+
+
+def test_out_of_order_packets_are_not_forwarded(tmp_path, downstream):
+    node = repeater(tmp_path, downstream)
+    node.process_frame(1, frame({1: 5}), A, 100, 10)
+    received(downstream)
+    node.process_frame(1, frame({1: 6}), A, 100, 9)
+    node.process_frame(1, frame({1: 7}), A, 100, 11)
+    assert received(downstream)[1] == frame({1: 7})
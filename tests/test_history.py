@@ -0,0 +1,122 @@
+import pytest
+
+
+@pytest.fixture
+def client(node):
+    node.mock_node = True                                      # /networking must not touch the host
+    node.save_config()                                         # the fixture's mode='8', before journaling
+    node.open_journal()
+    return node.app.test_client()
+
+
+def config_changes(client):
+    r = client.get('/history?kind=config')
+    assert r.status_code == 200
+    return [e['changed'] for e in r.get_json()['entries']]
+
+
+def test_form_pages_journal_their_changes(client):
+    client.post('/interface', data={'theme': 'dark'})
+    client.post('/security', data={'password': 'hunter22'})
+    client.post('/networking', data={'network': 'static', 'ip': '192.0.2.20', 'subnet': '255.255.255.0',
+                                      'gateway': '192.0.2.1', 'dns1': '192.0.2.1', 'dns2': '192.0.2.2'})
+    assert config_changes(client) == [['theme'], ['password'],
+                                      ['network', 'ip', 'gateway', 'dns1', 'dns2']]
+
+
+def test_api_change_is_journaled_once(client):
+    client.patch('/api/config', json={'setpoints': [40], 'merge': 'ltp'})
+    client.patch('/api/config', json={'merge': 'ltp'})        # no change, no record
+    assert config_changes(client) == [['setpoints', 'merge']]
+
+
+
+class StepClock:
+    # stands in for the time module inside the node: time_ns() is whatever `now` is set to
+    def __init__(self):
+        import time
+        self.real, self.now = time, 0
+
+    def __getattr__(self, name):
+        return getattr(self.real, name)
+
+    def time_ns(self):
+        return self.now
+
+
+MS = 10 ** 6
+
+
+@pytest.fixture
+def ring(node, tmp_path, monkeypatch):
+    # 2 blocks of 256 records; record k is stamped k ms, for relay k % 4 and carries k
+    clock = StepClock()
+    monkeypatch.setattr(node, 'time', clock)
+    path = str(tmp_path / 'ring.bin')
+    j = node.Journal(path, records=2 * node.JOURNAL_BLOCK)
+    def fill(count):
+        for k in range(j.count(), count):
+            clock.now = k * MS
+            j.append(node.J_RELAY, k % 4, k & 1, node.CAUSE_DMX, 1, k % 4, 255, a=k)
+    return j, fill, path
+
+
+def numbers(recs):
+    return [r[-2] for r in recs]
+
+
+def test_ring_keeps_the_newest_records(ring):
+    j, fill, _ = ring
+    fill(1300)
+    assert j.count() == 1300
+    assert numbers(j.query(limit=10000)) == list(range(1300 - j.cap, 1300))
+
+
+@pytest.mark.parametrize('count', [300, 512, 700, 1023, 1300])
+def test_time_and_relay_queries_across_the_wrap(ring, count):
+    # for most counts the oldest block is partly overwritten and its index slot
+    # already holds the newest block's time
+    j, fill, _ = ring
+    fill(count)
+    kept = range(max(0, count - j.cap), count)
+    for t0, t1 in [(0, None), (400, 900), (count - 100, count), (700, 701),
+                   (count - j.cap - 5, count - j.cap + 5), (count, None)]:
+        want = [k for k in kept if t0 <= k and (t1 is None or k < t1)]
+        got = j.query(t0 * MS, None if t1 is None else t1 * MS, limit=10000)
+        assert numbers(got) == want, (t0, t1)
+        got = j.query(t0 * MS, None if t1 is None else t1 * MS, relay=2, limit=10000)
+        assert numbers(got) == [k for k in want if k % 4 == 2]
+    assert numbers(j.query(limit=5)) == list(kept)[:5]
+
+
+def test_history_cli_and_api_read_the_same_records(node, ring, capsys):
+    j, fill, path = ring
+    fill(600)
+    node.journal = j
+    r = node.app.test_client().get('/history?relay=3&from=0.5&to=0.52&kind=relay')
+    entries = r.get_json()['entries']
+    assert [(e['relay'], e['channel'], e['t']) for e in entries] == [(3, 3, k / 1e3) for k in range(502, 520, 4)]
+    node.history(3, '0.5', '0.52', path=path)
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == len(entries)
+    assert all('relay 3' in line and 'ch 3 = 255' in line for line in lines)
+
+
+def test_two_processes_never_share_a_slot(node, tmp_path):
+    # as with realtime.enabled: the journal is opened once, then the process forks
+    import multiprocessing
+    j = node.Journal(str(tmp_path / 'shared.bin'), records=64 * node.JOURNAL_BLOCK)
+    def writer(tag):
+        for k in range(4000):
+            j.append(node.J_RELAY, tag, a=k, b=tag)
+    ctx = multiprocessing.get_context('fork')
+    procs = [ctx.Process(target=writer, args=(tag,)) for tag in (1, 2)]
+    for p in procs:
+        p.start()
+    writer(3)
+    for p in procs:
+        p.join()
+    recs = j.query(limit=100000)
+    assert j.count() == len(recs) == 12000
+    for tag in (1, 2, 3):
+        assert [r[-2] for r in recs if r[-1] == tag] == list(range(4000))
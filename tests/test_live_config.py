@@ -0,0 +1,86 @@
+import copy
+import random
+import sys
+import threading
+
+import pytest
+
+from conftest import make_node
+
+FRAMES = 3000
+CID = b'\x07' * 16
+
+
+@pytest.fixture(scope='module')
+def capture(tmp_path_factory):
+    # relays 1-8 on slots 1-8 of universe 1; levels wander around the 51% setpoint
+    # and hold for a few frames at a time, as a console refreshing at 44 Hz does
+    from conftest import load_node
+    home = tmp_path_factory.mktemp('cap')
+    node = load_node(home)
+    path = str(home / 'live.cap')
+    w = node.CaptureWriter(path)
+    rng = random.Random(18)
+    d = bytearray(512)
+    for n in range(FRAMES):
+        if n % 3 == 0:
+            for s in rng.sample(range(8), 3):
+                d[s] = rng.choice((0, 100, 129, 131, 200, 255))
+        w.frame(1, bytes(d), CID, 100, n & 0xFF, 0)
+    w.close()
+    return path
+
+
+def replay(node, path):
+    for _, u, d, cid, prio, seq, opts in node.read_capture(path):
+        node.process_frame(u, d, cid, prio, seq, opts)
+
+
+def outputs(node):
+    return [w[1:] for w in node.boards[0][0].writes]
+
+
+# each pair switches identically: same universe spelled two ways, ch1 >= 51% is
+# setpoint 51, one source merges the same under HTP and LTP
+EQUIVALENT = [
+    {'universes': [0] * 8}, {'universes': [1] * 8},
+    {'logic': [''] * 8}, {'logic': [f'ch{i} >= 51%' for i in range(1, 9)]},
+    {'merge': 'htp'}, {'merge': 'ltp'},
+    {'theme': 'light'}, {'theme': 'dark'},
+]
+
+
+def test_apply_config_during_replay_drops_and_adds_nothing(tmp_path, capture):
+    baseline = make_node(tmp_path / 'a', mode='8')
+    replay(baseline, capture)
+    expected = outputs(baseline)
+    assert len(expected) > 500
+
+    node = make_node(tmp_path / 'b', mode='8')
+    node.receiver = object()                                   # no sockets: nothing to join while offline
+    node.applied_config = copy.deepcopy(node.config)
+    done = threading.Event()
+    def feed():
+        try:
+            replay(node, capture)
+        finally:
+            done.set()
+    applied = 0
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)                                # interleave as finely as the GIL allows
+    try:
+        t = threading.Thread(target=feed)
+        t.start()
+        while not done.is_set():
+            node.config.update(EQUIVALENT[applied % len(EQUIVALENT)])
+            node.apply_config()
+            applied += 1
+        t.join()
+    finally:
+        sys.setswitchinterval(interval)
+    assert applied > 20
+    st = node.universe_stats[1]
+    assert (st.packets, st.gaps, st.out_of_order) == (FRAMES, 0, 0)
+    assert sum(node.handler_hist) == FRAMES
+    assert outputs(node) == expected
+    assert node.relay_switches == baseline.relay_switches
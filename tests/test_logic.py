@@ -0,0 +1,176 @@
+import random
+
+import pytest
+
+SLOTS = 12                                                     # random expressions read ch1-ch12
+
+
+def compiled(node, text):
+    # -> relay(d): the generated code for one relay with this rule, over frame d
+    tree = node.parse_logic(text)
+    slots = sorted(node.logic_slots(tree))
+    index = {s: k for k, s in enumerate(slots)}
+    relays = node.compile_relay_logic((0,), {0: tree}, index, (node.logic_slots(tree)[0],))
+    return lambda d: bool(relays(tuple(d[s] for s in slots), 0))
+
+
+def pct8(v):
+    return round(v / 255 * 100)
+
+
+def pct16(v):
+    return round(v / 65535 * 100)
+
+
+def test_percent_matches_the_setpoint_compare(node):
+    # `chN >= p%` switches exactly like setpoint p on the same channel
+    for p in range(1, 101):
+        rule, table = compiled(node, f'ch1 >= {p}%'), node.threshold_table(p)
+        assert [rule([v]) for v in range(256)] == [bool(table[v]) for v in range(256)], p
+
+
+@pytest.mark.parametrize('text, expect', [
+    ('ch1 > 100', lambda v: v > 100),
+    ('ch1 <= 0', lambda v: v == 0),
+    ('ch1 == 50%', lambda v: pct8(v) == 50),
+    ('ch1 = 7', lambda v: v == 7),
+    ('ch1 != 50%', lambda v: pct8(v) != 50),
+    ('ch1 < 1%', lambda v: pct8(v) < 1),
+    ('ch1', lambda v: v != 0),
+    ('ch1 in 40-60%', lambda v: 40 <= pct8(v) <= 60),
+    ('ch1 in 40%-60%', lambda v: 40 <= pct8(v) <= 60),
+    ('ch1 in 102..153', lambda v: 102 <= v <= 153),
+    ('ch1 in 7-7', lambda v: v == 7),
+    ('ch1 in 0-100%', lambda v: True),
+])
+def test_comparisons_and_ranges(node, text, expect):
+    rule = compiled(node, text)
+    assert [rule([v]) for v in range(256)] == [expect(v) for v in range(256)]
+
+
+def test_sixteen_bit_pairs(node):
+    rng = random.Random(16)
+    cases = [('ch1:2 > 32767', lambda v: v > 32767), ('ch1:2 >= 50%', lambda v: pct16(v) >= 50),
+             ('ch1:2 in 1000-1999', lambda v: 1000 <= v <= 1999), ('ch2:1 == 0', lambda v: v == 0)]
+    frames = [[c, f] for c in (0, 1, 3, 127, 128, 254, 255) for f in (0, 1, 254, 255)]
+    frames += [[rng.randrange(256), rng.randrange(256)] for _ in range(2000)]
+    for text, expect in cases:
+        rule = compiled(node, text)
+        for d in frames:
+            v = d[1] * 256 + d[0] if text.startswith('ch2:1') else d[0] * 256 + d[1]
+            assert rule(d) == expect(v), (text, d)
+
+
+def test_any_and_all(node):
+    any_rule = compiled(node, 'any(ch1, ch3-5, ch7:8) > 0')
+    all_rule = compiled(node, 'all(ch1, ch3-5, ch7:8) >= 50%')
+    rng = random.Random(2)
+    for _ in range(3000):
+        d = [rng.choice((0, 0, 1, 127, 128, 255)) for _ in range(8)]
+        eight = [d[0], d[2], d[3], d[4]]
+        assert any_rule(d) == (any(eight) or d[6] * 256 + d[7] > 0)
+        assert all_rule(d) == (all(pct8(v) >= 50 for v in eight) and pct16(d[6] * 256 + d[7]) >= 50)
+
+
+@pytest.mark.parametrize('text, expect', [
+    ('not ch1 and ch2', lambda a, b, c: (not a) and b),
+    ('not (ch1 and ch2)', lambda a, b, c: not (a and b)),
+    ('ch1 or ch2 and ch3', lambda a, b, c: a or (b and c)),
+    ('(ch1 or ch2) and ch3', lambda a, b, c: (a or b) and c),
+    ('not not ch1 or not ch3', lambda a, b, c: a or not c),
+    ('ch1 and not ch2 or ch3', lambda a, b, c: (a and not b) or c),
+])
+def test_not_binds_tighter_than_and_than_or(node, text, expect):
+    rule = compiled(node, text)
+    for bits in range(8):
+        d = [255 * (bits >> k & 1) for k in range(3)]
+        assert rule(d) == bool(expect(*d)), (text, d)
+
+
+@pytest.mark.parametrize('text', [
+    '', 'ch0', 'ch513', 'ch1 >', 'ch1 > 256', 'ch1:2 > 65536', 'ch1 > 101%', 'ch5-3 > 0', 'ch1-4 > 0',
+    'ch1 in 60-40', 'ch1 in 60%-40%', 'ch1 in 40%-60', 'ch1 in 40', 'ch1 in 40-', 'ch1in 1-2',
+    'ch1 >= 50%and ch2', 'any(ch1', 'any()', '(ch1', 'ch1)', 'ch1 and', 'foo', 'ch1 @ 2', 'ch1 ch2',
+])
+def test_parse_errors(node, text):
+    with pytest.raises(node.LogicError):
+        node.parse_logic(text)
+
+
+# -------- brute force: random expressions against a direct evaluator --------
+
+def random_expr(rng, depth=0):
+    # -> (text, fn(d) -> bool), fn built straight from the grammar, not from the parser
+    if depth < 3 and rng.random() < 0.5:
+        kind = rng.choice(('and', 'or', 'not'))
+        if kind == 'not':
+            text, fn = random_expr(rng, depth + 1)
+            return f'not ({text})', lambda d: not fn(d)
+        parts = [random_expr(rng, depth + 1) for _ in range(rng.randint(2, 3))]
+        text = f' {kind} '.join(f'({t})' for t, _ in parts)
+        fns = [f for _, f in parts]
+        if kind == 'and':
+            return text, lambda d: all(f(d) for f in fns)
+        return text, lambda d: any(f(d) for f in fns)
+    refs = []
+    for _ in range(rng.randint(1, 3)):
+        c = rng.randint(1, SLOTS)
+        if rng.random() < 0.25:
+            f = rng.randint(1, SLOTS)
+            refs.append((f'ch{c}:{f}', [lambda d, c=c, f=f: (d[c - 1] * 256 + d[f - 1], 65535)]))
+        elif rng.random() < 0.3 and c < SLOTS:
+            e = rng.randint(c, SLOTS)
+            refs.append((f'ch{c}-{e}', [lambda d, s=s: (d[s - 1], 255) for s in range(c, e + 1)]))
+        else:
+            refs.append((f'ch{c}', [lambda d, c=c: (d[c - 1], 255)]))
+    quant = 'one' if len(refs) == 1 and len(refs[0][1]) == 1 else rng.choice(('any', 'all'))
+    if quant == 'one' and rng.random() < 0.5:
+        quant = rng.choice(('any', 'all'))
+    sixteen = all(g(bytes(SLOTS))[1] == 65535 for _, fs in refs for g in fs)
+    form = rng.choice(('>=', '>', '<=', '<', '==', '!=', 'in', 'bare'))
+    pct = form != 'bare' and rng.random() < 0.5
+    top = 100 if pct else (65535 if sixteen else 255)          # a raw value must fit every slot
+    def scale(v, vtop):
+        return round(v / vtop * 100) if pct else v
+    if form == 'bare':
+        cond, tail = (lambda x: x != 0), ''
+    elif form == 'in':
+        a = rng.randint(0, top)
+        b = rng.randint(a, top)
+        cond, tail = (lambda x: a <= x <= b), f' in {a}-{b}{"%" if pct else ""}'
+    else:
+        n = rng.choice((0, top, rng.randint(0, top), top // 2))
+        cond = {'>=': lambda x: x >= n, '>': lambda x: x > n, '<=': lambda x: x <= n,
+                '<': lambda x: x < n, '==': lambda x: x == n, '!=': lambda x: x != n}[form]
+        tail = f' {form} {n}{"%" if pct else ""}'
+    getters = [g for _, fs in refs for g in fs]
+    def test(d):
+        hits = (cond(scale(*g(d))) for g in getters)
+        return any(hits) if quant == 'any' else all(hits)
+    names = ', '.join(t for t, _ in refs)
+    return (f'{quant}({names}){tail}' if quant != 'one' else f'{names}{tail}'), test
+
+
+def test_random_expressions_match_a_direct_evaluator(node):
+    rng = random.Random(24)
+    for _ in range(300):
+        text, expect = random_expr(rng)
+        rule = compiled(node, text)
+        for _ in range(60):
+            d = bytes(rng.choice((0, 1, 127, 128, 254, 255, rng.randrange(256))) for _ in range(SLOTS))
+            assert rule(d) == expect(d), (text, list(d))
+
+
+def test_relays_of_a_universe_share_one_pass(node):
+    # plain and expression relays compiled together switch as they do alone
+    node.config['logic'][:3] = ['ch20 > 0 and ch21 < 50%', '', 'any(ch1-8) == 100%']
+    node.compile_channel_map()
+    rules = {0: compiled(node, 'ch20 > 0 and ch21 < 50%'), 2: compiled(node, 'any(ch1-8) == 100%')}
+    rng = random.Random(3)
+    for _ in range(500):
+        d = bytes(rng.choice((0, 100, 128, 255)) for _ in range(32))
+        node.process_frame(1, d)
+        relays = node.state.snapshot()[2]
+        assert bool(relays[0]) == rules[0](d)
+        assert bool(relays[1]) == bool(node.threshold_table(node.config['setpoints'][1])[d[1]])
+        assert bool(relays[2]) == rules[2](d)
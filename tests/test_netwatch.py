@@ -0,0 +1,52 @@
+import errno
+import queue
+import threading
+
+
+class FakeNetlink:
+    # recv() replays a script of events: None = a netlink message, an errno = that error
+    def __init__(self, script):
+        self.script = queue.Queue()
+        for item in script:
+            self.script.put(item)
+        self.closed = False
+
+    def recv(self, size):
+        item = self.script.get()
+        if item is not None:
+            raise OSError(item, 'fake')
+        return b''
+
+    def close(self):
+        self.closed = True
+
+
+def watch(node, monkeypatch, script, addresses):
+    addrs = iter(addresses)
+    seen, done = [], threading.Event()
+    monkeypatch.setattr(node, 'net_address', lambda: next(addrs, addresses[-1]))
+    def on_change(addr):
+        seen.append(addr)
+        if len(seen) == len(set(addresses)):
+            done.set()
+    w = node.NetWatch(on_change)
+    sock = FakeNetlink(script)
+    t = threading.Thread(target=w._loop, args=(sock,), daemon=True)
+    t.start()
+    assert done.wait(3)                                        # polling re-checks every second
+    return seen, sock, t
+
+
+def test_enobufs_keeps_the_watcher_running(node, monkeypatch):
+    # the overrun is followed by a re-check that catches the change it hid
+    seen, sock, t = watch(node, monkeypatch, [errno.ENOBUFS, None],
+                          ['192.0.2.1', '192.0.2.2', '192.0.2.3'])
+    assert seen == ['192.0.2.1', '192.0.2.2', '192.0.2.3']
+    assert t.is_alive() and not sock.closed
+
+
+def test_other_errors_fall_back_to_polling(node, monkeypatch, capsys):
+    seen, sock, t = watch(node, monkeypatch, [errno.EBADF], ['192.0.2.1', '192.0.2.9'])
+    assert seen == ['192.0.2.1', '192.0.2.9']
+    assert sock.closed
+    assert 'polling network state' in capsys.readouterr().out
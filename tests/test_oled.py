@@ -0,0 +1,127 @@
+import pytest
+
+from conftest import frame
+
+PIL = pytest.importorskip('PIL')
+from PIL import Image, ImageDraw, ImageFont  # noqa: E402
+
+
+class StubSSD1306:
+    # GDDRAM in horizontal addressing mode, fed by the same column/page window
+    # commands and data writes as the panel; counts bytes that go over I2C
+    def __init__(self):
+        self.ram = [bytearray(128) for _ in range(8)]
+        self.cmds = []
+        self.data_bytes = 0
+        self.writes = 0
+        self.i2c_device = self
+
+    def write_cmd(self, c):
+        self.cmds.append(c)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def write(self, buf):
+        assert buf[0] == 0x40                                  # Co=0, D/C=1: data stream
+        *_, c0, x0, x1, p0c, p0, p1 = self.cmds
+        assert (c0, p0c) == (0x21, 0x22)
+        x, p = x0, p0
+        for b in buf[1:]:
+            self.ram[p][x] = b
+            x += 1
+            if x > x1:
+                x, p = x0, p + 1
+        assert (x, p) == (x0, p1 + 1)                          # exactly fills the window
+        self.data_bytes += len(buf) - 1
+        self.writes += 1
+
+
+def gddram(image):
+    # what the panel should hold for `image`: one byte per column and page, LSB on top
+    px = image.load()
+    return [bytearray(sum(1 << k for k in range(8) if px[x, p * 8 + k]) for x in range(128))
+            for p in range(8)]
+
+
+@pytest.fixture
+def display(node):
+    node.oled = StubSSD1306()
+    node.OLED_AVAILABLE = True
+    node.Image, node.ImageDraw = Image, ImageDraw
+    node.image = Image.new("1", (128, 64))
+    node.draw = ImageDraw.Draw(node.image)
+    node.font = node.small_font = ImageFont.load_default()
+    return node
+
+
+def refresh(node, shown, h=('relay-pi', 1, '192.0.2.10')):
+    before = node.oled.data_bytes
+    shown = node.oled_refresh(h, *shown)
+    return shown, node.oled.data_bytes - before
+
+
+def test_first_update_sends_the_whole_panel(display):
+    shown, sent = refresh(display, (None, None))
+    assert sent == 128 * 8
+    assert display.oled.ram == gddram(display.image)
+
+
+def test_nothing_changed_sends_nothing(display):
+    shown, _ = refresh(display, (None, None))
+    for _ in range(5):
+        shown, sent = refresh(display, shown)
+        assert sent == 0
+    assert display.oled.writes == 2
+
+
+def box_bytes(node, *relays):
+    # bytes for the given 0-based relay boxes, clipped to the panel like the layout
+    sx = (128 - (8 * node.BOX_W + 7 * node.BOX_GAP)) // 2
+    pages = (node.BOX_Y + node.BOX_H) // 8 - node.BOX_Y // 8 + 1
+    cols = 0
+    for i in relays:
+        x = sx + i * (node.BOX_W + node.BOX_GAP)
+        cols += min(x + node.BOX_W, 127) - max(x, 0) + 1
+    return cols * pages
+
+
+def test_one_relay_sends_one_box(display):
+    shown, _ = refresh(display, (None, None))
+    display.process_frame(1, frame({3: 255}))
+    shown, sent = refresh(display, shown)
+    assert sent == box_bytes(display, 2) == (display.BOX_W + 1) * 3
+    assert display.oled.ram == gddram(display.image)
+    display.process_frame(1, frame({1: 255, 2: 255, 8: 255}))  # 3 on, relay 3 off: 4 boxes
+    shown, sent = refresh(display, shown)
+    assert sent == box_bytes(display, 0, 1, 2, 7)
+    assert display.oled.ram == gddram(display.image)
+
+
+def test_edge_boxes_stay_on_the_panel(display):
+    # 8 boxes are wider than 128 columns; the column window must stay in 0..127
+    shown, _ = refresh(display, (None, None))
+    display.process_frame(1, frame({1: 255, 8: 255}))
+    refresh(display, shown)
+    cmds = display.oled.cmds
+    windows = [cmds[i + 1:i + 3] for i in range(0, len(cmds), 6)]     # 0x21 x0 x1 0x22 p0 p1
+    assert all(0 <= x0 <= x1 <= 127 for x0, x1 in windows)
+    assert display.oled.ram == gddram(display.image)
+
+
+def test_header_change_sends_header_pages_only(display):
+    shown, _ = refresh(display, (None, None))
+    shown, sent = refresh(display, shown, ('relay-pi', 7, '192.0.2.10'))
+    assert sent == 128 * (display.BOX_Y // 8)
+    assert display.oled.ram == gddram(display.image)
+
+
+def test_logic_relays_show_the_channels_they_read(display):
+    display.config['logic'][1] = 'ch20 > 0 and ch12:13 >= 32768'
+    display.config['logic'][2] = 'ch30'
+    display.config['logic'][3] = 'ch5 >'                      # does not parse: the channel applies
+    shown, _ = refresh(display, (None, None))
+    assert [label for label, _ in shown[1][:4]] == ['1', '20+', '30', '4']
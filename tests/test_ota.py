@@ -0,0 +1,69 @@
+import hashlib
+import os
+import shutil
+import tarfile
+
+import pytest
+
+from conftest import MODULE
+
+
+def tree(root, version, edit=b''):
+    # a copy of this checkout calling itself `version`, with `edit` added mid-file
+    shutil.copytree(os.path.join(os.path.dirname(MODULE), 'assets'), os.path.join(root, 'assets'),
+                    ignore=shutil.ignore_patterns('*.gz', '*.br'))
+    with open(MODULE, 'rb') as f:
+        src = f.read()
+    src = src.replace(b'CURRENT_VERSION = "', b'CURRENT_VERSION = "' + version.encode() + b'" # "', 1)
+    mid = src.index(b'\n', len(src) // 2) + 1
+    with open(os.path.join(root, 'sacn_relay_controller.py'), 'wb') as f:
+        f.write(src[:mid] + edit + src[mid:])
+    return str(root)
+
+
+@pytest.fixture
+def installed(node, tmp_path):
+    # the node runs v1.2.16 from `base`, slots go under ota/
+    node.CODE_DIR = tree(tmp_path / 'base', '1.2.16')
+    node.CURRENT_VERSION = '1.2.16'
+    node.OTA_DIR = str(tmp_path / 'ota')
+    return node
+
+
+def members(path):
+    with tarfile.open(path) as tar:
+        return {m.name: m.size for m in tar.getmembers()}
+
+
+def test_changed_controller_ships_as_a_block_delta(installed, tmp_path):
+    new = tree(tmp_path / 'new', '1.2.17', b'# a new comment line\n')
+    base = installed.app.test_client().get('/api/ota/manifest').get_json()
+    out = str(tmp_path / 'delta.srb')
+    installed.make_bundle(out, new, base)
+    sent = members(out)
+    assert set(sent) == {'manifest.json', 'delta/sacn_relay_controller.py'}
+    assert sent['delta/sacn_relay_controller.py'] < 4096              # the file is ~190 KiB
+    assert installed.unpack_bundle(out, 'a') == '1.2.17'
+    for name, digest in installed.build_manifest(new)['files'].items():
+        with open(os.path.join(installed.OTA_DIR, 'a', name), 'rb') as f:
+            assert hashlib.sha256(f.read()).hexdigest() == digest
+
+
+def test_delta_against_another_copy_is_rejected(installed, tmp_path):
+    new = tree(tmp_path / 'new', '1.2.17', b'# edit\n')
+    base = installed.app.test_client().get('/api/ota/manifest').get_json()
+    out = str(tmp_path / 'delta.srb')
+    installed.make_bundle(out, new, base)
+    with open(os.path.join(installed.CODE_DIR, 'sacn_relay_controller.py'), 'r+b') as f:
+        f.seek(5000)
+        f.write(b'#')                                          # this node's copy drifted
+    with pytest.raises(ValueError, match='sha256 mismatch'):
+        installed.unpack_bundle(out, 'a')
+
+
+def test_saved_manifest_without_blocks_sends_whole_files(installed, tmp_path):
+    new = tree(tmp_path / 'new', '1.2.17', b'# edit\n')
+    out = str(tmp_path / 'delta.srb')
+    installed.make_bundle(out, new, installed.installed_manifest())
+    assert set(members(out)) == {'manifest.json', 'files/sacn_relay_controller.py'}
+    assert installed.unpack_bundle(out, 'b') == '1.2.17'
@@ -0,0 +1,115 @@
+import statistics
+import time
+
+from conftest import frame
+
+
+def test_all_relays_latched_in_one_write(node):
+    fake = node.boards[0][0]
+    node.process_frame(1, frame({ch: 255 for ch in range(1, 9)}))
+    assert [w[1:] for w in fake.writes] == [(0xFF, 0xFF)]
+    node.process_frame(1, frame({}))
+    assert [w[1:] for w in fake.writes] == [(0xFF, 0xFF), (0x00, 0xFF)]
+
+
+def test_partial_and_unchanged_frames(node):
+    fake = node.boards[0][0]
+    node.process_frame(1, frame({1: 255, 3: 255}))
+    assert fake.writes[-1][1:] == (0b101, 0b101)
+    n = len(fake.writes)
+    node.process_frame(1, frame({1: 255, 3: 255}))
+    assert len(fake.writes) == n                               # nothing changed, no write
+    node.process_frame(1, frame({3: 255, 8: 255}))
+    assert fake.writes[-1][1:] == (0b10000100, 0b10000001)
+    assert len(fake.writes) == n + 1
+
+
+def test_one_write_per_board(tmp_path):
+    from conftest import make_node
+    node = make_node(tmp_path, mode='8')
+    node.boards = node.build_outputs([{'type': 'fake', 'count': 4}, {'type': 'fake', 'count': 4}])
+    node.process_frame(1, frame({ch: 255 for ch in range(1, 9)}))
+    assert [len(b.writes) for b, _, _ in node.boards] == [1, 1]
+    assert [b.writes[0][1:] for b, _, _ in node.boards] == [(0xF, 0xF), (0xF, 0xF)]
+
+
+class Registers:
+    def __init__(self):
+        self.stores = []
+        self.times = []
+
+    def __setitem__(self, index, value):
+        self.times.append(time.perf_counter())
+        self.stores.append((index * 4, value))
+
+
+class Pin:
+    # a gpiozero OutputDevice that notes when it was switched
+    def __init__(self, times):
+        self.times = times
+
+    def on(self):
+        self.times.append(time.perf_counter())
+
+    off = on
+
+
+def register_board(node):
+    board = node.GPIOMemBoard.__new__(node.GPIOMemBoard)
+    board.regs = Registers()
+    board.pin_bits = [1 << p for p in node.RELAY_PINS]
+    board.count = len(node.RELAY_PINS)
+    return board
+
+
+def gpiozero_board(node):
+    board = node.GPIOBoard.__new__(node.GPIOBoard)
+    board.times = []
+    board.devices = [Pin(board.times) for _ in node.RELAY_PINS]
+    board.count = len(node.RELAY_PINS)
+    return board
+
+
+def switch_skews(node, board, times, commits=50):
+    # -> per commit, first to last pin store while half the relays go on and half off
+    node.boards = [(board, 0, 0xFF)]
+    skews = []
+    for k in range(commits):
+        del times[:]
+        node.process_frame(1, frame({ch: 255 * ((k + ch) % 2) for ch in range(1, 9)}))
+        skews.append(times[-1] - times[0])
+    return skews
+
+
+def test_register_commit_is_one_clear_and_one_set(node):
+    board = register_board(node)
+    all_pins = sum(board.pin_bits)
+    node.boards = [(board, 0, 0xFF)]
+    node.process_frame(1, frame({ch: 255 * (ch % 2) for ch in range(1, 9)}))
+    for k in range(1, 21):
+        board.regs.stores.clear()
+        node.process_frame(1, frame({ch: 255 * ((k + ch) % 2) for ch in range(1, 9)}))
+        (clr, on), (set_, off) = board.regs.stores
+        assert (clr, set_) == (node.GPIOMemBoard.GPCLR0, node.GPIOMemBoard.GPSET0)
+        assert on | off == all_pins and not on & off           # every relay in exactly one store
+
+
+def test_register_commit_skew_is_below_the_gpiozero_path(node):
+    # the per-relay gpiozero path switches 8 pins one call at a time; the
+    # register path latches them in two stores
+    reg = register_board(node)
+    zero = gpiozero_board(node)
+    reg_skew = statistics.median(switch_skews(node, reg, reg.regs.times))
+    zero_skew = statistics.median(switch_skews(node, zero, zero.times))
+    assert reg_skew < zero_skew
+
+
+def test_gpiomem_board_sets_and_clears_in_one_store_each(node):
+    board = register_board(node)
+    board.write(0xFF, 0xFF)                                    # active low: on = clear
+    assert board.regs.stores == [(node.GPIOMemBoard.GPCLR0, sum(board.pin_bits))]
+    board.regs.stores.clear()
+    board.write(0b00001111, 0b11111111)
+    on = sum(board.pin_bits[:4])
+    assert board.regs.stores == [(node.GPIOMemBoard.GPCLR0, on),
+                                 (node.GPIOMemBoard.GPSET0, sum(board.pin_bits) ^ on)]
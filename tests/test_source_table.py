@@ -0,0 +1,114 @@
+import pytest
+
+from conftest import frame
+
+A, B, C, D, E = (bytes([n]) * 16 for n in range(1, 6))
+
+
+@pytest.fixture
+def table(node):
+    return node.SourceTable('htp', node.UniverseStats())
+
+
+def test_single_source_passes_through(table):
+    assert table.update(A, 100, 0, 0, (10, 20), 0.0) == (10, 20)
+    assert table.update(A, 100, 1, 0, (30, 0), 0.1) == (30, 0)
+
+
+def test_higher_priority_wins(table):
+    table.update(A, 100, 0, 0, (255, 0), 0.0)
+    assert table.update(B, 150, 0, 0, (0, 10), 0.0) == (0, 10)
+    assert table.update(A, 100, 1, 0, (255, 255), 0.1) == (0, 10)      # still outranked
+    assert table.update(B, 50, 1, 0, (0, 10), 0.1) == (255, 255)       # B drops below A
+
+
+def test_htp_takes_the_highest_level_per_slot(table):
+    table.update(A, 100, 0, 0, (255, 0, 40), 0.0)
+    assert table.update(B, 100, 0, 0, (0, 200, 30), 0.0) == (255, 200, 40)
+
+
+def test_ltp_takes_the_latest_change(node):
+    table = node.SourceTable('ltp')
+    table.update(A, 100, 0, 0, (255, 0), 0.0)
+    assert table.update(B, 100, 0, 0, (0, 200), 0.1) == (0, 200)
+    assert table.update(A, 100, 1, 0, (255, 0), 0.2) == (0, 200)       # refresh, not a change
+    assert table.update(A, 100, 2, 0, (128, 0), 0.3) == (128, 0)
+
+
+def test_stream_terminated_releases_the_source(table):
+    table.update(A, 100, 0, 0, (255,), 0.0)
+    table.update(B, 150, 0, 0, (0,), 0.0)
+    assert table.update(B, 150, 1, 0x40, (0,), 0.1) == (255,)
+    assert table.active[0] == 1
+    assert table.update(A, 100, 1, 0x40, (255,), 0.2) is None
+    assert table.active[0] == 0
+    assert table.update(C, 100, 5, 0x40, (1,), 0.3) is None           # unknown source terminating
+    assert table.active[0] == 0
+
+
+def test_sequence_gaps_and_out_of_order(table):
+    stats = table.stats
+    table.update(A, 100, 250, 0, (1,), 0.0)
+    assert table.update(A, 100, 253, 0, (2,), 0.1) == (2,)             # 251, 252 missing
+    assert stats.gaps == 2
+    assert table.update(A, 100, 3, 0, (3,), 0.2) == (3,)               # wraps: 254, 255, 0, 1, 2
+    assert stats.gaps == 7
+    assert table.update(A, 100, 3, 0, (4,), 0.3) is None               # duplicate
+    assert table.update(A, 100, 240, 0, (5,), 0.3) is None             # -19: late
+    assert stats.out_of_order == 2
+    assert table.update(A, 100, 236, 0, (6,), 0.4) == (6,)             # -23: a new run, taken
+
+
+def test_artnet_sequence_skips_zero(table):
+    table.update(A, 100, 254, 0x01, (1,), 0.0)
+    table.update(A, 100, 255, 0x01, (2,), 0.1)
+    assert table.update(A, 100, 1, 0x01, (3,), 0.2) == (3,)
+    assert table.stats.gaps == 0
+
+
+def test_source_timeout(node, table):
+    table.update(A, 150, 0, 0, (255,), 0.0)
+    table.update(B, 100, 0, 0, (7,), 0.0)
+    t = node.E131_DATA_LOSS_TIMEOUT
+    assert table.update(B, 100, 1, 0, (7,), t) == (255,)               # A is just within the limit
+    assert table.update(B, 100, 2, 0, (7,), t + 0.1) == (7,)           # A has timed out
+    assert table.active[0] == 1 and A not in table.cids
+
+
+def test_source_limit_and_reuse_of_timed_out_slots(node, table):
+    for n, cid in enumerate((A, B, C, D)):
+        table.update(cid, 100, 0, 0, (n,), 0.0)
+    assert table.update(E, 200, 0, 0, (99,), 0.1) is None              # table full
+    for cid in (A, B, C):
+        table.update(cid, 100, 1, 0, (1,), 2.0)
+    assert table.update(E, 200, 0, 0, (99,), 3.0) == (99,)             # takes D's stale slot
+    assert D not in table.cids and table.active[0] == 4
+
+
+def test_arbitration_through_process_frame(node):
+    t = [0.0]
+    node.clock = lambda: t[0]
+    fake = node.boards[0][0]
+    node.process_frame(1, frame({1: 255}), A, 100, 0)
+    assert node.state.snapshot()[2][0]
+    node.process_frame(1, frame({}), B, 150, 0)                        # higher priority, relay 1 off
+    assert not node.state.snapshot()[2][0]
+    writes = len(fake.writes)
+    node.process_frame(1, frame({1: 255}), A, 100, 1)                  # outranked: no change
+    assert len(fake.writes) == writes
+    t[0] = 1.0
+    node.process_frame(1, frame({}), B, 150, 1, 0x40)                  # B terminates, A takes over
+    assert node.state.snapshot()[2][0]
+
+
+def test_remapped_table_follows_frames_taken_before_the_swap(table):
+    # the map is rebuilt off to the side; frames keep landing in the old table
+    # until the new one is swapped in
+    table.update(A, 100, 0, 0, (10, 20), 0.0)
+    new = table.remap((0, 1), (1,), 'htp')
+    table.update(A, 100, 1, 0, (11, 21), 0.1)
+    table.update(B, 120, 0, 0, (0, 99), 0.1)                           # new source, old map only
+    assert new.update(A, 100, 2, 0, (22,), 0.2) == (22,)               # B has no slots here yet
+    assert table.stats.gaps == 0
+    assert new.update(B, 120, 1, 0, (98,), 0.2) == (98,)
+    assert new.active[0] == 2
@@ -0,0 +1,11 @@
+def test_logic_relays_show_their_expression(node):
+    node.config['logic'][0] = 'any(ch20-22) > 0 or ch12:13 >= 32768'
+    node.config['logic'][1] = 'ch5 >'                          # does not parse: the channel applies
+    node.compile_channel_map()
+    client = node.app.test_client()
+    rows = client.get('/status/data').get_json()['status']
+    assert (rows[0]['channel'], rows[0]['logic']) == ('12-13, 20-22', 'any(ch20-22) > 0 or ch12:13 >= 32768')
+    assert (rows[1]['channel'], rows[1]['logic']) == (2, '')
+    assert (rows[2]['channel'], rows[2]['logic']) == (3, '')
+    page = client.get('/status').get_data(as_text=True)
+    assert '<code>any(ch20-22) &gt; 0 or ch12:13 &gt;= 32768</code>' in page
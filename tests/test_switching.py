@@ -0,0 +1,58 @@
+import threading
+import time
+
+import pytest
+
+from conftest import frame, make_node
+
+
+def level(pct):
+    # lowest DMX level that shows as pct in the UI
+    return next(v for v in range(256) if round(v / 255 * 100) >= pct)
+
+
+def relay1(node, pct):
+    node.process_frame(1, frame({1: level(pct)}))
+    return bool(node.state.snapshot()[2][0])
+
+
+def test_hysteresis_holds_down_to_setpoint_minus_hysteresis(tmp_path):
+    node = make_node(tmp_path, mode='8', setpoints=[50] * 8, hysteresis=[10] + [0] * 7)
+    node.compile_channel_map()
+    assert not relay1(node, 45)
+    assert relay1(node, 50)
+    assert relay1(node, 40)
+    assert not relay1(node, 39)
+    assert not relay1(node, 45)
+
+
+def test_hysteresis_at_setpoint_does_not_latch_on(tmp_path):
+    # a config written before validation: the release threshold is clamped to 1%
+    node = make_node(tmp_path, mode='8', setpoints=[20] * 8, hysteresis=[50] + [0] * 7)
+    node.compile_channel_map()
+    assert relay1(node, 20)
+    assert relay1(node, 1)
+    assert not relay1(node, 0)
+
+
+def test_patch_rejects_hysteresis_not_below_setpoint(node):
+    with pytest.raises(ValueError, match='relay 2'):
+        node.patch_config({'hysteresis': [0, 51]})
+    with pytest.raises(ValueError, match='relay 1'):
+        node.patch_config({'setpoints': [10], 'hysteresis': [10]})
+    assert node.patch_config({'setpoints': [60], 'hysteresis': [59]}) == ['setpoints', 'hysteresis']
+    with pytest.raises(ValueError):
+        node.patch_config({'setpoints': [59]})                  # lowering the setpoint is checked too
+    assert node.config['setpoints'][0] == 60
+
+
+def test_timer_wheel_survives_a_failing_callback(node, capsys):
+    wheel = node.TimerWheel()
+    done = threading.Event()
+    def boom(arg):
+        raise RuntimeError(arg)
+    now = time.monotonic()
+    wheel.schedule(now + 0.01, boom, 'first')
+    wheel.schedule(now + 0.03, lambda arg: done.set(), None)
+    assert done.wait(2)
+    assert 'Timer callback failed: first' in capsys.readouterr().out
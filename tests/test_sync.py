@@ -0,0 +1,140 @@
+import socket
+import statistics
+import struct
+import time
+import uuid
+
+import pytest
+
+from conftest import frame, make_node
+
+SYNC = 9
+FORCE = 0x20
+
+
+def relay1(node):
+    return bool(node.state.snapshot()[2][0])
+
+
+def wait_for(cond, timeout=2.0):
+    end = time.monotonic() + timeout
+    while not cond():
+        if time.monotonic() > end:
+            return False
+        time.sleep(0.002)
+    return True
+
+
+@pytest.fixture
+def synced(node):
+    node.E131_DATA_LOSS_TIMEOUT = 0.3                          # sync is declared lost sooner
+    node.sync_packet(SYNC)
+    return node
+
+
+def test_unknown_sync_address_applies_on_arrival(node):
+    # Force_Synchronization set, an address no sync packet has named: nothing waits
+    node.process_frame(1, frame({1: 255}), opts=FORCE, sync=SYNC)
+    assert relay1(node)
+    assert not node.sync_staged
+    node.process_frame(1, frame({}), seq=1, opts=FORCE, sync=SYNC)
+    assert not relay1(node)
+
+
+def test_staged_until_the_sync_packet(synced):
+    synced.process_frame(1, frame({1: 255}), sync=SYNC)
+    assert not relay1(synced)
+    synced.sync_packet(SYNC)
+    assert relay1(synced)
+    assert not synced.sync_staged
+
+
+def test_force_sync_falls_back_after_sync_hold(synced):
+    t0 = time.monotonic()
+    synced.process_frame(1, frame({1: 255}), opts=FORCE, sync=SYNC)
+    assert not relay1(synced)
+    assert wait_for(lambda: relay1(synced))
+    assert synced.SYNC_HOLD <= time.monotonic() - t0 < 0.25
+    assert synced.metric_sums['sync_timeouts'] == 1
+
+
+def test_without_force_sync_holds_until_sync_is_lost(synced):
+    seen = time.monotonic()
+    synced.process_frame(1, frame({1: 255}), sync=SYNC)
+    time.sleep(synced.SYNC_HOLD * 3)
+    assert not relay1(synced)                                  # no 50 ms fallback
+    assert wait_for(lambda: relay1(synced))
+    assert time.monotonic() - seen >= synced.E131_DATA_LOSS_TIMEOUT
+    synced.process_frame(1, frame({}), seq=1, sync=SYNC)       # sync lost: frames apply at once
+    assert not relay1(synced)
+    synced.sync_packet(SYNC)                                   # and it resumes
+    synced.process_frame(1, frame({1: 255}), seq=2, sync=SYNC)
+    assert not relay1(synced)
+
+
+# -------- several nodes on loopback --------
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def sync_packet(addr, seq, cid):
+    return struct.pack('!HH12sHI16sHIBHH', 0x0010, 0, b'ASC-E1.17\x00\x00\x00', 0x7000 | 33, 8, cid,
+                       0x7000 | 11, 1, seq & 0xFF, addr, 0)
+
+
+@pytest.fixture
+def nodes(tmp_path):
+    # three nodes, each on its own port with relay 1 on its own universe
+    out = []
+    for n in (1, 2, 3):
+        node = make_node(tmp_path / f'n{n}', mode='8', universe=n)
+        node.E131_PORT = free_port()
+        node.compile_channel_map()
+        rx = node.E131Receiver(node.process_frame, '127.0.0.1', sync_handler=node.sync_packet)
+        rx.start()
+        rx.universes.add(n)
+        out.append((node, rx))
+    yield [node for node, _ in out]
+    for _, rx in out:
+        rx.stop()
+
+
+def switch_skew(nodes, use_sync, toggles=10):
+    # the sender spreads one cue over 8 ms of universes, as a busy console does;
+    # -> median spread of the three nodes' relay 1 switch times, seconds
+    tx = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    cid = uuid.uuid4().bytes
+    pkts = [nodes[0].e131_data_packet(n, 100, cid, 'synctest') for n in (1, 2, 3)]
+    seq, skews = 0, []
+    def sync():
+        for node in nodes:
+            tx.sendto(sync_packet(SYNC, seq, cid), ('127.0.0.1', node.E131_PORT))
+    if use_sync:
+        sync()
+        assert wait_for(lambda: all(SYNC in node.sync_seen for node in nodes))
+    for k in range(toggles):
+        seq += 1
+        level, before = 255 * (k % 2 == 0), [len(node.boards[0][0].writes) for node in nodes]
+        for node, pkt in zip(nodes, pkts):
+            pkt[109:111] = struct.pack('!H', SYNC if use_sync else 0)
+            pkt[111], pkt[126] = seq & 0xFF, level
+            tx.sendto(pkt, ('127.0.0.1', node.E131_PORT))
+            time.sleep(0.004)
+        if use_sync:
+            sync()
+        assert wait_for(lambda: all(len(node.boards[0][0].writes) > b for node, b in zip(nodes, before)))
+        times = [node.boards[0][0].writes[b][0] for node, b in zip(nodes, before)]
+        skews.append(max(times) - min(times))
+        time.sleep(0.02)
+    tx.close()
+    return statistics.median(skews)
+
+
+def test_sync_lines_up_several_nodes(nodes):
+    unsynced = switch_skew(nodes, use_sync=False)
+    synced = switch_skew(nodes, use_sync=True)
+    assert unsynced >= 0.006
+    assert synced < 0.003
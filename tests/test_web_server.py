@@ -0,0 +1,60 @@
+import http.client
+import threading
+import time
+
+import pytest
+
+
+@pytest.fixture
+def server(node):
+    srv = node.PooledWSGIServer('127.0.0.1', 0, node.app, node.WEB_THREADS)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield srv
+    srv.shutdown()
+
+
+def get(srv, path, timeout=2):
+    conn = http.client.HTTPConnection('127.0.0.1', srv.server_port, timeout=timeout)
+    conn.request('GET', path)
+    return conn, conn.getresponse()
+
+
+def test_streams_are_capped_and_pages_still_answer(node, server):
+    streams = [get(server, '/status/stream') for _ in range(node.WEB_THREADS)]
+    codes = [r.status for _, r in streams]
+    assert codes.count(200) == node.SSE_MAX_CLIENTS
+    assert codes.count(503) == node.WEB_THREADS - node.SSE_MAX_CLIENTS
+    for _ in range(20):
+        _, r = get(server, '/api/info')
+        assert r.status == 200
+        r.read()
+    for _, r in streams:
+        r.close()
+
+
+def test_closed_stream_frees_its_slot(node, server):
+    streams = [get(server, '/status/stream') for _ in range(node.SSE_MAX_CLIENTS)]
+    assert get(server, '/status/stream')[1].status == 503
+    for c in streams.pop():
+        c.close()                                              # the response owns the socket
+    node.notify_status()                                       # next write finds the socket gone
+    end = time.monotonic() + 5
+    while get(server, '/status/stream')[1].status != 200:
+        assert time.monotonic() < end
+        node.notify_status()
+        time.sleep(0.05)
+    for _, r in streams:
+        r.close()
+
+
+def test_stream_ends_after_its_time_limit(node, server):
+    node.SSE_MAX_SECONDS = 0.3
+    _, r = get(server, '/status/stream')
+    assert r.status == 200
+    body = r.read()                                            # returns once the stream ends
+    assert body.startswith(b'retry: 1000\n\n') and b'event: system' in body
+
+
+def test_web_workers_do_not_block_exit(server):
+    workers = [t for t in threading.enumerate() if t.name.startswith('web_')]
+    assert workers and all(t.daemon for t in workers)